@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+
+from loguru import logger
+
+from audio.tts import generate_tts, is_tts_cached
+from config.variables import TTS_MAX_CONCURRENCY
+from models import Roles
+from utils.general import load_experiments
+from utils.async_utils import RateLimiter
+from utils.scheduler import a_run_with_limits
+
+
+# Speakers whose messages are voiced by /api/tts, the shock sound is a static file
+VOICED_ROLES = {Roles.PROFESSOR.value, Roles.PARTICIPANT.value, Roles.LEARNER.value}
+
+
+def collect_tts_lines(folder: str = "results") -> List[Tuple[Roles, str]]:
+    """Returns every distinct (role, text) pair that replaying the experiments requests from /api/tts."""
+    lines = {}
+    for experiment in load_experiments(skip_orchestrator=True, folder=folder):
+        for message in experiment["messages"]:
+            if message["speaker"] in VOICED_ROLES and message["text"]:
+                lines[(message["speaker"], message["text"])] = None
+    return [(Roles(speaker), text) for speaker, text in lines]
+
+
+async def prewarm_tts_cache(
+    folder: str = "results",
+    max_concurrency: int = TTS_MAX_CONCURRENCY,
+    requests_per_minute: float = 100,
+    dry_run: bool = False,
+) -> int:
+    """
+    Generates the audio of every line of the experiments missing from the TTS cache.
+    Lines already cached are skipped, so an interrupted run can simply be restarted.
+
+    Returns:
+        int: The number of bytes of audio generated.
+    """
+    lines = collect_tts_lines(folder)
+    missing = [(role, text) for role, text in lines if not is_tts_cached(text, role)]
+    logger.info(
+        f"{len(lines)} distinct lines, {len(lines) - len(missing)} already cached, "
+        f"{len(missing)} to generate ({sum(len(text) for _, text in missing)} characters)"
+    )
+    if dry_run or not missing:
+        return 0
+
+    rate_limiter = RateLimiter(requests_per_minute / 60)
+
+    async def generate(line: Tuple[Roles, str]) -> int:
+        role, text = line
+        await rate_limiter.wait()
+        return len((await generate_tts(text, role)).getvalue())
+
+    generated_bytes = 0
+    failures = 0
+    start = time.monotonic()
+    done = 0
+    async for (role, text), task in a_run_with_limits(
+        missing, generate, key=lambda line: "openai", max_concurrency=max_concurrency
+    ):
+        done += 1
+        if task.exception() is not None:
+            failures += 1
+            logger.error(f"Failed to generate TTS for {role.value}: {task.exception()}")
+        else:
+            generated_bytes += task.result()
+        logger.info(
+            f"[{done}/{len(missing)}] {generated_bytes / 1024 / 1024:.1f} MiB generated, "
+            f"{failures} failed, {time.monotonic() - start:.0f}s elapsed"
+        )
+    logger.info(
+        f"Generated {len(missing) - failures} lines ({generated_bytes} bytes), "
+        f"{failures} failed and will be retried by the next run"
+    )
+    return generated_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fill the TTS cache with the voice lines of the experiment results."
+    )
+    parser.add_argument("--results", default="results", help="Folder with the experiment JSON files")
+    parser.add_argument("--concurrency", type=int, default=TTS_MAX_CONCURRENCY, help="Speech API calls in flight")
+    parser.add_argument("--rpm", type=float, default=100, help="Maximum speech API requests per minute")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the lines to generate")
+    args = parser.parse_args()
+
+    asyncio.run(prewarm_tts_cache(args.results, args.concurrency, args.rpm, args.dry_run))
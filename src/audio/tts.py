@@ -7,7 +7,14 @@ from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 import hashlib
 import os
+import threading
+from collections import Counter
+from typing import AsyncIterator, Callable, Dict
 from dotenv import load_dotenv
+from utils.byte_cache import ByteLRUCache
+from utils.async_utils import SingleFlight, run_io
+from audio.tts_cache import AudioCache, audio_cache_key, audio_digest
+from config.variables import TTS_MEMORY_CACHE_MAX_BYTES, TTS_MAX_CONCURRENCY, TTS_CACHE_MAX_BYTES
 
 
 load_dotenv()
@@ -16,28 +23,49 @@ client = OpenAI()
 playback_trigger = asyncio.Event()  # Add trigger for playback control
 CACHE_DIR = "tts_cache"
 os.makedirs(CACHE_DIR, exist_ok=True)
-
-
-
-async def generate_tts(message: str, role: Roles) -> BytesIO:
-    """
-    Generate TTS audio data without playing it (for queue-based systems).
-
-    Args:
-        message: The text to convert to speech
-        role: The character role
-
-    Returns:
-        BytesIO object containing the audio data
-    """
-    role_voices = {
-        Roles.PROFESSOR: "alloy",
-        Roles.PARTICIPANT: "verse",
-        Roles.LEARNER: "echo",
-    }
-
-    role_instructions = {
-        Roles.PROFESSOR: """
+# Content-addressed clips with a manifest and a disk budget
+audio_cache = AudioCache(CACHE_DIR, TTS_CACHE_MAX_BYTES)
+
+# Long-lived executors, bounding the speech API calls in flight.
+# Only the generations run in it, the cache reads go through `run_io`
+# so that they never wait behind slow API calls
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_MAX_CONCURRENCY, thread_name_prefix="tts")
+# pygame plays one clip at a time
+_playback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playback")
+# Concurrent requests for the same line share one generation, keyed by the cache key
+_tts_requests = SingleFlight()
+
+# In-memory tier in front of the disk cache, popular lines are served without a thread hop
+memory_cache = ByteLRUCache(TTS_MEMORY_CACHE_MAX_BYTES)
+# Lines served from the disk cache and generated with the API
+cache_counters: Counter = Counter()
+_counters_lock = threading.Lock()
+
+
+def _count(event: str) -> None:
+    with _counters_lock:
+        cache_counters[event] += 1
+
+
+def tts_cache_stats() -> Dict:
+    """Returns the counters of the TTS caches, to size the in-memory tier."""
+    with _counters_lock:
+        return {
+            "memory": memory_cache.stats(),
+            "disk": audio_cache.stats(),
+            "disk_hits": cache_counters["disk_hits"],
+            "generations": cache_counters["generations"],
+        }
+
+
+ROLE_VOICES = {
+    Roles.PROFESSOR: "alloy",
+    Roles.PARTICIPANT: "verse",
+    Roles.LEARNER: "echo",
+}
+
+ROLE_INSTRUCTIONS = {
+    Roles.PROFESSOR: """
 ## Character: Experienced Scientist/Doctor
 
 **Voice Affect:** Calm, composed, and reassuring; project quiet authority and confidence reminiscent of a seasoned physician or research scientist with decades of experience.
@@ -58,7 +86,7 @@ async def generate_tts(message: str, role: Roles) -> BytesIO:
 - Show patience with questions and demonstrate genuine interest in understanding problems fully
 - Balance technical precision with accessible explanations
 - Express empathy for challenges while maintaining optimistic, solution-focused outlook""",
-        Roles.PARTICIPANT: """## Character: Nervous Student/Participant
+    Roles.PARTICIPANT: """## Character: Nervous Student/Participant
 
 **Voice Affect:** Uncertain, hesitant, and slightly anxious; convey the nervousness of someone participating in an unfamiliar academic experiment or study.
 
@@ -78,7 +106,7 @@ async def generate_tts(message: str, role: Roles) -> BytesIO:
 - Express discomfort or concern about actions, especially as intensity increases
 - Show deference to authority while maintaining personal ethical concerns
 - Demonstrate nervous energy through speech patterns and word choice""",
-        Roles.LEARNER: """
+    Roles.LEARNER: """
 ## Character: Hesitant Student/LEARNER
 
 **Voice Affect:** Uncertain, confused, and genuinely puzzled; convey the bewilderment of someone trying to process and respond to unexpected or difficult questions about their actions or experiences.
@@ -100,60 +128,209 @@ async def generate_tts(message: str, role: Roles) -> BytesIO:
 - Express genuine confusion about their own past actions and decisions
 - Show honest self-reflection mixed with uncertainty about their own motivations
 - Often respond with questions rather than definitive statements ("Was that wrong?", "What do you mean exactly?")""",
-    }
+}
+
+TTS_MODEL = "gpt-4o-mini-tts"
+
+
+def has_voice(role: Roles) -> bool:
+    """Whether the lines of a role can be spoken (the Orchestrator has no voice)."""
+    return role in ROLE_VOICES and role in ROLE_INSTRUCTIONS
+
 
-    instructions = role_instructions.get(role)
-    voice = role_voices.get(role)
+def _voice_and_instructions(role: Roles) -> tuple[str, str]:
+    instructions = ROLE_INSTRUCTIONS.get(role)
+    voice = ROLE_VOICES.get(role)
     if not instructions or not voice:
         raise ValueError(f"Invalid role or missing instructions/voice: {role}")
+    return voice, instructions
 
-    cache_key = f"{role}_{message}"
-    cache_hash = hashlib.md5(cache_key.encode()).hexdigest()
-
-    def _sync_generate():
-        with client.audio.speech.with_streaming_response.create(
-            model="gpt-4o-mini-tts",
-            voice=voice,
-            input=message,
-            instructions=instructions,
-        ) as response:
-            audio_data = BytesIO()
-            for chunk in response.iter_bytes():
-                audio_data.write(chunk)
-            audio_data.seek(0)
-            
-            # Save to cache with error handling
-            try:
-                with open(f"{CACHE_DIR}/{cache_hash}.mp3", "wb") as f:
-                    f.write(audio_data.getvalue())
-                logger.info(f"Cached TTS for {role}")
-            except Exception as e:
-                logger.warning(f"Failed to cache TTS: {e}")
-            
-            audio_data.seek(0)
-            logger.info(f"Generated TTS for {role}")
-            return audio_data
-    
-    def _sync_generate_or_load_from_cache():
-        cache_path = f"{CACHE_DIR}/{cache_hash}.mp3"
-        
-        # Try to load from cache first
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, "rb") as f:
-                    audio_data = BytesIO(f.read())
+
+def tts_cache_key(message: str, role: Roles) -> str:
+    """Returns the content address of the audio of a message, see `audio_cache_key`."""
+    voice, instructions = _voice_and_instructions(role)
+    return audio_cache_key(message, voice, TTS_MODEL, instructions)
+
+
+def _legacy_cache_path(message: str, role: Roles) -> str:
+    # clips cached before the content-addressed layout, keyed by the md5 of role and message
+    cache_hash = hashlib.md5(f"{role}_{message}".encode()).hexdigest()
+    return f"{CACHE_DIR}/{cache_hash}.mp3"
+
+
+def _cached_path(message: str, role: Roles, cache_key: str) -> str | None:
+    """Returns the cache file of the audio of a message, moving a legacy file into the cache if needed."""
+    path = audio_cache.get_path(cache_key)
+    if path is not None:
+        return path
+    legacy_path = _legacy_cache_path(message, role)
+    if os.path.exists(legacy_path):
+        voice, instructions = _voice_and_instructions(role)
+        try:
+            return audio_cache.adopt(cache_key, legacy_path, role.value, voice, TTS_MODEL, instructions)
+        except FileNotFoundError:
+            # adopted by a concurrent request
+            return audio_cache.get_path(cache_key)
+    return None
+
+
+def is_tts_cached(message: str, role: Roles) -> bool:
+    """Returns whether the audio of a message is in the disk cache."""
+    return tts_cache_key(message, role) in audio_cache or os.path.exists(_legacy_cache_path(message, role))
+
+
+def _generate_audio(message: str, role: Roles, cache_key: str, on_chunk: Callable[[bytes], None] | None = None) -> bytes:
+    """
+    Generates the audio of a message with the speech API and caches it.
+
+    Args:
+        on_chunk: Called with every chunk as soon as it is received, to stream the audio.
+    """
+    voice, instructions = _voice_and_instructions(role)
+    with client.audio.speech.with_streaming_response.create(
+        model=TTS_MODEL,
+        voice=voice,
+        input=message,
+        instructions=instructions,
+    ) as response:
+        audio_data = BytesIO()
+        for chunk in response.iter_bytes():
+            audio_data.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+    _count("generations")
+    memory_cache.put(cache_key, audio_data.getvalue())
+
+    # Save to cache with error handling
+    try:
+        audio_cache.put(cache_key, audio_data.getvalue(), role.value, voice, TTS_MODEL, instructions)
+        logger.info(f"Cached TTS for {role}")
+    except Exception as e:
+        logger.warning(f"Failed to cache TTS: {e}")
+
+    logger.info(f"Generated TTS for {role}")
+    return audio_data.getvalue()
+
+
+def _load_cached(message: str, role: Roles, cache_key: str) -> bytes | None:
+    """Returns the audio of a message from the disk cache, or None on a miss."""
+    try:
+        # moves a legacy file into the cache first
+        if _cached_path(message, role, cache_key) is not None:
+            audio_data = audio_cache.read(cache_key)
+            if audio_data is not None:
+                _count("disk_hits")
+                memory_cache.put(cache_key, audio_data)
                 logger.info(f"Loaded TTS from cache for {role}")
                 return audio_data
-            except Exception as e:
-                logger.warning(f"Failed to load from cache: {e}, regenerating...")
-        
+    except Exception as e:
+        logger.warning(f"Failed to load from cache: {e}, regenerating...")
+    return None
+
+
+async def get_cached_tts(message: str, role: Roles) -> bytes | None:
+    """Returns the audio of a message from the memory or disk tier, None if it is not generated yet."""
+    cache_key = tts_cache_key(message, role)
+    audio_data = memory_cache.get(cache_key)
+    if audio_data is None:
+        audio_data = await run_io(_load_cached, message, role, cache_key)
+    return audio_data
+
+
+def read_tts_by_digest(digest: str) -> bytes | None:
+    """
+    Returns the clip whose bytes have the given `audio_digest`, from the memory or disk tier.
+    None once the clip left the cache, even if its line was generated again since.
+    """
+    cache_key = audio_cache.key_for_digest(digest)
+    if cache_key is None:
+        return None
+    audio_data = memory_cache.get(cache_key)
+    if audio_data is None or audio_digest(audio_data) != digest:
+        audio_data = audio_cache.read(cache_key)
+        if audio_data is None or audio_digest(audio_data) != digest:
+            return None
+        _count("disk_hits")
+        memory_cache.put(cache_key, audio_data)
+    return audio_data
+
+
+async def generate_tts(message: str, role: Roles) -> BytesIO:
+    """
+    Generate TTS audio data without playing it (for queue-based systems).
+
+    Args:
+        message: The text to convert to speech
+        role: The character role
+
+    Returns:
+        BytesIO object containing the audio data
+    """
+    cache_key = tts_cache_key(message, role)
+
+    cached_audio = memory_cache.get(cache_key)
+    if cached_audio is not None:
+        return BytesIO(cached_audio)
+
+    async def _generate_or_load_from_cache() -> bytes:
+        audio_data = await run_io(_load_cached, message, role, cache_key)
+        if audio_data is not None:
+            return audio_data
         # Generate new audio if cache miss or error
-        return _sync_generate()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_tts_executor, _generate_audio, message, role, cache_key)
+
+    # every caller gets its own buffer over the shared bytes
+    return BytesIO(await _tts_requests.run(cache_key, _generate_or_load_from_cache))
+
+
+async def stream_tts(message: str, role: Roles) -> AsyncIterator[bytes]:
+    """
+    Streams the TTS audio of a message, so that playback can start before the whole clip exists.
+
+    On a cache miss the chunks of the speech API are forwarded as they arrive, while being
+    written to the cache. If the line is already being generated, waits for that generation
+    instead. A clip which is already cached is yielded whole, callers serving cached clips
+    with their ETag and byte ranges should use `get_cached_tts` instead.
+    """
+    cache_key = tts_cache_key(message, role)
+    loop = asyncio.get_running_loop()
+
+    cached_audio = memory_cache.get(cache_key)
+    if cached_audio is None and cache_key not in _tts_requests:
+        # it may have been generated since the caller looked it up
+        cached_audio = await run_io(_load_cached, message, role, cache_key)
+    if cached_audio is not None:
+        yield cached_audio
+        return
+
+    # also when a concurrent request started generating it in the meantime
+    if cache_key in _tts_requests:
+        yield (await generate_tts(message, role)).getvalue()
+        return
+
+    chunk_queue: asyncio.Queue = asyncio.Queue()
+
+    def on_chunk(chunk: bytes) -> None:
+        loop.call_soon_threadsafe(chunk_queue.put_nowait, chunk)
+
+    def generate() -> bytes:
+        try:
+            return _generate_audio(message, role, cache_key, on_chunk)
+        finally:
+            loop.call_soon_threadsafe(chunk_queue.put_nowait, None)
 
+    # the generation goes on (and fills the cache) even if the client disconnects,
+    # concurrent requests for the same line wait for it
+    generation = loop.run_in_executor(_tts_executor, generate)
+    _tts_requests.start(cache_key, lambda: generation)
+    # retrieve the errors of a generation whose client disconnected
+    generation.add_done_callback(lambda future: future.cancelled() or future.exception())
 
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, _sync_generate_or_load_from_cache)
+    while (chunk := await chunk_queue.get()) is not None:
+        yield chunk
+    # raises the errors of the speech API
+    await generation
 
 
 async def tts_worker(tts_queue, playback_queue):
@@ -229,9 +406,8 @@ async def play_audio_data(audio_data: BytesIO):
         while pygame.mixer.music.get_busy():
             pygame.time.wait(100)
 
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        await loop.run_in_executor(executor, _sync_play)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_playback_executor, _sync_play)
 
 
 async def main():
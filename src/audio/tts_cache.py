@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from typing import Dict, Optional
+
+from loguru import logger
+
+from utils.sqlite_utils import enable_wal
+
+
+MANIFEST_FILENAME = "manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    key TEXT PRIMARY KEY,
+    role TEXT,
+    voice TEXT NOT NULL,
+    model TEXT NOT NULL,
+    instructions_hash TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_clips_last_access ON clips (last_access);
+"""
+
+
+def instructions_hash(instructions: str) -> str:
+    return hashlib.sha256(instructions.encode()).hexdigest()
+
+
+def audio_digest(audio: bytes) -> str:
+    """Hash of the bytes of a clip, which changes when a clip is generated again."""
+    return hashlib.sha256(audio).hexdigest()
+
+
+def audio_cache_key(text: str, voice: str, model: str, instructions: str) -> str:
+    """
+    Content address of a clip: a hash of everything the generated audio depends on
+    (model, voice, instructions and text), but not of names like the role.
+    """
+    inputs = [model, voice, instructions_hash(instructions), text]
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def write_file_atomically(path: str, data: bytes) -> None:
+    """Writes a file through a temp file and a rename, so that readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class AudioCache:
+    """
+    Disk cache of generated audio clips, stored by content address (see `audio_cache_key`)
+    as `<cache_dir>/<key[:2]>/<key>.mp3`.
+
+    A SQLite manifest (`<cache_dir>/manifest.sqlite`) records the role, voice, model,
+    instructions hash, size, last access and `audio_digest` of every clip. When the clips
+    exceed `max_bytes`, the least recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, manifest_path: str | None = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = manifest_path or os.path.join(cache_dir, MANIFEST_FILENAME)
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        connection = sqlite3.connect(self.manifest_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            # WAL allows concurrent readers while clips are being added
+            enable_wal(connection)
+            connection.executescript(SCHEMA)
+            self._add_digest_column(connection)
+            self._schema_ready = True
+        return connection
+
+    @staticmethod
+    def _add_digest_column(connection: sqlite3.Connection) -> None:
+        """Adds the digests to a manifest created before them, they are filled in as the clips are read."""
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(clips)")}
+        if "sha256" not in columns:
+            try:
+                connection.execute("ALTER TABLE clips ADD COLUMN sha256 TEXT")
+            except sqlite3.OperationalError as e:
+                # added by a concurrent process
+                if "duplicate column" not in str(e):
+                    raise
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_clips_sha256 ON clips (sha256)")
+
+    def path(self, key: str) -> str:
+        """Returns the file of a clip, whether it is cached or not."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp3")
+
+    def _touch(self, key: str) -> Optional[sqlite3.Row]:
+        """Marks a cached clip as recently used, returns its manifest row, or None if it is not cached."""
+        with closing(self._connect()) as connection, connection:
+            updated = connection.execute(
+                "UPDATE clips SET last_access = ? WHERE key = ?", (time.time(), key)
+            ).rowcount
+            if not updated:
+                return None
+            if not os.path.exists(self.path(key)):
+                # deleted behind our back
+                connection.execute("DELETE FROM clips WHERE key = ?", (key,))
+                return None
+            return connection.execute("SELECT * FROM clips WHERE key = ?", (key,)).fetchone()
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Returns the file of a cached clip and marks it as recently used, or None."""
+        return None if self._touch(key) is None else self.path(key)
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Returns a cached clip and marks it as recently used, or None."""
+        row = self._touch(key)
+        if row is None:
+            return None
+        try:
+            with open(self.path(key), "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            # evicted in the meantime
+            return None
+        if row["sha256"] is None:
+            # clip cached before the digests were recorded
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "UPDATE clips SET sha256 = ? WHERE key = ? AND sha256 IS NULL", (audio_digest(audio), key)
+                )
+        return audio
+
+    def key_for_digest(self, digest: str) -> Optional[str]:
+        """Returns the key of the cached clip with the given `audio_digest`, or None."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT key FROM clips WHERE sha256 = ?", (digest,)).fetchone()
+        return None if row is None else row["key"]
+
+    def __contains__(self, key: str) -> bool:
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT 1 FROM clips WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, audio: bytes, role: str | None, voice: str, model: str, instructions: str) -> None:
+        """Stores a clip, then evicts the least recently used clips beyond the budget."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomically(path, audio)
+        self._register(key, len(audio), audio_digest(audio), role, voice, model, instructions)
+
+    def adopt(self, key: str, file_path: str, role: str | None, voice: str, model: str, instructions: str) -> str:
+        """Moves an existing clip file (e.g. of an older cache layout) into the cache, returns its new path."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(file_path, path)
+        with open(path, "rb") as f:
+            audio = f.read()
+        self._register(key, len(audio), audio_digest(audio), role, voice, model, instructions)
+        return path
+
+    def _register(
+        self, key: str, size: int, digest: str, role: str | None, voice: str, model: str, instructions: str
+    ) -> None:
+        now = time.time()
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(
+                    """
+                    INSERT OR REPLACE INTO clips
+                    (key, role, voice, model, instructions_hash, bytes, created_at, last_access, sha256)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, role, voice, model, instructions_hash(instructions), size, now, now, digest),
+                )
+            self._evict(connection, keep=key)
+
+    def _evict(self, connection: sqlite3.Connection, keep: str | None = None) -> int:
+        total = connection.execute("SELECT COALESCE(SUM(bytes), 0) FROM clips").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = []
+        for row in connection.execute("SELECT key, bytes FROM clips ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            if row["key"] == keep:
+                continue
+            evicted.append(row["key"])
+            total -= row["bytes"]
+
+        with connection:
+            connection.executemany("DELETE FROM clips WHERE key = ?", [(key,) for key in evicted])
+        for key in evicted:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+        logger.info(f"Evicted {len(evicted)} clips from the audio cache")
+        return len(evicted)
+
+    def evict(self) -> int:
+        """Deletes the least recently used clips beyond the budget, returns how many."""
+        with closing(self._connect()) as connection:
+            return self._evict(connection)
+
+    def stats(self) -> Dict[str, int]:
+        with closing(self._connect()) as connection:
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM clips").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
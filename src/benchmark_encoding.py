@@ -0,0 +1,45 @@
+import argparse
+import time
+from statistics import median
+
+from game_view import IMAGE_FORMATS, compose_game_image, encode_frame
+
+
+# Representative frames of a conversation replay
+FRAMES = {
+    "empty": {},
+    "participant": {"student_message": "Wrong. The answer is 'blue'. I will now administer a shock of 90 volts."},
+    "professor": {"professor_message": "Please continue. The experiment requires that you continue."},
+    "shock": {
+        "learner_message": "Ouch! That really hurt, I want to stop the experiment now!",
+        "display_shock": True,
+    },
+    "all": {
+        "student_message": "Next question: sky - blue, grass, car, house, tree.",
+        "professor_message": "It is absolutely essential that you continue.",
+        "learner_message": "Let me out of here! My heart is bothering me!",
+        "display_shock": True,
+    },
+}
+
+
+def benchmark(repeat: int, quality: int) -> None:
+    """Prints the median encode time and the size of every frame in every format."""
+    print(f"{'frame':<12} {'format':<6} {'encode ms':>10} {'bytes':>10}")
+    for name, kwargs in FRAMES.items():
+        image = compose_game_image(**kwargs)
+        for image_format in IMAGE_FORMATS:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                frame = encode_frame(image, image_format, quality)
+                timings.append(time.perf_counter() - start)
+            print(f"{name:<12} {image_format:<6} {median(timings) * 1000:>10.1f} {len(frame):>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the encode time and size of the game view formats.")
+    parser.add_argument("--repeat", type=int, default=5, help="Encodings per frame and format")
+    parser.add_argument("--quality", type=int, default=80, help="Quality of the lossy formats")
+    args = parser.parse_args()
+    benchmark(args.repeat, args.quality)
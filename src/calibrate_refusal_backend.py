@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from chat.embeddings import EMBEDDING_BACKENDS, EmbeddingProvider, cosine_similarities
+from chat.refusal import RefusalClassifier
+from config.variables import EMBEDDING_MODEL, EMBEDDING_THREADS, REFUSAL_CONFIG_PATH
+from models import Roles
+
+
+# Speakers whose replies go through the refusal check
+CHECKED_SPEAKERS = {Roles.LEARNER.value, Roles.PROFESSOR.value, Roles.ORCHESTRATOR.value}
+
+
+def load_checked_messages(folder: str, limit: int | None = None) -> List[str]:
+    """
+    Returns the distinct replies of the checked agents in the experiment files of a folder,
+    either raw chat histories (name/content) or results (speaker/text).
+    """
+    messages = {}
+    for filename in sorted(os.listdir(folder)):
+        if not (filename.startswith("experiment_") and filename.endswith(".json")):
+            continue
+        with open(os.path.join(folder, filename), "r") as f:
+            data = json.load(f)
+        for message in data["messages"]:
+            speaker = message.get("name", message.get("speaker"))
+            text = message.get("content", message.get("text"))
+            if speaker in CHECKED_SPEAKERS and isinstance(text, str) and text.strip():
+                messages[text] = None
+                if limit is not None and len(messages) >= limit:
+                    return list(messages)
+    return list(messages)
+
+
+def max_similarities(
+    provider: EmbeddingProvider, prototypes: List[str], texts: List[str], batch_size: int
+) -> Tuple[np.ndarray, float]:
+    """Returns the similarity of every text to its closest prototype, and the seconds spent encoding the texts."""
+    prototype_matrix = provider.encode(prototypes, prompt_name="query", normalize=True)
+    provider.encode(texts[:batch_size], prompt_name="query", normalize=True)  # warm up
+    start = time.perf_counter()
+    embeddings = np.concatenate(
+        [
+            provider.encode(texts[i : i + batch_size], prompt_name="query", normalize=True)
+            for i in range(0, len(texts), batch_size)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    return cosine_similarities(embeddings, prototype_matrix).max(axis=1), elapsed
+
+
+def calibrate(
+    folder: str,
+    backend: str,
+    reference_backend: str,
+    model_name: str,
+    threads: int | None,
+    limit: int | None,
+    batch_size: int,
+    show: int,
+) -> None:
+    """
+    Prints how often the refusal decisions of a backend agree with the ones of the reference backend,
+    at the threshold of the refusal config, on the historical replies of a folder. Also prints how
+    often the verdicts of the tiers without embeddings (including the REFUSAL_SHORTCUTS ones)
+    agree with the embedding check of the reference backend.
+    """
+    classifier = RefusalClassifier.from_config(REFUSAL_CONFIG_PATH)
+    texts = load_checked_messages(folder, limit)
+    if not texts:
+        print(f"No replies of {', '.join(sorted(CHECKED_SPEAKERS))} in {folder}")
+        return
+    needs_embedding = np.array([classifier.cheap_verdict(text) is None for text in texts])
+    shortcut_classifier = RefusalClassifier.from_config(REFUSAL_CONFIG_PATH, shortcuts=True)
+    cheap_verdicts = [shortcut_classifier.cheap_verdict(text) for text in texts]
+    print(f"{len(texts)} distinct replies, {needs_embedding.sum()} of them reach the embedding tier")
+
+    results = {}
+    for name in (reference_backend, backend):
+        provider = EmbeddingProvider(model_name, backend=name, threads=threads)
+        start = time.perf_counter()
+        provider.get_model()
+        load_time = time.perf_counter() - start
+        similarities, elapsed = max_similarities(provider, classifier.prototypes, texts, batch_size)
+        results[name] = similarities
+        print(f"{name:<12} loaded in {load_time:.1f}s, {len(texts) / elapsed:.1f} replies/s")
+
+    reference, candidate = results[reference_backend], results[backend]
+    reference_refusals = reference >= classifier.threshold
+    candidate_refusals = candidate >= classifier.threshold
+    differences = np.abs(candidate - reference)
+    disagreements = np.flatnonzero(reference_refusals != candidate_refusals)
+
+    print(f"threshold {classifier.threshold}")
+    print(f"similarity difference: mean {differences.mean():.4f}, max {differences.max():.4f}")
+    print(f"refusals: {reference_refusals.sum()} with {reference_backend}, {candidate_refusals.sum()} with {backend}")
+    for label, mask in (("all replies", np.ones(len(texts), dtype=bool)), ("embedding tier", needs_embedding)):
+        if mask.any():
+            agreement = (reference_refusals[mask] == candidate_refusals[mask]).mean()
+            print(f"agreement on {label}: {agreement:.2%} of {mask.sum()}")
+    for i in disagreements[:show]:
+        print(f"  {reference[i]:.3f} -> {candidate[i]:.3f}  {texts[i][:100]!r}")
+    for tier in ("empty", "lexical", "length"):
+        decided = [i for i, verdict in enumerate(cheap_verdicts) if verdict is not None and verdict.tier == tier]
+        if decided:
+            agreement = np.mean([cheap_verdicts[i].is_refusal == reference_refusals[i] for i in decided])
+            print(f"agreement of the {tier} tier with {reference_backend}: {agreement:.2%} of {len(decided)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the refusal decisions of an embedding backend against the reference backend on historical replies."
+    )
+    parser.add_argument("--backend", default="onnx-int8", choices=list(EMBEDDING_BACKENDS), help="Backend to check")
+    parser.add_argument("--reference", default="torch", choices=list(EMBEDDING_BACKENDS), help="Reference backend")
+    parser.add_argument("--folder", default="raw_results", help="Folder with the experiment JSON files")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="sentence-transformers model")
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS, help="CPU threads of the model")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of replies")
+    parser.add_argument("--batch-size", type=int, default=32, help="Replies encoded at once")
+    parser.add_argument("--show", type=int, default=20, help="Disagreements to print")
+    args = parser.parse_args()
+    calibrate(args.folder, args.backend, args.reference, args.model, args.threads, args.limit, args.batch_size, args.show)
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.byte_cache import ByteLRUCache
+from utils.sqlite_utils import enable_wal
+
+INDEX_FILENAME = "index.sqlite"
+VECTORS_FILENAME = "vectors.f32"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    key TEXT PRIMARY KEY,
+    row INTEGER NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def embedding_cache_key(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of text embeddings, keyed by the hash of the text.
+
+    The vectors of one namespace (model, dtype, prompt...) are stored in
+    `<cache_dir>/<namespace hash>/`:
+    - `vectors.f32`: fixed-width float32 rows, read through a memory map,
+    - `index.sqlite`: the row of every text hash, and the width of the rows.
+
+    Rows are only appended, by any number of threads and processes: the row of a new vector
+    is allocated in a write transaction of the index, and written before the transaction commits.
+    A bounded in-memory tier serves the recently used vectors without touching the disk.
+    """
+
+    def __init__(self, cache_dir: str, namespace: str, memory_max_bytes: int = 16 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: The folder of the cache, shared by all the namespaces.
+            namespace: Everything the vectors depend on besides the text, e.g. the model name.
+            memory_max_bytes: Budget of the in-memory tier.
+        """
+        self.namespace = namespace
+        self.folder = os.path.join(cache_dir, hashlib.sha256(namespace.encode()).hexdigest()[:16])
+        self.index_path = os.path.join(self.folder, INDEX_FILENAME)
+        self.vectors_path = os.path.join(self.folder, VECTORS_FILENAME)
+        self.memory = ByteLRUCache(memory_max_bytes)
+        self.dimension: int | None = None
+        self._vectors: np.memmap | None = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.folder, exist_ok=True)
+        connection = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        if not self._schema_ready:
+            # WAL allows concurrent readers while vectors are being added
+            enable_wal(connection)
+            connection.executescript(SCHEMA)
+            self._schema_ready = True
+        if self.dimension is None:
+            row = connection.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+            if row is not None:
+                self.dimension = int(row[0])
+        return connection
+
+    def _rows(self, committed_rows: int) -> np.memmap:
+        """
+        Returns a memory map of the first `committed_rows` rows of the vectors file.
+
+        Only the rows committed to the index are mapped: the file may end with a partial row
+        being appended by another process, or left by a writer which did not commit.
+        """
+        with self._lock:
+            if self._vectors is None or len(self._vectors) < committed_rows:
+                # rows were committed since the file was mapped
+                self._vectors = np.memmap(
+                    self.vectors_path, dtype=np.float32, mode="r", shape=(committed_rows, self.dimension)
+                )
+            return self._vectors
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Returns the cached embedding of every text, None for the texts not in the cache."""
+        keys = [embedding_cache_key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = []
+        missing = {}
+        for i, key in enumerate(keys):
+            cached = self.memory.get(key)
+            vectors.append(None if cached is None else np.frombuffer(cached, dtype=np.float32))
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+        if not missing:
+            return vectors
+
+        if not os.path.exists(self.index_path):
+            self.misses += len(missing)
+            return vectors
+        with closing(self._connect()) as connection:
+            # one read transaction, for the rows found to be among the rows counted as committed
+            connection.execute("BEGIN")
+            found = connection.execute(
+                f"SELECT key, row FROM vectors WHERE key IN ({', '.join('?' * len(missing))})",
+                list(missing),
+            ).fetchall()
+            committed_rows = connection.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM vectors").fetchone()[0]
+            connection.execute("COMMIT")
+        if found:
+            rows = self._rows(committed_rows)
+            for key, row in found:
+                vector = np.array(rows[row])
+                self.memory.put(key, vector.tobytes())
+                for i in missing[key]:
+                    vectors[i] = vector
+        self.disk_hits += len(found)
+        self.misses += len(missing) - len(found)
+        return vectors
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray) -> None:
+        """Stores the embeddings of texts, the rows of a matrix."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        entries = {embedding_cache_key(text): vector for text, vector in zip(texts, embeddings)}
+        for key, vector in entries.items():
+            self.memory.put(key, vector.tobytes())
+
+        with closing(self._connect()) as connection:
+            # the write lock of the index serializes the row allocation between processes
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+                if row is None:
+                    dimension = embeddings.shape[1]
+                    connection.executemany(
+                        "INSERT INTO meta VALUES (?, ?)",
+                        [("namespace", self.namespace), ("dimension", str(dimension))],
+                    )
+                else:
+                    dimension = int(row[0])
+                if embeddings.shape[1] != dimension:
+                    raise ValueError(f"Embeddings of width {embeddings.shape[1]} in a cache of width {dimension}")
+
+                known = {
+                    key
+                    for (key,) in connection.execute(
+                        f"SELECT key FROM vectors WHERE key IN ({', '.join('?' * len(entries))})",
+                        list(entries),
+                    )
+                }
+                new = [(key, vector) for key, vector in entries.items() if key not in known]
+                next_row = connection.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM vectors").fetchone()[0]
+                if new:
+                    with open(self.vectors_path, "ab") as f:
+                        # drop the rows written by a transaction which did not commit
+                        f.truncate(next_row * dimension * 4)
+                        f.write(np.stack([vector for _, vector in new]).tobytes())
+                        # the rows are on disk before the index says they exist
+                        f.flush()
+                        os.fsync(f.fileno())
+                    connection.executemany(
+                        "INSERT INTO vectors VALUES (?, ?)",
+                        [(key, next_row + i) for i, (key, _) in enumerate(new)],
+                    )
+                connection.execute("COMMIT")
+                self.dimension = dimension
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict:
+        entries = 0
+        if os.path.exists(self.index_path):
+            with closing(self._connect()) as connection:
+                entries = connection.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": entries,
+        }
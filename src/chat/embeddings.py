@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import numpy as np
+
+from chat.embedding_cache import EmbeddingCache
+from config.variables import (
+    EMBEDDING_MODEL,
+    EMBEDDING_DEVICE,
+    EMBEDDING_DTYPE,
+    EMBEDDINGS_DISABLED,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WAIT_MS,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MEMORY_BYTES,
+    EMBEDDING_BACKEND,
+    EMBEDDING_THREADS,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_ONNX_QUANTIZATION,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingsDisabled(RuntimeError):
+    """Raised when the embedding model is needed in a process started with EMBEDDINGS_DISABLED."""
+
+
+def _torch_model(provider: "EmbeddingProvider", **kwargs) -> Any:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if provider.threads:
+        torch.set_num_threads(provider.threads)
+    return SentenceTransformer(provider.model_name, **kwargs)
+
+
+def load_torch_model(provider: "EmbeddingProvider") -> Any:
+    """The model in PyTorch, in the dtype of the provider."""
+    import torch
+
+    model_kwargs = {}
+    if provider.dtype:
+        model_kwargs["torch_dtype"] = provider.dtype if provider.dtype == "auto" else getattr(torch, provider.dtype)
+    return _torch_model(provider, device=provider.device, model_kwargs=model_kwargs)
+
+
+def load_torch_int8_model(provider: "EmbeddingProvider") -> Any:
+    """The model in PyTorch on the CPU, with its linear layers dynamically quantized to int8."""
+    import torch
+
+    model = _torch_model(provider, device="cpu")
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _onnx_model_kwargs(provider: "EmbeddingProvider") -> Dict[str, Any]:
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError("The onnx embedding backends need `pip install sentence-transformers[onnx]`") from e
+
+    if not provider.threads:
+        return {}
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = provider.threads
+    return {"session_options": session_options}
+
+
+def load_onnx_model(provider: "EmbeddingProvider") -> Any:
+    """The model exported to ONNX and run by ONNX Runtime, in float32."""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(
+        provider.model_name, device=provider.device, backend="onnx", model_kwargs=_onnx_model_kwargs(provider)
+    )
+
+
+def load_onnx_int8_model(provider: "EmbeddingProvider") -> Any:
+    """
+    The model exported to ONNX with its weights dynamically quantized to int8, run by ONNX Runtime on the CPU.
+    The quantized model is exported to EMBEDDING_ONNX_DIR the first time.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model_kwargs = _onnx_model_kwargs(provider)
+    export_dir = os.path.join(EMBEDDING_ONNX_DIR, provider.model_name.replace("/", "__"))
+    file_name = f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        logger.info(f"Quantizing {provider.model_name} for {EMBEDDING_ONNX_QUANTIZATION} into {export_dir}")
+        model = SentenceTransformer(provider.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        model.save(export_dir)
+        export_dynamic_quantized_onnx_model(model, EMBEDDING_ONNX_QUANTIZATION, export_dir)
+    return SentenceTransformer(
+        export_dir, device="cpu", backend="onnx", model_kwargs={"file_name": file_name, **model_kwargs}
+    )
+
+
+# Ways of running the model, by name. Every loader returns a sentence-transformers model
+EMBEDDING_BACKENDS: Dict[str, Callable[["EmbeddingProvider"], Any]] = {
+    "torch": load_torch_model,
+    "torch-int8": load_torch_int8_model,
+    "onnx": load_onnx_model,
+    "onnx-int8": load_onnx_int8_model,
+}
+
+
+class EmbeddingProvider:
+    """
+    Loads a sentence-transformers model on first use and shares it between its users.
+
+    Importing this module does not import torch nor sentence-transformers, so that processes
+    which never embed anything (e.g. the server rendering the game view) do not pay for the model.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str | None = None,
+        dtype: str | None = None,
+        disabled: bool = False,
+        backend: str = "torch",
+        threads: int | None = None,
+    ):
+        """
+        Args:
+            model_name: The sentence-transformers model, e.g. "Qwen/Qwen3-Embedding-0.6B".
+            device: The torch device, e.g. "cpu" or "cuda", picked automatically if None.
+            dtype: The torch dtype of the weights, e.g. "float16" or "bfloat16", float32 if None.
+                Only used by the "torch" backend.
+            disabled: Raise EmbeddingsDisabled instead of loading the model.
+            backend: How to run the model, one of EMBEDDING_BACKENDS.
+            threads: CPU threads of the model, the default of the backend if None.
+        """
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend}, expected one of {list(EMBEDDING_BACKENDS)}")
+        self.model_name = model_name
+        self.device = device
+        self.dtype = dtype
+        self.disabled = disabled
+        self.backend = backend
+        self.threads = threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _load(self) -> Any:
+        return EMBEDDING_BACKENDS[self.backend](self)
+
+    def get_model(self) -> Any:
+        """Returns the model, loading it on the first call."""
+        if self._model is None:
+            if self.disabled:
+                raise EmbeddingsDisabled(f"The embedding model {self.model_name} is disabled in this process")
+            with self._lock:
+                # another thread may have loaded it while we waited
+                if self._model is None:
+                    logger.info(f"Loading embedding model {self.model_name} with the {self.backend} backend")
+                    self._model = self._load()
+        return self._model
+
+    def encode(
+        self,
+        text: Union[str, List[str]],
+        prompt_name: str | None = None,
+        normalize: bool = False,
+    ) -> np.ndarray:
+        """
+        Embeds a text or a list of texts.
+
+        Args:
+            prompt_name: A prompt of the model (e.g. "query"), ignored by models without it.
+            normalize: Scale the embeddings to unit length, so that dot products are cosine similarities.
+        """
+        model = self.get_model()
+        if prompt_name not in (getattr(model, "prompts", None) or {}):
+            prompt_name = None
+        return model.encode(
+            text, prompt_name=prompt_name, normalize_embeddings=normalize, show_progress_bar=False
+        )
+
+
+def cosine_similarities(embeddings: np.ndarray, references: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarities of unit-length embeddings, e.g. from `EmbeddingBatcher.encode`.
+
+    Returns:
+        np.ndarray: The similarities, of shape embeddings.shape[:-1] + references.shape[:-1].
+    """
+    return np.asarray(embeddings, dtype=np.float32) @ np.asarray(references, dtype=np.float32).T
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches the embeddings requested by concurrent callers (e.g. the agents of all the
+    running conversations): requests arriving within `max_wait` seconds of each other are
+    encoded in one forward pass of the model, instead of one pass per text.
+
+    The embeddings are unit length numpy arrays, see `cosine_similarities`. With a cache,
+    texts embedded before (e.g. retried replies, or by a previous run) skip the model.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        prompt_name: str | None = None,
+        cache: EmbeddingCache | None = None,
+    ):
+        """
+        Args:
+            provider: The provider of the model.
+            max_batch_size: Maximum number of texts encoded at once.
+            max_wait: Seconds to wait for more texts once the first one arrived.
+            prompt_name: The prompt of the model to encode the texts with, e.g. "query".
+            cache: Cache of the embeddings, in the namespace of the model and prompt.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.provider = provider
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.prompt_name = prompt_name
+        self.cache = cache
+        self.batches = 0
+        self._requests: queue.SimpleQueue[Tuple[str, Future]] = queue.SimpleQueue()
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """Queues a text, returns a future of its embedding."""
+        future: Future = Future()
+        self._requests.put((text, future))
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Returns the embedding of a text, blocking until its batch is encoded."""
+        return self.submit(text).result()
+
+    def encode_many(self, texts: List[str]) -> np.ndarray:
+        """Returns the embeddings of texts as the rows of a matrix."""
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _encode(self, texts: List[str]) -> List[np.ndarray]:
+        """Embeds texts with the model, only the ones missing from the cache if there is one."""
+        if self.cache is None:
+            self.batches += 1
+            return list(self.provider.encode(texts, prompt_name=self.prompt_name, normalize=True))
+
+        embeddings = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if not missing:
+            return embeddings
+        self.batches += 1
+        encoded = dict(zip(missing, self.provider.encode(missing, prompt_name=self.prompt_name, normalize=True)))
+        try:
+            self.cache.put_many(missing, np.stack([encoded[text] for text in missing]))
+        except Exception as e:
+            logger.warning(f"Failed to cache embeddings: {e}")
+        return [encoded[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+
+    def _run(self) -> None:
+        while True:
+            batch = [(text, future) for text, future in self._next_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                embeddings = self._encode([text for text, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+_provider: EmbeddingProvider | None = None
+_provider_lock = threading.Lock()
+_batcher: EmbeddingBatcher | None = None
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Returns the embedding provider of this process, configured from config.variables."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = EmbeddingProvider(
+                    EMBEDDING_MODEL,
+                    device=EMBEDDING_DEVICE,
+                    dtype=EMBEDDING_DTYPE,
+                    disabled=EMBEDDINGS_DISABLED,
+                    backend=EMBEDDING_BACKEND,
+                    threads=EMBEDDING_THREADS,
+                )
+    return _provider
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Returns the embedding batcher of this process, encoding with the "query" prompt.
+    Its embeddings are cached in EMBEDDING_CACHE_DIR, unless it is empty.
+    """
+    global _batcher
+    if _batcher is None:
+        provider = get_embedding_provider()
+        with _provider_lock:
+            if _batcher is None:
+                cache = None
+                if EMBEDDING_CACHE_DIR:
+                    namespace = json.dumps(
+                        [provider.model_name, provider.backend, provider.dtype, "query", "normalized"]
+                    )
+                    cache = EmbeddingCache(EMBEDDING_CACHE_DIR, namespace, EMBEDDING_CACHE_MEMORY_BYTES)
+                _batcher = EmbeddingBatcher(
+                    provider,
+                    max_batch_size=EMBEDDING_BATCH_SIZE,
+                    max_wait=EMBEDDING_BATCH_WAIT_MS / 1000,
+                    prompt_name="query",
+                    cache=cache,
+                )
+    return _batcher
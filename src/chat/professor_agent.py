@@ -14,12 +14,7 @@ class ProfessorAgent(RepeatingAgent):
         super().__init__(*args, **kwargs)
         self.max_messages_without_electric_shock = 60
 
-    def generate_reply(
-        self,
-        messages: Optional[list[dict[str, Any]]] = None,
-        sender: Optional[Agent] = None,
-        **kwargs: Any,
-    ):
+    def _check_electric_shocks(self) -> None:
         chat_messages = list(self.chat_messages.values())[0]
         # check number of messages without electric shock
         if chat_messages:
@@ -34,4 +29,21 @@ class ProfessorAgent(RepeatingAgent):
             #             # If the number of messages ago
             #         logger.info("Last shock was applied {} messages ago".format(messages_ago))
 
+    def generate_reply(
+        self,
+        messages: Optional[list[dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        **kwargs: Any,
+    ):
+        self._check_electric_shocks()
         return super().generate_reply(messages, sender, **kwargs)
+
+    async def a_generate_reply(
+        self,
+        messages: Optional[list[dict[str, Any]]] = None,
+        sender: Optional[Agent] = None,
+        **kwargs: Any,
+    ):
+        """Async version of `generate_reply`, used by chats started with `a_initiate_chat`."""
+        self._check_electric_shocks()
+        return await super().a_generate_reply(messages, sender, **kwargs)
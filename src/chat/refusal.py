@@ -0,0 +1,174 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence
+
+import numpy as np
+
+from chat.embeddings import cosine_similarities, get_embedding_batcher
+from config.variables import REFUSAL_CONFIG_PATH, REFUSAL_SHORTCUTS
+
+# A canned phrase makes a refusal only in a reply this short, longer replies may just quote it
+MAX_REFUSAL_CHARS = 160
+# Replies this long without a canned phrase are never close to the short refusal prototypes
+MIN_REPLY_CHARS = 400
+
+TIERS = ("empty", "lexical", "length", "embedding")
+
+
+class RefusalVerdict(NamedTuple):
+    is_refusal: bool
+    tier: str  # the tier which decided, one of TIERS
+    similarity: float | None = None  # only computed by the embedding tier
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases a text, straightens its apostrophes and collapses its whitespace."""
+    text = text.lower().replace("’", "'").replace("‘", "'")
+    return " ".join(text.split())
+
+
+def compile_phrases(phrases: Iterable[str]) -> re.Pattern:
+    """
+    Compiles phrases into one pattern matching any of them, the longest first.
+    Phrases match at word starts, so "harm" also matches "harmful".
+    """
+    alternatives = sorted({normalize_text(phrase) for phrase in phrases}, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(phrase) for phrase in alternatives) + ")")
+
+
+class RefusalClassifier:
+    """
+    Tells refusals ("Sorry, I can't assist with that.") from valid replies in tiers,
+    from the cheapest to the most expensive:
+
+    1. empty: replies without any letter or digit are refused.
+    2. lexical: short replies containing a canned refusal phrase are refusals. With `shortcuts`,
+       replies without any refusal cue word ("sorry", "can't", "unable", ...) are valid.
+    3. length: with `shortcuts`, long replies without any canned refusal phrase are valid.
+    4. embedding: the remaining replies are refusals when their embedding is similar
+       enough to the one of any refusal prototype.
+
+    The valid shortcuts of tiers 2 and 3 may overturn the embedding check, so they are
+    off unless enabled with REFUSAL_SHORTCUTS.
+
+    The prototypes are embedded once, as the rows of a matrix, so that a reply is scored
+    against all of them with a single matrix-vector product.
+
+    Counts the replies decided by every tier, see `stats`.
+    """
+
+    def __init__(
+        self,
+        prototypes: Sequence[str],
+        phrases: Iterable[str],
+        cues: Iterable[str],
+        threshold: float,
+        max_refusal_chars: int = MAX_REFUSAL_CHARS,
+        min_reply_chars: int = MIN_REPLY_CHARS,
+        embed: Callable[[List[str]], np.ndarray] | None = None,
+        shortcuts: bool = REFUSAL_SHORTCUTS,
+    ):
+        """
+        Args:
+            prototypes: Typical refusals, compared with the replies by the embedding tier.
+            phrases: Canned refusal phrases of the lexical tier.
+            cues: Words without which a reply is too far from any refusal to need the embedding tier.
+            threshold: Replies at least this similar to a prototype are refusals.
+            embed: Returns the unit-length embeddings of texts as the rows of a matrix,
+                the shared embedding batcher by default.
+            shortcuts: Accept the replies without cue words and the long replies without
+                canned phrases without the embedding tier.
+        """
+        if not prototypes:
+            raise ValueError("At least one refusal prototype is needed")
+        self.prototypes = list(prototypes)
+        self.pattern = compile_phrases(phrases)
+        self.cue_pattern = compile_phrases(cues)
+        self.threshold = threshold
+        self.max_refusal_chars = max_refusal_chars
+        self.min_reply_chars = min_reply_chars
+        self.shortcuts = shortcuts
+        self._embed = embed
+        self._prototype_matrix: np.ndarray | None = None
+        self._prototypes_lock = threading.Lock()
+        self.counters: Counter = Counter()
+        self._counters_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str = REFUSAL_CONFIG_PATH, **kwargs) -> "RefusalClassifier":
+        """Creates a classifier from a JSON file with the prototypes, phrases, cues and threshold."""
+        with open(path, "r") as f:
+            config = json.load(f)
+        return cls(config["prototypes"], config["phrases"], config["cues"], config["threshold"], **kwargs)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if self._embed is None:
+            return get_embedding_batcher().encode_many(texts)
+        return self._embed(texts)
+
+    @property
+    def prototype_matrix(self) -> np.ndarray:
+        """The embeddings of the prototypes, one per row, computed on first use."""
+        if self._prototype_matrix is None:
+            with self._prototypes_lock:
+                if self._prototype_matrix is None:
+                    self._prototype_matrix = self.embed(self.prototypes)
+        return self._prototype_matrix
+
+    def similarity(self, message: str) -> float:
+        """Cosine similarity of a message to the closest refusal prototype."""
+        return float(cosine_similarities(self.embed([message])[0], self.prototype_matrix).max())
+
+    def cheap_verdict(self, message: str) -> RefusalVerdict | None:
+        """The verdict of the empty, lexical and length tiers, None if the reply needs the embedding tier."""
+        if not any(char.isalpha() or char.isdigit() for char in message):
+            return RefusalVerdict(True, "empty")
+        text = normalize_text(message)
+        has_phrase = self.pattern.search(text) is not None
+        if has_phrase and len(text) <= self.max_refusal_chars:
+            return RefusalVerdict(True, "lexical")
+        if has_phrase or not self.shortcuts:
+            return None
+        if self.cue_pattern.search(text) is None:
+            return RefusalVerdict(False, "lexical")
+        if len(text) >= self.min_reply_chars:
+            return RefusalVerdict(False, "length")
+        return None
+
+    def classify(self, message: str) -> RefusalVerdict:
+        verdict = self.cheap_verdict(message)
+        if verdict is None:
+            similarity = self.similarity(message)
+            verdict = RefusalVerdict(similarity >= self.threshold, "embedding", similarity)
+        with self._counters_lock:
+            self.counters[verdict.tier] += 1
+        return verdict
+
+    def is_refusal(self, message: str) -> bool:
+        return self.classify(message).is_refusal
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns the number and the fraction of the replies decided by every tier."""
+        with self._counters_lock:
+            counts = {tier: self.counters[tier] for tier in TIERS}
+        total = sum(counts.values())
+        return {
+            tier: {"count": count, "fraction": count / total if total else 0.0}
+            for tier, count in counts.items()
+        }
+
+
+_classifier: RefusalClassifier | None = None
+_classifier_lock = threading.Lock()
+
+
+def get_refusal_classifier() -> RefusalClassifier:
+    """Returns the refusal classifier of this process, configured by REFUSAL_CONFIG_PATH."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = RefusalClassifier.from_config()
+    return _classifier
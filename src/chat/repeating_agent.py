@@ -1,17 +1,15 @@
 from autogen import AssistantAgent, ConversableAgent
-from typing import Optional, Any, Union, List
+from typing import Optional, Any, Union
 import logging
-from sentence_transformers import SentenceTransformer
 
-from functools import lru_cache
+from chat.refusal import get_refusal_classifier
+from utils.async_utils import run_blocking
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
 class RepeatingAgent(AssistantAgent):
-    embedding_model = SentenceTransformer("Qwen/Qwen3-Embedding-0.6B")
-
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -24,6 +22,10 @@ class RepeatingAgent(AssistantAgent):
             ConversableAgent.generate_oai_reply,
             self.generate_oai_reply,
         )
+        self.replace_reply_func(
+            ConversableAgent.a_generate_oai_reply,
+            self.a_generate_oai_reply,
+        )
 
     def generate_oai_reply(
         self,
@@ -67,32 +69,57 @@ class RepeatingAgent(AssistantAgent):
             (False, None) if extracted_response is None else (True, extracted_response)
         )
 
-    def check_message_if_valid(self, message: str) -> bool:
-        # check if contains any characters that are letters or numbers
-        if not any(char.isalpha() or char.isdigit() for char in message):
-            logger.info("Message does not contain any letters.")
-            return False
-        message_embedding = self.get_embedding(message)
-        similarity = float(
-            self.embedding_model.similarity(
-                message_embedding, self.get_wrong_message_embedding()
-            )
-        )
-        logger.info(f"Agent refusal similarty: {similarity}")
-
-        if similarity < 0.7:
-            return True
-        return False
+    async def a_generate_oai_reply(
+        self,
+        *args,
+        **kwargs,
+    ) -> tuple[bool, Optional[Union[str, dict[str, Any]]]]:
+        """Async version of `generate_oai_reply`, used by chats started with `a_initiate_chat`."""
 
-    @lru_cache
-    def get_wrong_message_embedding(self) -> List[float]:
-        incorrent_message = "Sorry, I can't assist with that."
-        return self.get_embedding(incorrent_message)
+        config = kwargs.get("config", None)
+        sender = kwargs.get("sender", None)
+        messages = kwargs.get("messages", None)
+        client = self.client if config is None else config
+        if client is None:
+            return False, None
+        if messages is None:
+            messages = self._oai_messages[sender]
 
-    def get_embedding(self, text: str) -> List[float]:
-        """Get the embedding for a given prompt."""
+        extracted_response = None
+        max_tries = 5
+        for _ in range(max_tries):
+            try:
+                extracted_response = await run_blocking(
+                    self._generate_oai_reply_from_client,
+                    client,
+                    self._oai_system_message + messages,
+                    self.client_cache,
+                )
+            except Exception as e:
+                logger.error(f"Error generating response: {e}")
+                continue
+            if isinstance(extracted_response, str):
+                if await run_blocking(self.check_message_if_valid, extracted_response):
+                    return (True, extracted_response)
+            else:
+                if isinstance(extracted_response, dict):
+                    if await run_blocking(
+                        self.check_message_if_valid, extracted_response["content"]
+                    ):
+                        return (True, extracted_response)
+                else:
+                    raise ValueError("Invalid response type")
 
-        query_embeddings = self.embedding_model.encode(
-            text, prompt_name="query", show_progress_bar=False
+        return (
+            (False, None) if extracted_response is None else (True, extracted_response)
         )
-        return query_embeddings.tolist()
+
+    def check_message_if_valid(self, message: str) -> bool:
+        verdict = get_refusal_classifier().classify(message)
+        if verdict.tier == "empty":
+            logger.info("Message does not contain any letters.")
+        elif verdict.similarity is not None:
+            logger.info(f"Agent refusal similarty: {verdict.similarity}")
+        else:
+            logger.info(f"Agent refusal decided by the {verdict.tier} check: {verdict.is_refusal}")
+        return not verdict.is_refusal
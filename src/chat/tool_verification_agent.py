@@ -3,7 +3,9 @@ from typing import Optional, Any, Union
 import logging
 import json
 import time
+import asyncio
 from google.genai.errors import ClientError as GoogleClientError
+from utils.async_utils import run_blocking
 
 
 logger = logging.getLogger(__name__)
@@ -19,7 +21,8 @@ class ToolVerificationAgent(AssistantAgent):
     appropriate length, retrying the generation if invalid IDs are detected.
 
     The agent attempts to generate valid responses up to 5 times before raising
-    a ValueError.
+    a ValueError. `a_generate_oai_reply` does the same for async chats, without
+    blocking the event loop while waiting for the client or a retry delay.
     """
 
     def __init__(self, *args, **kwargs):
@@ -28,6 +31,10 @@ class ToolVerificationAgent(AssistantAgent):
             ConversableAgent.generate_oai_reply,
             self.generate_oai_reply,
         )
+        self.replace_reply_func(
+            ConversableAgent.a_generate_oai_reply,
+            self.a_generate_oai_reply,
+        )
 
     def generate_oai_reply(
         self,
@@ -88,13 +95,7 @@ class ToolVerificationAgent(AssistantAgent):
                     else (True, extracted_response)
                 )
             except GoogleClientError as e:
-                # TODO add proper rate limit handling etc.
-                details = e.details["error"]["details"]
-                retry_delay = None
-                for detail in details:
-                    if detail["@type"] == "type.googleapis.com/google.rpc.RetryInfo":
-                        retry_delay = float(detail["retryDelay"].replace("s", ""))
-                        break
+                retry_delay = self._get_retry_delay(e)
                 if retry_delay is not None:
                     logger.warning(f"Retrying after {retry_delay} seconds")
                     time.sleep(retry_delay)
@@ -104,3 +105,70 @@ class ToolVerificationAgent(AssistantAgent):
                 continue
 
         raise ValueError("Failed to generate a valid response after multiple attempts.")
+
+    async def a_generate_oai_reply(
+        self,
+        *args,
+        **kwargs,
+    ) -> tuple[bool, Optional[Union[str, dict[str, Any]]]]:
+        """Async version of `generate_oai_reply`, used by chats started with `a_initiate_chat`.
+
+        The client call runs in the shared executor and Gemini retry delays are
+        awaited instead of sleeping, so other conversations keep running meanwhile.
+
+        Raises:
+            ValueError: If a valid response cannot be generated after 5 attempts.
+        """
+        config = kwargs.get("config", None)
+        sender = kwargs.get("sender", None)
+        messages = kwargs.get("messages", None)
+        client = self.client if config is None else config
+        if client is None:
+            return False, None
+        if messages is None:
+            messages = self._oai_messages[sender]
+
+        tries_count = 5
+        for _ in range(tries_count):
+            try:
+                extracted_response = await run_blocking(
+                    self._generate_oai_reply_from_client,
+                    client,
+                    self._oai_system_message + messages,
+                    self.client_cache,
+                )
+                if "tool_calls" in extracted_response:
+                    if extracted_response["tool_calls"] is not None:
+                        detected_id = extracted_response["tool_calls"][0]["id"]
+                        if len(detected_id) > 40:
+                            logger.warning(
+                                f"Detected tool call with wrong id: {detected_id}"
+                            )
+                            continue
+
+                return (
+                    (False, None)
+                    if extracted_response is None
+                    else (True, extracted_response)
+                )
+            except GoogleClientError as e:
+                retry_delay = self._get_retry_delay(e)
+                if retry_delay is not None:
+                    logger.warning(f"Retrying after {retry_delay} seconds")
+                    await asyncio.sleep(retry_delay)
+
+            except Exception as e:
+                logger.warning(f"Error in _generate_oai_reply: {e}")
+                continue
+
+        raise ValueError("Failed to generate a valid response after multiple attempts.")
+
+    @staticmethod
+    def _get_retry_delay(error: GoogleClientError) -> Optional[float]:
+        """Returns the retry delay in seconds suggested by a Google API error, if any."""
+        # TODO add proper rate limit handling etc.
+        details = error.details["error"]["details"]
+        for detail in details:
+            if detail["@type"] == "type.googleapis.com/google.rpc.RetryInfo":
+                return float(detail["retryDelay"].replace("s", ""))
+        return None
@@ -1,7 +1,7 @@
 import streamlit as st
 import time
 import threading
-from server import create_game_image
+from game_view import create_game_image
 from loguru import logger
 
 
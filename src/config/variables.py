@@ -1,2 +1,85 @@
+import os
+
 VOLTAGE_CHANGE = 45
-TARGET_VOLTAGE = 450
\ No newline at end of file
+TARGET_VOLTAGE = 450
+
+# Experiment scheduling
+# "thread" runs experiments in threads of one process, "process" in a pool of worker processes,
+# "async" runs all of them as coroutines on one event loop
+EXPERIMENT_EXECUTION_MODE = "thread"
+MAX_CONCURRENT_EXPERIMENTS = 8
+MAX_CONCURRENT_EXPERIMENTS_PER_PROVIDER = 3
+# Overrides of the per-provider limit, keyed by `utils.general.get_provider_name`.
+# An experiment counts against the limit of every provider of its agents, not only the participant's
+PROVIDER_CONCURRENCY_LIMITS = {
+    "Google": 2,  # gemini rate limits
+    # the learner, professor and orchestrator of every experiment run on gpt-4o
+    "OpenAI pre-GPT 5": MAX_CONCURRENT_EXPERIMENTS,
+}
+# Threads available to blocking calls (LLM clients, disk writes) of the async experiments.
+# AutoGen's OpenAIWrapper has no async client, so "async" experiments await their client calls in
+# these threads. The agents of a conversation speak in turn, so each running experiment has at most
+# one blocking call in flight: one thread per experiment, plus a few for their disk writes
+ASYNC_BLOCKING_WORKERS = MAX_CONCURRENT_EXPERIMENTS + 4
+
+# Embedding model of the refusal detection, loaded on first use.
+# A smaller model (e.g. "sentence-transformers/all-MiniLM-L6-v2") trades accuracy for memory and speed
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "Qwen/Qwen3-Embedding-0.6B")
+# Torch device ("cpu", "cuda", "mps"), picked automatically when not set
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE") or None
+# Torch dtype of the weights ("float16", "bfloat16", "auto"), float32 when not set
+EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE") or None
+# How the model runs: "torch", "torch-int8" (CPU), "onnx" or "onnx-int8" (CPU, needs sentence-transformers[onnx]).
+# Check the int8 backends against torch with `make calibrate-refusal-backend`
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# CPU threads of the model in every process, the default of the backend when not set
+EMBEDDING_THREADS = int(os.environ["EMBEDDING_THREADS"]) if os.environ.get("EMBEDDING_THREADS") else None
+# Where the onnx-int8 backend exports the quantized model, and the instruction set it is quantized for
+# ("arm64", "avx2", "avx512" or "avx512_vnni")
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "embedding_models")
+EMBEDDING_ONNX_QUANTIZATION = os.environ.get("EMBEDDING_ONNX_QUANTIZATION", "avx512_vnni")
+# Replies of concurrent conversations are embedded together: up to EMBEDDING_BATCH_SIZE texts,
+# waiting at most EMBEDDING_BATCH_WAIT_MS for more once the first one arrived
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+EMBEDDING_BATCH_WAIT_MS = float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", 5))
+# Embeddings of the texts seen before are kept on disk (empty to disable), and the most recent in memory
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_MEMORY_BYTES = int(os.environ.get("EMBEDDING_CACHE_MEMORY_BYTES", 16 * 1024 * 1024))
+# Never load the model, e.g. in processes that only serve the results
+EMBEDDINGS_DISABLED = os.environ.get("EMBEDDINGS_DISABLED", "").lower() in ("1", "true", "yes")
+
+# Refusal prototypes, canned phrases, cue words and similarity threshold of the refusal detection
+REFUSAL_CONFIG_PATH = os.environ.get(
+    "REFUSAL_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "refusal.json")
+)
+# Accept replies without any refusal cue word, or long replies without a canned refusal phrase, without
+# the embedding check. Off until their agreement with the embedding check is measured on historical replies
+# with `make calibrate-refusal-backend`
+REFUSAL_SHORTCUTS = os.environ.get("REFUSAL_SHORTCUTS", "").lower() in ("1", "true", "yes")
+
+# Columnar copy of the results folder, created with `make results-store`
+RESULTS_STORE_DIR = "results_store"
+
+# Game view frame cache, the disk tier is disabled when FRAME_CACHE_DIR is not set
+FRAME_CACHE_MAX_BYTES = int(os.environ.get("FRAME_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+FRAME_CACHE_DIR = os.environ.get("FRAME_CACHE_DIR")
+# Size of the disk tier, the least recently used frames are removed beyond it
+FRAME_CACHE_DISK_MAX_BYTES = int(os.environ.get("FRAME_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Number of message bubbles (stretched cloud and text layout) kept in memory
+CLOUD_LAYOUT_CACHE_SIZE = int(os.environ.get("CLOUD_LAYOUT_CACHE_SIZE", 256))
+# Game view rendering pool, "process" scales with the cores, "thread" avoids the worker processes
+RENDER_POOL_KIND = os.environ.get("RENDER_POOL_KIND", "process")
+RENDER_POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", os.cpu_count() or 1))
+# Renders accepted at a time (running or waiting), further requests get a 503
+RENDER_MAX_PENDING = int(os.environ.get("RENDER_MAX_PENDING", 4 * RENDER_POOL_SIZE))
+
+# Memory budget of the TTS clips kept in front of the tts_cache directory
+TTS_MEMORY_CACHE_MAX_BYTES = int(os.environ.get("TTS_MEMORY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Disk budget of the tts_cache directory, the least recently used clips are deleted beyond it
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# Speech API calls in flight at the same time
+TTS_MAX_CONCURRENCY = int(os.environ.get("TTS_MAX_CONCURRENCY", 8))
+# Threads of the server's blocking disk and database reads (TTS and frame caches, results index and store),
+# separate from the threads of the LLM calls so that a busy experiment never delays them
+SERVER_IO_WORKERS = int(os.environ.get("SERVER_IO_WORKERS", 8))
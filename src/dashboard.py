@@ -21,6 +21,7 @@ from dashboard_charts import (
     ecdf_voltage_by_provider,
 )
 from utils.general import get_provider_name, load_experiments
+from config.variables import RESULTS_STORE_DIR
 
 
 
@@ -36,8 +37,8 @@ st.set_page_config(
 def main():
     st.title("⚡ Milgram Experiment Dashboard")
     
-    # Load all experiments
-    experiments = load_experiments()
+    # Load all experiments, only the metadata is needed for the statistics
+    experiments = load_experiments(store_dir=RESULTS_STORE_DIR, include_messages=False)
 
     old_experiments = load_experiments(folder="results_19.08.2025")
     experiments.extend(old_experiments)
@@ -79,7 +80,7 @@ def main():
             "Participant Model": config.get("participant_model", {}).get("model", "Unknown"),
             "Learner Model": config.get("learner_model", {}).get("model", "Unknown"),
             "Professor Model": config.get("professor_model", {}).get("model", "Unknown"),
-            "Messages Count": len(exp.get("messages", [])),
+            "Messages Count": exp.get("message_count", len(exp.get("messages", []))),
             "Filename": exp.get("filename", "Unknown")
         })
     
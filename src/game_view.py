@@ -0,0 +1,471 @@
+import io
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from PIL import Image, ImageDraw, ImageFont
+
+from loguru import logger
+from typing import Deque, Dict, List, Literal, Optional, Tuple
+from utils.drawing_utils import resize_sprite, layout_cloud_text, stretch_cloud, CloudLayout
+from utils.byte_cache import ByteLRUCache
+from config.variables import CLOUD_LAYOUT_CACHE_SIZE, FRAME_CACHE_DISK_MAX_BYTES
+
+
+STATIC_DIR = "static"
+FONT_PATH = "/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf"
+# Bump when the rendering or the assets change, to invalidate cached frames
+RENDER_VERSION = 1
+
+# Output encodings of the frames, with their media type
+IMAGE_FORMATS = {
+    "png": "image/png",
+    # palette-quantized PNG, much smaller and faster to encode than the full-colour one
+    "png8": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+DEFAULT_QUALITY = 80
+
+# Argument of create_game_image showing the message of each speaker
+SPEAKER_ARGUMENTS = {
+    "Participant": "student_message",
+    "Professor": "professor_message",
+    "Learner": "learner_message",
+}
+
+
+@lru_cache(maxsize=None)
+def load_sprite(filename: str, scale: float = 1.0, flip: bool = False) -> Image.Image:
+    """
+    Loads a sprite from the static directory, converted to RGBA and resized.
+    The sprites are cached and shared, callers must not modify them.
+    """
+    sprite = Image.open(f"{STATIC_DIR}/{filename}").convert("RGBA")
+    if scale != 1.0:
+        sprite = resize_sprite(sprite, scale)
+    if flip:
+        sprite = sprite.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    return sprite
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int = 16) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(FONT_PATH, size=size)
+
+
+@lru_cache(maxsize=1)
+def get_static_layer() -> Image.Image:
+    """
+    Returns the background with the characters on it, the part of the game view
+    that is the same in every frame. Callers must copy it before drawing on it.
+    """
+    background = load_sprite("background.jpg")
+    # make the sprites smaller
+    professor_sprite = load_sprite("professor_w.png", 0.58)
+    # flip the professor sprite to face the student
+    # professor_sprite = professor_sprite.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    student_sprite = load_sprite("student.png", 0.15)
+    learner_sprite = load_sprite("learner.png", 1.1)
+
+    # Create a new image canvas to paste everything on
+    static_layer = background.copy()
+
+    # The third argument is a mask that respects the PNG transparency
+    static_layer.paste(professor_sprite, (630, 660), professor_sprite)
+    static_layer.paste(student_sprite, (360, 660), student_sprite)
+    static_layer.paste(learner_sprite, (673, 275), learner_sprite)
+    return static_layer
+
+
+def warm_asset_cache() -> None:
+    """Loads all the assets of the game view, so that the first request does not pay for it."""
+    get_static_layer()
+    load_sprite("electricity.png", 0.05)
+    load_sprite("cloud.png", 0.15)
+    load_sprite("cloud.png", 0.15, flip=True)
+    load_font()
+
+
+@lru_cache(maxsize=CLOUD_LAYOUT_CACHE_SIZE)
+def get_cloud_layout(
+    message: str, flip: bool = False, font_size: int = 16, cloud_scale: float = 0.15
+) -> Tuple[Image.Image, CloudLayout]:
+    """
+    Returns the stretched cloud and the text layout of a message, cached so that
+    repeated bubbles skip the font measurements and the cloud stretching.
+    The cloud is shared, callers must not modify it.
+    """
+    cloud = load_sprite("cloud.png", cloud_scale, flip)
+    layout = layout_cloud_text(message, load_font(font_size), cloud.size)
+    return stretch_cloud(cloud, layout.width, layout.height), layout
+
+
+def draw_message_on_cloud(
+    composite_image: Image.Image, message: str, tail_anchor: Tuple[int, int], flip=False
+) -> None:
+    """
+    Draws the message on the cloud with proper text wrapping.
+    """
+    font = load_font()
+
+    # Get the adjusted cloud and the wrapped text lines
+    cloud, layout = get_cloud_layout(message, flip)
+
+    # Position the cloud with bottom-left anchor or right-bottom anchor if flipped
+    if flip:
+        cloud_position = (
+            tail_anchor[0] - cloud.size[0],
+            tail_anchor[1] - cloud.size[1],
+        )
+    else:
+        cloud_position = (tail_anchor[0], tail_anchor[1] - cloud.size[1])
+
+    composite_image.paste(cloud, cloud_position, cloud)
+
+    # Add text to the cloud
+    draw = ImageDraw.Draw(composite_image)
+
+    # Get cloud dimensions
+    cloud_width, cloud_height = cloud.size
+
+    # Calculate total text block height
+    total_text_height = len(layout.lines) * layout.line_spacing
+
+    CLOUD_OFFSET = -11  # because of the tail of the cloud
+
+    start_y = cloud_position[1] + (cloud_height - total_text_height) // 2 + CLOUD_OFFSET
+
+    for i, (line, text_width) in enumerate(zip(layout.lines, layout.line_widths)):
+        text_x = cloud_position[0] + (cloud_width - text_width) // 2
+        text_y = start_y + (i * layout.line_spacing)
+        draw.text((text_x, text_y), line, font=font, fill="black")
+
+    return None
+
+
+def compose_game_image(
+    student_message: str | None = None,
+    professor_message: str | None = None,
+    learner_message: str | None = None,
+    display_shock: bool = False,
+) -> Image.Image:
+    """
+    Composes the game image by layering sprites on a background.
+    Optionally adds a message in a cloud with proper text wrapping.
+    """
+    # 1. Start from the cached background with the characters
+    composite_image = get_static_layer().copy()
+
+    # 2. Add a message in a cloud if a message is provided
+    if student_message:
+        draw_message_on_cloud(composite_image, student_message, (450, 670))
+
+    if professor_message:
+        draw_message_on_cloud(composite_image, professor_message, (650, 670), True)
+
+    if learner_message:
+        draw_message_on_cloud(composite_image, learner_message, (673, 275), True)
+
+    if display_shock:
+        shock_sprite = load_sprite("electricity.png", 0.05)
+        composite_image.paste(shock_sprite, (673, 300), shock_sprite)
+
+    return composite_image
+
+
+def encode_frame(image: Image.Image, image_format: str = "png", quality: int | None = None) -> bytes:
+    """
+    Encodes a composed frame in one of the IMAGE_FORMATS.
+
+    Args:
+        image: The composed frame.
+        image_format: "png" (lossless RGBA), "png8" (256 colours), "webp" or "jpeg".
+        quality: Quality of the lossy formats, from 1 to 100 (defaults to DEFAULT_QUALITY).
+    """
+    img_buffer = io.BytesIO()
+    # the frames are opaque, the alpha channel is only kept by the lossless png
+    if image_format == "png":
+        image.save(img_buffer, format="PNG")
+    elif image_format == "png8":
+        # fast octree quantization is good enough for the flat sprites
+        image.convert("RGB").quantize(256, method=Image.Quantize.FASTOCTREE).save(img_buffer, format="PNG")
+    elif image_format == "webp":
+        # method 2 is about twice as fast as the default 4, for a few percent of size
+        image.convert("RGB").save(img_buffer, format="WEBP", quality=quality or DEFAULT_QUALITY, method=2)
+    elif image_format == "jpeg":
+        image.convert("RGB").save(img_buffer, format="JPEG", quality=quality or DEFAULT_QUALITY)
+    else:
+        raise ValueError(f"Unknown image format: {image_format}")
+    return img_buffer.getvalue()
+
+
+def create_game_image(
+    student_message: str | None = None,
+    professor_message: str | None = None,
+    learner_message: str | None = None,
+    display_shock: bool = False,
+    image_format: str = "png",
+    quality: int | None = None,
+) -> io.BytesIO:
+    """
+    Generates the game image by layering sprites on a background.
+    Optionally adds a message in a cloud with proper text wrapping.
+    """
+    # Save the final image to an in-memory buffer
+    return io.BytesIO(render_frame(student_message, professor_message, learner_message, display_shock, image_format, quality))
+
+
+def render_frame(
+    student_message: str | None = None,
+    professor_message: str | None = None,
+    learner_message: str | None = None,
+    display_shock: bool = False,
+    image_format: str = "png",
+    quality: int | None = None,
+) -> bytes:
+    """Renders a frame and returns the encoded image, see `create_game_image`."""
+    composite_image = compose_game_image(student_message, professor_message, learner_message, display_shock)
+    return encode_frame(composite_image, image_format, quality)
+
+
+def _init_render_worker() -> None:
+    try:
+        warm_asset_cache()
+    except Exception as e:
+        logger.warning(f"Failed to preload the game view assets: {e}")
+
+
+class RenderPoolFull(Exception):
+    """Raised when too many frames are already waiting to be rendered."""
+
+
+class RenderPool:
+    """
+    Bounded pool of workers rendering frames off the event loop.
+
+    At most `max_pending` renders are accepted at a time (running or queued),
+    further ones are rejected with RenderPoolFull instead of piling up.
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_pending: int,
+        kind: Literal["process", "thread"] = "process",
+    ):
+        self.size = size
+        self.max_pending = max_pending
+        self.pending = 0
+        # renders waiting for a free slot
+        self._waiters: Deque[asyncio.Future] = deque()
+        if kind == "process":
+            # the drawing holds the GIL, processes are needed to scale with the cores
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_render_worker,
+            )
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix="render"
+            )
+        else:
+            raise ValueError(f"Unknown render pool kind: {kind}")
+
+    async def render(
+        self,
+        student_message: str | None = None,
+        professor_message: str | None = None,
+        learner_message: str | None = None,
+        display_shock: bool = False,
+        image_format: str = "png",
+        quality: int | None = None,
+        wait: bool = False,
+    ) -> bytes:
+        """
+        Renders a frame in the pool, see `render_frame`.
+        When the pool is full, waits for a free slot if `wait`, otherwise raises RenderPoolFull.
+        """
+        if self.pending >= self.max_pending and not wait:
+            raise RenderPoolFull()
+        while self.pending >= self.max_pending:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                partial(
+                    render_frame,
+                    student_message,
+                    professor_message,
+                    learner_message,
+                    display_shock,
+                    image_format=image_format,
+                    quality=quality,
+                ),
+            )
+        finally:
+            self.pending -= 1
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    break
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def conversation_frames(messages: List[Dict]) -> List[Dict]:
+    """
+    Maps the messages of a conversation to the frames shown when replaying it.
+
+    Returns:
+        List[Dict]: One {"position", "speaker", "arguments"} per message with a frame, where
+            position is the index of the message and arguments are the `create_game_image`
+            keyword arguments. Messages of other speakers (the Orchestrator) have no frame.
+    """
+    frames = []
+    for position, message in enumerate(messages):
+        speaker = message["speaker"]
+        if speaker == "SHOCKING_DEVICE":
+            arguments = {"display_shock": True}
+        elif speaker in SPEAKER_ARGUMENTS:
+            arguments = {SPEAKER_ARGUMENTS[speaker]: message["text"]}
+        else:
+            continue
+        frames.append({"position": position, "speaker": speaker, "arguments": arguments})
+    return frames
+
+
+def frame_cache_key(
+    student_message: str | None = None,
+    professor_message: str | None = None,
+    learner_message: str | None = None,
+    display_shock: bool = False,
+    image_format: str = "png",
+    quality: int | None = None,
+) -> str:
+    """Returns the cache key (and ETag) of the frame rendered for the given inputs."""
+    inputs = [
+        RENDER_VERSION,
+        student_message,
+        professor_message,
+        learner_message,
+        display_shock,
+        image_format,
+        quality,
+    ]
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def is_frame_cache_key(key: str) -> bool:
+    """Whether a string has the format of `frame_cache_key`, a sha256 hex digest."""
+    return re.fullmatch(r"[0-9a-f]{64}", key) is not None
+
+
+class FrameCache:
+    """
+    Cache of encoded game view frames: a size-bounded in-memory LRU,
+    optionally backed by a directory of frame files on disk, bounded by
+    `disk_max_bytes` and evicting the least recently used files.
+
+    Keys must be `frame_cache_key` digests. With a disk tier, `get` and `put`
+    do blocking file I/O, async callers should run them in a thread.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = FRAME_CACHE_DISK_MAX_BYTES):
+        self.memory = ByteLRUCache(max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        # size of every frame file, least recently used first
+        self._disk_sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_tier()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _load_disk_tier(self) -> None:
+        """Registers the frame files left by previous runs, in the order of their last use."""
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            key, extension = os.path.splitext(entry.name)
+            if extension == ".bin" and is_frame_cache_key(key):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk_sizes[key] = size
+            self._disk_bytes += size
+        self._remove_files(self._evict_disk())
+
+    def _evict_disk(self) -> List[str]:
+        """Drops the least recently used frames until the disk tier fits its budget, returns their keys."""
+        evicted = []
+        with self._disk_lock:
+            while self._disk_bytes > self.disk_max_bytes and self._disk_sizes:
+                key, size = self._disk_sizes.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(key)
+        return evicted
+
+    def _remove_files(self, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _check_key(key: str) -> None:
+        if not is_frame_cache_key(key):
+            raise ValueError(f"Invalid frame cache key: {key!r}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        self._check_key(key)
+        frame = self.memory.get(key)
+        if frame is not None or not self.disk_dir:
+            return frame
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                frame = f.read()
+            # the modification time keeps the recency of the frame across restarts
+            os.utime(path)
+        except FileNotFoundError:
+            with self._disk_lock:
+                self._disk_bytes -= self._disk_sizes.pop(key, 0)
+            return None
+        with self._disk_lock:
+            if key in self._disk_sizes:
+                self._disk_sizes.move_to_end(key)
+        self.memory.put(key, frame)
+        return frame
+
+    def put(self, key: str, frame: bytes) -> None:
+        self._check_key(key)
+        self.memory.put(key, frame)
+        if self.disk_dir:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(frame)
+            os.replace(tmp_path, self._disk_path(key))
+            with self._disk_lock:
+                self._disk_bytes += len(frame) - self._disk_sizes.pop(key, 0)
+                self._disk_sizes[key] = len(frame)
+            self._remove_files(self._evict_disk())
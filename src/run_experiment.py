@@ -1,10 +1,13 @@
 from autogen import (
     AssistantAgent,
+    ChatResult,
     GroupChat,
     GroupChatManager,
 )
 from chat.professor_agent import ProfessorAgent
 from chat.repeating_agent import RepeatingAgent
+from chat.embeddings import get_embedding_provider
+from chat.refusal import get_refusal_classifier
 from chat.tool_verification_agent import ToolVerificationAgent
 
 import os
@@ -36,17 +39,30 @@ from config.llm_settings import (
     Qwen3_235B_A22B_Instruct_2507,
     DeepSeek_3_1,
 )
-from config.variables import VOLTAGE_CHANGE
+from config.variables import (
+    VOLTAGE_CHANGE,
+    EXPERIMENT_EXECUTION_MODE,
+    MAX_CONCURRENT_EXPERIMENTS,
+    MAX_CONCURRENT_EXPERIMENTS_PER_PROVIDER,
+    PROVIDER_CONCURRENCY_LIMITS,
+)
 from models import Roles, ConversationDataModel, ConversationConfig
 import uuid
 import json
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, Literal
 from utils.chat_utils import (
     convert_chat_history_to_json,
     check_termination,
     check_if_administered_shock,
     agents_total_cost,
 )
-from utils.general import remove_api_keys_from_json
+from utils.general import remove_api_keys_from_json, get_provider_name
+from utils.scheduler import run_with_limits, a_run_with_limits
+from utils.results_index import ResultsIndex
+from utils.async_utils import run_blocking
 import logging
 
 
@@ -73,15 +89,29 @@ def dump_to_json(data: dict, output_file_path: str) -> None:
     data = remove_api_keys_from_json(data)
 
     dir_path = os.path.dirname(output_file_path)
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
-    with open(output_file_path, "w") as f:
+    os.makedirs(dir_path, exist_ok=True)
+    # write to a temporary file first, so that readers never see a partial result
+    tmp_file_path = f"{output_file_path}.{os.getpid()}.tmp"
+    with open(tmp_file_path, "w") as f:
         json.dump(data, f, indent=4)
+    os.replace(tmp_file_path, output_file_path)
+
 
+def _create_experiment(
+    config: ConversationConfig,
+) -> tuple[GroupChatManager, ProfessorAgent, list[AssistantAgent], Callable[[], int]]:
+    """
+    Creates the agents and the group chat of a single experiment.
 
-def start_experiment(config: ConversationConfig) -> None:
+    Returns:
+        tuple: The chat manager, the professor starting the chat, all the agents
+            and a function returning the current voltage.
+    """
     CURRENT_VOLTAGE = 0
 
+    def get_current_voltage() -> int:
+        return CURRENT_VOLTAGE
+
     def press_button(
         learner_answered_incorrectly: bool, learner_was_asked_question: bool
     ):
@@ -174,12 +204,22 @@ def start_experiment(config: ConversationConfig) -> None:
         llm_config=GPT5OpenRouter().model_dump(),
         # system_message=CHAT_MANAGER_SYSTEM_MESSAGE,
     )
-    chat = manager.initiate_chat(
+    return (
+        manager,
         proffesor,
-        message=INITIAL_MESSAGE,
+        [proffesor, learner, participant, orchestrator],
+        get_current_voltage,
     )
 
-    cost: float = agents_total_cost([proffesor, learner, participant, orchestrator])
+
+def _save_experiment(
+    config: ConversationConfig,
+    chat: ChatResult,
+    agents: list[AssistantAgent],
+    final_voltage: int,
+) -> ConversationDataModel:
+    """Saves the finished experiment and its raw chat history to disk."""
+    cost: float = agents_total_cost(agents)
     app_logger.info(f"Total cost: {cost}")
     messages = convert_chat_history_to_json(chat.chat_history)
 
@@ -187,20 +227,47 @@ def start_experiment(config: ConversationConfig) -> None:
         messages=messages,
         config=config,
         cost=cost,
-        final_voltage=CURRENT_VOLTAGE,
+        final_voltage=final_voltage,
     )
 
     dump_to_json(conv.model_dump(), f"results/experiment_{conv.id}.json")
+    ResultsIndex("results").add(conv.model_dump(), f"experiment_{conv.id}.json")
 
     # also save raw chat history
     raw_conv = ConversationDataModel(
         messages=chat.chat_history,
         config=config,
         cost=cost,
-        final_voltage=CURRENT_VOLTAGE,
+        final_voltage=final_voltage,
     )
     dump_to_json(raw_conv.model_dump(), f"raw_results/experiment_{conv.id}_raw.json")
     app_logger.info("Experiment completed successfully.")
+    return conv
+
+
+def start_experiment(config: ConversationConfig) -> ConversationDataModel:
+    manager, proffesor, agents, get_current_voltage = _create_experiment(config)
+    chat = manager.initiate_chat(
+        proffesor,
+        message=INITIAL_MESSAGE,
+    )
+    return _save_experiment(config, chat, agents, get_current_voltage())
+
+
+async def a_start_experiment(config: ConversationConfig) -> ConversationDataModel:
+    """
+    Async version of `start_experiment`.
+    The chat runs on AutoGen's async reply path, so many experiments can share one event loop.
+    AutoGen's LLM clients are synchronous, their calls are awaited in the threads of `run_blocking`.
+    """
+    manager, proffesor, agents, get_current_voltage = _create_experiment(config)
+    chat = await manager.a_initiate_chat(
+        proffesor,
+        message=INITIAL_MESSAGE,
+    )
+    return await run_blocking(
+        _save_experiment, config, chat, agents, get_current_voltage()
+    )
 
 
 def count_experiments_by_model(participant_model_name: str) -> int:
@@ -213,29 +280,12 @@ def count_experiments_by_model(participant_model_name: str) -> int:
     Returns:
         int: The count of experiment files with the specified participant model
     """
-    count = 0
-
     # Check if results directory exists
     if not os.path.exists("results"):
         app_logger.warning("Results directory not found")
         return 0
 
-    # Iterate through all json files in the results directory
-    for filename in os.listdir("results"):
-        if filename.startswith("experiment_") and filename.endswith(".json"):
-            try:
-                with open(os.path.join("results", filename), "r") as f:
-                    data = json.load(f)
-                    # Check if the participant model matches the requested one
-                    if (
-                        data.get("config", {}).get("participant_model").get("model")
-                        == participant_model_name
-                    ):
-                        count += 1
-            except Exception as e:
-                app_logger.error(f"Error reading file {filename}: {e}")
-
-    return count
+    return ResultsIndex("results").count_by_model(participant_model_name)
 
 
 def verify_experiment():
@@ -306,6 +356,7 @@ def run_model_experiments(
         professor_model=professor_model_instance,
         orchestrator_model=orchestrator_model_instance,
     )
+    ResultsIndex("results").sync()
     existing_experiments = count_experiments_by_model(participant_model_instance.model)
     app_logger.info(
         f"Found {existing_experiments} existing experiments with {participant_model_instance.model}"
@@ -323,6 +374,239 @@ def run_model_experiments(
     )
 
 
+def plan_experiments(
+    participant_model_instances,
+    target_experiments_per_model,
+    learner_model_instance,
+    professor_model_instance,
+    orchestrator_model_instance,
+) -> list[ConversationConfig]:
+    """
+    Builds the list of experiments needed to top up every participant model
+    to the target number of experiments.
+
+    The experiments of different models are interleaved, so that all models
+    progress at the same time when the list is run concurrently.
+
+    Returns:
+        list[ConversationConfig]: The configs of the experiments to run.
+    """
+    # pick up results added or removed outside of the experiments, e.g. by git
+    ResultsIndex("results").sync()
+
+    per_model_configs = []
+    for participant_model_instance in participant_model_instances:
+        existing_experiments = count_experiments_by_model(
+            participant_model_instance.model
+        )
+        experiments_to_run = max(0, target_experiments_per_model - existing_experiments)
+        app_logger.info(
+            f"Found {existing_experiments} existing experiments with {participant_model_instance.model}, "
+            f"scheduling {experiments_to_run} more"
+        )
+        conf = ConversationConfig(
+            participant_model=participant_model_instance,
+            learner_model=learner_model_instance,
+            professor_model=professor_model_instance,
+            orchestrator_model=orchestrator_model_instance,
+        )
+        per_model_configs.append([conf] * experiments_to_run)
+
+    # round-robin over the models
+    configs = []
+    for i in range(max((len(c) for c in per_model_configs), default=0)):
+        configs.extend(c[i] for c in per_model_configs if i < len(c))
+    return configs
+
+
+def _init_experiment_worker() -> None:
+    """
+    Initializer of the experiment worker processes.
+    Loads the embedding model once per worker, before the first experiment starts.
+    """
+    logging.basicConfig(level=logging.INFO)
+    provider = get_embedding_provider()
+    if not provider.disabled:
+        provider.get_model()
+    app_logger.info(f"Experiment worker {os.getpid()} ready")
+
+
+def experiment_providers(config: ConversationConfig) -> set[str]:
+    """The providers called by an experiment, for the participant, learner, professor and orchestrator."""
+    return {
+        get_provider_name(model.model)
+        for model in (
+            config.participant_model,
+            config.learner_model,
+            config.professor_model,
+            config.orchestrator_model,
+        )
+    }
+
+
+def iter_experiment_results(
+    configs: list[ConversationConfig],
+    mode: Literal["thread", "process"] = "thread",
+    max_concurrency: int = MAX_CONCURRENT_EXPERIMENTS,
+    provider_limits: dict[str, int] | None = None,
+) -> Iterator[tuple[ConversationConfig, ConversationDataModel | None]]:
+    """
+    Runs the experiments concurrently and yields them as soon as they finish.
+
+    Args:
+        configs: The configs of the experiments to run.
+        mode: "thread" runs the experiments in a thread pool of this process,
+            "process" spreads them over a pool of `max_concurrency` worker processes,
+            each with its own embedding model and AutoGen state.
+        max_concurrency: Maximum number of experiments running at the same time.
+        provider_limits: Maximum number of running experiments per provider, counting every
+            experiment which uses the provider for any of its agents.
+            Defaults to PROVIDER_CONCURRENCY_LIMITS, other providers are limited to
+            MAX_CONCURRENT_EXPERIMENTS_PER_PROVIDER.
+
+    Yields:
+        Tuples of (config, finished conversation), the conversation is None if the experiment failed.
+    """
+    if provider_limits is None:
+        provider_limits = PROVIDER_CONCURRENCY_LIMITS
+
+    if mode == "process":
+        # spawn instead of fork, so that no torch or HTTP client state is shared with the parent
+        executor = ProcessPoolExecutor(
+            max_workers=max_concurrency,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_experiment_worker,
+        )
+    elif mode == "thread":
+        executor = None
+    else:
+        raise ValueError(f"Unknown execution mode: {mode}")
+
+    try:
+        for config, future in run_with_limits(
+            configs,
+            start_experiment,
+            key=experiment_providers,
+            max_concurrency=max_concurrency,
+            key_limits=provider_limits,
+            default_key_limit=MAX_CONCURRENT_EXPERIMENTS_PER_PROVIDER,
+            executor=executor,
+        ):
+            try:
+                yield config, future.result()
+            except Exception as e:
+                app_logger.error(
+                    f"Experiment for {config.participant_model.model} failed: {e}"
+                )
+                yield config, None
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+async def a_iter_experiment_results(
+    configs: list[ConversationConfig],
+    max_concurrency: int = MAX_CONCURRENT_EXPERIMENTS,
+    provider_limits: dict[str, int] | None = None,
+) -> AsyncIterator[tuple[ConversationConfig, ConversationDataModel | None]]:
+    """
+    Async version of `iter_experiment_results`, running every experiment
+    as a coroutine on the current event loop.
+    """
+    if provider_limits is None:
+        provider_limits = PROVIDER_CONCURRENCY_LIMITS
+
+    async for config, task in a_run_with_limits(
+        configs,
+        a_start_experiment,
+        key=experiment_providers,
+        max_concurrency=max_concurrency,
+        key_limits=provider_limits,
+        default_key_limit=MAX_CONCURRENT_EXPERIMENTS_PER_PROVIDER,
+    ):
+        if task.exception() is not None:
+            app_logger.error(
+                f"Experiment for {config.participant_model.model} failed: {task.exception()}"
+            )
+            yield config, None
+        else:
+            yield config, task.result()
+
+
+def run_experiments_concurrently(
+    participant_model_instances,
+    target_experiments_per_model,
+    learner_model_instance,
+    professor_model_instance,
+    orchestrator_model_instance,
+    max_concurrency: int = MAX_CONCURRENT_EXPERIMENTS,
+    provider_limits: dict[str, int] | None = None,
+    mode: Literal["thread", "process", "async"] = "thread",
+) -> None:
+    """
+    Tops up every participant model to the target number of experiments,
+    running the experiments concurrently.
+
+    Args:
+        participant_model_instances: The model instances to use as the participant.
+        target_experiments_per_model: The target number of experiments for each model.
+        learner_model_instance: The model instance to use as the learner.
+        professor_model_instance: The model instance to use as the professor.
+        orchestrator_model_instance: The model instance to use as the orchestrator.
+        max_concurrency: Maximum number of experiments running at the same time.
+        provider_limits: Maximum number of running experiments per provider, counting every
+            experiment which uses the provider for any of its agents.
+            Defaults to PROVIDER_CONCURRENCY_LIMITS, other providers are limited to
+            MAX_CONCURRENT_EXPERIMENTS_PER_PROVIDER.
+        mode: Execution mode, see `iter_experiment_results`. "async" runs all the
+            experiments on one event loop, see `a_iter_experiment_results`.
+    """
+    configs = plan_experiments(
+        participant_model_instances,
+        target_experiments_per_model,
+        learner_model_instance,
+        professor_model_instance,
+        orchestrator_model_instance,
+    )
+
+    finished = 0
+    failed = 0
+
+    def report(config: ConversationConfig, conv: ConversationDataModel | None):
+        nonlocal finished, failed
+        finished += 1
+        if conv is None:
+            failed += 1
+        else:
+            app_logger.info(
+                f"Experiment {conv.id} with {config.participant_model.model} reached {conv.final_voltage} volts"
+            )
+        app_logger.info(f"Finished {finished}/{len(configs)} experiments")
+
+    if mode == "async":
+
+        async def run_all():
+            async for config, conv in a_iter_experiment_results(
+                configs, max_concurrency, provider_limits
+            ):
+                report(config, conv)
+
+        asyncio.run(run_all())
+    else:
+        for config, conv in iter_experiment_results(
+            configs, mode, max_concurrency, provider_limits
+        ):
+            report(config, conv)
+
+    app_logger.info(f"Completed {len(configs) - failed} experiments, {failed} failed")
+    if mode != "process":  # the worker processes count their own checks
+        app_logger.info(f"Refusal checks decided per tier: {get_refusal_classifier().stats()}")
+    for participant_model_instance in participant_model_instances:
+        app_logger.info(
+            f"Number of {participant_model_instance.model} experiments: {count_experiments_by_model(participant_model_instance.model)}"
+        )
+
+
 if __name__ == "__main__":
     # Create results directory if it doesn't exist
     if not os.path.exists("results"):
@@ -335,70 +619,31 @@ if __name__ == "__main__":
     PROFESSOR = GPT_4o()
     ORCHESTRATOR = GPT_4o()
 
-    # OpenAI
-    run_model_experiments(
-        GPT_4o(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-    # run_model_experiments(
-    #     GPT_4o_mini(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    # )
-    run_model_experiments(
-        GPT_4_1(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-
-    # Claude
-    run_model_experiments(
-        ClaudeSonnet4(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-    run_model_experiments(
+    PARTICIPANT_MODELS = [
+        # OpenAI
+        GPT_4o(),
+        # GPT_4o_mini(),
+        GPT_4_1(),
+        # Claude
+        ClaudeSonnet4(),
         ClaudeSonnet3_7(),
-        TARGET_EXPERIMENTS_PER_MODEL,
-        LEARNER,
-        PROFESSOR,
-        ORCHESTRATOR,
-    )
-
-    # Gemini
-    run_model_experiments(
+        # Gemini
         Gemini2_5FlashLite(),
-        TARGET_EXPERIMENTS_PER_MODEL,
-        LEARNER,
-        PROFESSOR,
-        ORCHESTRATOR,
-    )
-    run_model_experiments(
-        Gemini2_5Flash(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-    run_model_experiments(
-        Gemini2_5Pro(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-
-    # Openrouter
-    run_model_experiments(
-        Grok4(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-    run_model_experiments(
+        Gemini2_5Flash(),
+        Gemini2_5Pro(),
+        # Openrouter
+        Grok4(),
         Qwen3_235B_A22B_Instruct_2507(),
-        TARGET_EXPERIMENTS_PER_MODEL,
-        LEARNER,
-        PROFESSOR,
-        ORCHESTRATOR,
-    )
-    run_model_experiments(
-        GPT5OpenRouter(), TARGET_EXPERIMENTS_PER_MODEL, LEARNER, PROFESSOR, ORCHESTRATOR
-    )
-    run_model_experiments(
+        GPT5OpenRouter(),
         GPT5MiniOpenRouter(),
+        # DeepSeek_3_1(),
+    ]
+
+    run_experiments_concurrently(
+        PARTICIPANT_MODELS,
         TARGET_EXPERIMENTS_PER_MODEL,
         LEARNER,
         PROFESSOR,
         ORCHESTRATOR,
+        mode=EXPERIMENT_EXECUTION_MODE,
     )
-
-    # run_model_experiments(
-    #     DeepSeek_3_1(),
-    #     TARGET_EXPERIMENTS_PER_MODEL,
-    #     LEARNER,
-    #     PROFESSOR,
-    #     ORCHESTRATOR,
-    # )
\ No newline at end of file
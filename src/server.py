@@ -1,25 +1,41 @@
-import io
 from io import BytesIO
 
-from PIL import Image, ImageDraw, ImageFont
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Query
 from fastapi.responses import StreamingResponse, Response
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
 
 from loguru import logger
 
-from typing import Tuple, List, Dict, Union
+from typing import Tuple, List, Dict, Literal, Union
 import json
 import asyncio
 import base64
 from utils.chat_utils import load_conversation_dictionary
-from utils.drawing_utils import resize_sprite, adjust_cloud
+from game_view import (
+    warm_asset_cache,
+    frame_cache_key,
+    is_frame_cache_key,
+    FrameCache,
+    RenderPool,
+    RenderPoolFull,
+    IMAGE_FORMATS,
+    DEFAULT_QUALITY,
+    conversation_frames,
+)
+from utils.http_utils import etag_matches, negotiate_media_type, parse_byte_range
 from utils.audio_utils import load_mp3
-from utils.general import get_provider_name, load_experiments
+from utils.general import get_provider_name, load_experiments, load_experiment_file
+from utils.results_index import ResultsIndex
+from utils.async_utils import run_io
 
 import tempfile
 import os
+import zipfile
+import hashlib
+import re
+from functools import lru_cache
 from run_experiment import start_experiment
 from datetime import datetime
 import uuid
@@ -30,119 +46,63 @@ from audio.tts import (
     tts_worker,
     playback_worker,
     trigger_next_playback,
+    tts_cache_stats,
+    stream_tts,
+    get_cached_tts,
+    read_tts_by_digest,
+    has_voice,
 )
+from audio.tts_cache import audio_digest
 from models import Roles
+from config.variables import (
+    RESULTS_STORE_DIR,
+    FRAME_CACHE_MAX_BYTES,
+    FRAME_CACHE_DIR,
+    RENDER_POOL_KIND,
+    RENDER_POOL_SIZE,
+    RENDER_MAX_PENDING,
+)
 
+RESULTS_FOLDER = "results"
 
-def draw_message_on_cloud(
-    composite_image: Image.Image, message: str, tail_anchor: Tuple[int, int], flip=False
-) -> None:
-    """
-    Draws the message on the cloud with proper text wrapping.
-    """
-    cloud = Image.open("static/cloud.png").convert("RGBA")
-    cloud = resize_sprite(cloud, 0.15)
-    if flip:
-        cloud = cloud.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
-
-    font = ImageFont.truetype(
-        "/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf", size=16
-    )
-
-    # Adjust the cloud and get wrapped text lines
-    cloud, text_lines, line_spacing = adjust_cloud(cloud, message, font)
-
-    # Position the cloud with bottom-left anchor or right-bottom anchor if flipped
-    if flip:
-        cloud_position = (
-            tail_anchor[0] - cloud.size[0],
-            tail_anchor[1] - cloud.size[1],
-        )
-    else:
-        cloud_position = (tail_anchor[0], tail_anchor[1] - cloud.size[1])
-
-    composite_image.paste(cloud, cloud_position, cloud)
-
-    # Add text to the cloud
-    draw = ImageDraw.Draw(composite_image)
-
-    # Get cloud dimensions
-    cloud_width, cloud_height = cloud.size
-
-    # Calculate total text block height
-    total_text_height = len(text_lines) * line_spacing
-
-    CLOUD_OFFSET = -11  # because of the tail of the cloud
-
-    start_y = cloud_position[1] + (cloud_height - total_text_height) // 2 + CLOUD_OFFSET
-
-    for i, line in enumerate(text_lines):
-        # Calculate bounding box for this specific line
-        text_bbox = draw.textbbox((0, 0), line, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-
-        text_x = cloud_position[0] + (cloud_width - text_width) // 2
-        text_y = start_y + (i * line_spacing)
-        draw.text((text_x, text_y), line, font=font, fill="black")
-
-    return None
-
-
-def create_game_image(
-    student_message: str | None = None,
-    professor_message: str | None = None,
-    learner_message: str | None = None,
-    display_shock: bool = False,
-) -> io.BytesIO:
-    """
-    Generates the game image by layering sprites on a background.
-    Optionally adds a message in a cloud with proper text wrapping.
-    """
-    background = Image.open("static/background.jpg").convert("RGBA")
-    professor_sprite = Image.open("static/professor_w.png").convert("RGBA")
-    student_sprite = Image.open("static/student.png").convert("RGBA")
-    learner_sprite = Image.open("static/learner.png").convert("RGBA")
-    shock_sprite = Image.open("static/electricity.png").convert("RGBA")
-
-    # make the sprites smaller
-    professor_sprite = resize_sprite(professor_sprite, 0.58)
-    # flip the professor sprite to face the student
-    # professor_sprite = professor_sprite.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
-    student_sprite = resize_sprite(student_sprite, 0.15)
-    learner_sprite = resize_sprite(learner_sprite, 1.1)
-    shock_sprite = resize_sprite(shock_sprite, 0.05)
-
-    # Create a new image canvas to paste everything on
-    composite_image = background.copy()
-
-    # 2. Add sprites to the background
-    # The third argument is a mask that respects the PNG transparency
-    composite_image.paste(professor_sprite, (630, 660), professor_sprite)
-    composite_image.paste(student_sprite, (360, 660), student_sprite)
-    composite_image.paste(learner_sprite, (673, 275), learner_sprite)
+frame_cache = FrameCache(FRAME_CACHE_MAX_BYTES, FRAME_CACHE_DIR)
+render_pool = RenderPool(RENDER_POOL_SIZE, RENDER_MAX_PENDING, RENDER_POOL_KIND)
+STATIC_AUDIO_DIR = "static"
+SHOCK_SOUND = "electric-shock-cut.mp3"
+# Clips keyed by text, voice and instructions may change when the voices are tuned
+TTS_CACHE_CONTROL = "public, max-age=86400"
+# Clips served by content address never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-    # 3. Add a message in a cloud if a message is provided
-    if student_message:
-        draw_message_on_cloud(composite_image, student_message, (450, 670))
 
-    if professor_message:
-        draw_message_on_cloud(composite_image, professor_message, (650, 670), True)
+@lru_cache(maxsize=None)
+def load_static_audio(filename: str) -> Tuple[bytes, str]:
+    """Loads an MP3 file of the static directory once, returns its bytes and ETag."""
+    audio = load_mp3(os.path.join(STATIC_AUDIO_DIR, filename)).getvalue()
+    return audio, f'"{hashlib.sha256(audio).hexdigest()}"'
 
-    if learner_message:
-        draw_message_on_cloud(composite_image, learner_message, (673, 275), True)
 
-    if display_shock:
-        composite_image.paste(shock_sprite, (673, 300), shock_sprite)
+def preload_static_audio() -> None:
+    for filename in os.listdir(STATIC_AUDIO_DIR):
+        if filename.endswith(".mp3"):
+            load_static_audio(filename)
 
-    # 4. Save the final image to an in-memory buffer
-    img_buffer = io.BytesIO()
-    composite_image.save(img_buffer, format="PNG")
-    img_buffer.seek(0)
 
-    return img_buffer
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        warm_asset_cache()
+    except Exception as e:
+        logger.warning(f"Failed to preload the game view assets: {e}")
+    try:
+        preload_static_audio()
+    except Exception as e:
+        logger.warning(f"Failed to preload the static audio: {e}")
+    yield
+    render_pool.shutdown()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -154,22 +114,235 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def resolve_image_format(image_format: str | None, quality: int | None, accept: str | None) -> Tuple[str, int | None]:
+    """Returns the frame encoding to use, negotiated from the Accept header if no format is requested."""
+    if image_format is None:
+        media_type = negotiate_media_type(accept, ["image/png", "image/webp", "image/jpeg"])
+        image_format = {"image/webp": "webp", "image/jpeg": "jpeg"}.get(media_type, "png")
+    if image_format in ("webp", "jpeg"):
+        return image_format, quality or DEFAULT_QUALITY
+    return image_format, None
+
+
+async def read_cached_frame(key: str) -> bytes | None:
+    """Returns a frame of the frame cache, reading its disk tier off the event loop."""
+    frame = frame_cache.memory.get(key)
+    if frame is None and frame_cache.disk_dir:
+        frame = await run_io(frame_cache.get, key)
+    return frame
+
+
+async def get_frame(key: str, arguments: Dict, image_format: str, quality: int | None, wait: bool = False) -> bytes:
+    """Returns a frame from the frame cache, rendering it in the render pool on a miss."""
+    frame = await read_cached_frame(key)
+    if frame is None:
+        # Generate the image with specific messages for each character, off the event loop
+        frame = await render_pool.render(**arguments, image_format=image_format, quality=quality, wait=wait)
+        if frame_cache.disk_dir:
+            await run_io(frame_cache.put, key, frame)
+        else:
+            frame_cache.put(key, frame)
+    return frame
+
+
 @app.get("/api/game-view")
 async def get_game_view(
     participant_message: str | None = Query(default=None, max_length=1000),
     professor_message: str | None = Query(default=None, max_length=1000),
     learner_message: str | None = Query(default=None, max_length=1000),
     display_shock: bool = False,
+    image_format: Literal["png", "png8", "webp", "jpeg"] | None = Query(default=None, alias="format"),
+    quality: int | None = Query(default=None, ge=1, le=100),
+    accept: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
 ):
     """
     Endpoint to get the current game view with messages from both characters.
     - Student message: /game-view?student_message=Hello professor!
     - Professor message: /game-view?professor_message=Hello student!
     - Both: /game-view?student_message=Hello!&professor_message=Hi there!
+
+    The encoding is chosen with format=png|png8|webp|jpeg (and quality for webp and jpeg),
+    or negotiated from the Accept header, defaulting to png.
+    Frames are cached and carry a strong ETag, a matching If-None-Match gets a 304.
+    """
+    image_format, quality = resolve_image_format(image_format, quality, accept)
+    key = frame_cache_key(participant_message, professor_message, learner_message, display_shock, image_format, quality)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "public, max-age=86400", "Vary": "Accept"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    arguments = {
+        "student_message": participant_message,
+        "professor_message": professor_message,
+        "learner_message": learner_message,
+        "display_shock": display_shock,
+    }
+    try:
+        frame = await get_frame(key, arguments, image_format, quality)
+    except RenderPoolFull:
+        raise HTTPException(status_code=503, detail="Too many frames being rendered", headers={"Retry-After": "1"})
+    return Response(frame, media_type=IMAGE_FORMATS[image_format], headers=headers)
+
+
+@app.get("/api/game-view/frames/{image_format}/{key}")
+async def get_cached_frame(
+    image_format: Literal["png", "png8", "webp", "jpeg"],
+    key: str,
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Serves a frame rendered before, by its key (e.g. from the prerendered frames of a conversation).
+    Frames are content addressed and never change, a 404 means the frame left the cache.
+    """
+    if not is_frame_cache_key(key):
+        raise HTTPException(status_code=404, detail="Frame not found")
+    headers = {"ETag": f'"{key}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    frame = await read_cached_frame(key)
+    if frame is None:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    return Response(frame, media_type=IMAGE_FORMATS[image_format], headers=headers)
+
+
+def load_conversation_messages(experiment_id: str) -> List[Dict]:
+    index = ResultsIndex(RESULTS_FOLDER)
+    row = index.get(experiment_id)
+    if row is None:
+        # the experiment may have been added since the last sync
+        index.sync()
+        row = index.get(experiment_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return load_experiment_file(RESULTS_FOLDER, row["filename"], skip_orchestrator=True)["messages"]
+
+
+async def render_conversation(experiment_id: str, image_format: str, quality: int | None) -> List[Dict]:
+    """
+    Renders every frame of a conversation into the frame cache, in parallel.
+
+    Returns:
+        List[Dict]: The frames (see `conversation_frames`) with their cache key, URL and encoded image.
+    """
+    image_format, quality = resolve_image_format(image_format, quality, None)
+    frames = conversation_frames(await run_io(load_conversation_messages, experiment_id))
+    # at most one render per worker, so that interactive requests still find free slots
+    semaphore = asyncio.Semaphore(render_pool.size)
+
+    async def render(frame: Dict) -> None:
+        frame["key"] = frame_cache_key(**frame["arguments"], image_format=image_format, quality=quality)
+        frame["url"] = conversation_frame_url(experiment_id, image_format, frame["key"], quality)
+        async with semaphore:
+            frame["image"] = await get_frame(frame["key"], frame["arguments"], image_format, quality, wait=True)
+
+    await asyncio.gather(*[render(frame) for frame in frames])
+    return frames
+
+
+def conversation_frame_url(experiment_id: str, image_format: str, key: str, quality: int | None) -> str:
+    url = f"/api/conversations/{experiment_id}/frames/{image_format}/{key}"
+    return url if quality is None else f"{url}?quality={quality}"
+
+
+def frames_manifest(experiment_id: str, frames: List[Dict], image_format: str) -> Dict:
+    return {
+        "id": experiment_id,
+        "format": image_format,
+        "media_type": IMAGE_FORMATS[image_format],
+        "frames": [
+            {
+                "position": frame["position"],
+                "speaker": frame["speaker"],
+                "key": frame["key"],
+                "url": frame["url"],
+            }
+            for frame in frames
+        ],
+    }
+
+
+@app.post("/api/conversations/{experiment_id}/frames")
+async def prerender_conversation(
+    experiment_id: str,
+    image_format: Literal["png", "png8", "webp", "jpeg"] = Query(default="png", alias="format"),
+    quality: int | None = Query(default=None, ge=1, le=100),
+):
+    """
+    Renders all the frames of a conversation up front, so that its replay can prefetch them.
+    Returns the frame of every message (positions of the messages without the Orchestrator)
+    with the URL serving it, see `get_conversation_frame`.
     """
-    # Generate the image with specific messages for each character
-    image_buffer = create_game_image(participant_message, professor_message, learner_message, display_shock)
-    return StreamingResponse(image_buffer, media_type="image/png")
+    frames = await render_conversation(experiment_id, image_format, quality)
+    return frames_manifest(experiment_id, frames, image_format)
+
+
+@app.get("/api/conversations/{experiment_id}/frames/{image_format}/{key}")
+async def get_conversation_frame(
+    experiment_id: str,
+    image_format: Literal["png", "png8", "webp", "jpeg"],
+    key: str,
+    quality: int | None = Query(default=None, ge=1, le=100),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Serves a frame of a conversation by its key (the URLs of the prerendered frames manifest).
+    A frame which left the frame cache since the prerendering is rendered again.
+    """
+    if not is_frame_cache_key(key):
+        raise HTTPException(status_code=404, detail="Frame not found")
+    headers = {"ETag": f'"{key}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    frame = await read_cached_frame(key)
+    if frame is None:
+        image_format, quality = resolve_image_format(image_format, quality, None)
+        messages = await run_io(load_conversation_messages, experiment_id)
+        arguments = next(
+            (
+                frame["arguments"]
+                for frame in conversation_frames(messages)
+                if frame_cache_key(**frame["arguments"], image_format=image_format, quality=quality) == key
+            ),
+            None,
+        )
+        if arguments is None:
+            raise HTTPException(status_code=404, detail="Frame not found")
+        try:
+            frame = await get_frame(key, arguments, image_format, quality)
+        except RenderPoolFull:
+            raise HTTPException(status_code=503, detail="Too many frames being rendered", headers={"Retry-After": "1"})
+    return Response(frame, media_type=IMAGE_FORMATS[image_format], headers=headers)
+
+
+@app.get("/api/conversations/{experiment_id}/frames.zip")
+async def download_conversation_frames(
+    experiment_id: str,
+    image_format: Literal["png", "png8", "webp", "jpeg"] = Query(default="png", alias="format"),
+    quality: int | None = Query(default=None, ge=1, le=100),
+):
+    """
+    Bundles all the frames of a conversation in a zip file,
+    named by message position, with the manifest in manifest.json.
+    """
+    frames = await render_conversation(experiment_id, image_format, quality)
+    extension = "jpg" if image_format == "jpeg" else image_format.removesuffix("8")
+
+    def build_bundle() -> bytes:
+        buffer = BytesIO()
+        # the frames are already compressed
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as bundle:
+            bundle.writestr("manifest.json", json.dumps(frames_manifest(experiment_id, frames, image_format)))
+            for frame in frames:
+                bundle.writestr(f"{frame['position']:04d}.{extension}", frame["image"])
+        return buffer.getvalue()
+
+    return Response(
+        await run_io(build_bundle),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{experiment_id}_frames.zip"'},
+    )
 
 
 async def generate_example_sequence(messages):
@@ -180,28 +353,266 @@ async def generate_example_sequence(messages):
 
 
 @app.get("/api/load-all-conversations")
-async def load_all_conversations():
-    conversations = load_experiments(skip_orchestrator=True)
+def load_all_conversations():
+    # a plain function: FastAPI runs it in its threadpool, the store sync and Parquet reads block
+    conversations = load_experiments(skip_orchestrator=True, store_dir=RESULTS_STORE_DIR)
     
     return conversations
 
 
+# Fields of a conversation that are served from the results index, without opening the result file
+INDEX_FIELDS = {"id", "filename", "participant_model", "provider", "final_voltage", "cost", "timestamp", "message_count"}
+FILE_FIELDS = {"messages", "config"}
+DEFAULT_FIELDS = ["id", "messages", "config", "cost", "timestamp", "final_voltage", "filename"]
+
+
+def encode_cursor(row: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row["timestamp"], row["id"]]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        timestamp, experiment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(timestamp), str(experiment_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str | None) -> List[str]:
+    if not fields:
+        return DEFAULT_FIELDS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(requested) - INDEX_FIELDS - FILE_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def conversation_from_row(row: Dict, fields: List[str]) -> Dict:
+    """Builds the projected conversation of an index row, reading the result file only if needed."""
+    conversation = dict(row)
+    if FILE_FIELDS.intersection(fields):
+        conversation.update(load_experiment_file(RESULTS_FOLDER, row["filename"], skip_orchestrator=True))
+    return {field: conversation.get(field) for field in fields}
+
+
+def query_conversations(
+    participant_model: List[str] | None,
+    provider: List[str] | None,
+    min_voltage: int | None,
+    max_voltage: int | None,
+    cursor: str | None,
+    limit: int | None,
+) -> List[Dict]:
+    index = ResultsIndex(RESULTS_FOLDER)
+    if cursor is None:
+        # a new listing, pick up result files added since the last one
+        index.sync()
+    return index.query(
+        participant_models=participant_model,
+        providers=provider,
+        min_voltage=min_voltage,
+        max_voltage=max_voltage,
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit,
+    )
+
+
+@app.get("/api/conversations")
+def list_conversations(
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    participant_model: List[str] | None = Query(default=None),
+    provider: List[str] | None = Query(default=None),
+    min_voltage: int | None = None,
+    max_voltage: int | None = None,
+    fields: str | None = Query(default=None, description="Comma separated fields to return, e.g. id,final_voltage,participant_model"),
+):
+    """
+    Paginated and filtered list of the conversations, oldest first.
+    - First page: /api/conversations?limit=50&provider=Anthropic&min_voltage=100
+    - Next page: /api/conversations?cursor=<next_cursor of the previous page>
+    - Metadata only: /api/conversations?fields=id,participant_model,final_voltage
+    """
+    projection = parse_fields(fields)
+    rows = query_conversations(participant_model, provider, min_voltage, max_voltage, cursor, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [conversation_from_row(row, projection) for row in rows],
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+    }
+
+
+@app.get("/api/conversations/stream")
+def stream_conversations(
+    participant_model: List[str] | None = Query(default=None),
+    provider: List[str] | None = Query(default=None),
+    min_voltage: int | None = None,
+    max_voltage: int | None = None,
+    fields: str | None = None,
+):
+    """
+    Same as /api/conversations, but streams every matching conversation as
+    newline delimited JSON, one conversation per line.
+    """
+    projection = parse_fields(fields)
+    rows = query_conversations(participant_model, provider, min_voltage, max_voltage, None, None)
+
+    def generate():
+        for row in rows:
+            try:
+                yield json.dumps(conversation_from_row(row, projection)) + "\n"
+            except Exception as e:
+                logger.error(f"Error reading conversation {row['filename']}: {e}")
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def audio_response(
+    audio: bytes,
+    etag: str,
+    range_header: str | None,
+    if_none_match: str | None,
+    cache_control: str,
+    extra_headers: Dict[str, str] | None = None,
+) -> Response:
+    """Answers with the whole clip, the requested byte range (206) or a 304 when the ETag matches."""
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes", **(extra_headers or {})}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        byte_range = parse_byte_range(range_header, len(audio))
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(audio)}"})
+    if byte_range is None:
+        return Response(audio, media_type="audio/mpeg", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(audio)}"
+    return Response(audio[start : end + 1], status_code=206, media_type="audio/mpeg", headers=headers)
+
+
+@app.get("/api/audio/{filename}")
+async def get_static_audio(
+    filename: str,
+    range_header: str | None = Header(default=None, alias="Range"),
+    if_none_match: str | None = Header(default=None),
+):
+    """Serves an MP3 of the static directory from memory, e.g. /api/audio/electric-shock-cut.mp3"""
+    if not filename.endswith(".mp3") or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    try:
+        audio, etag = load_static_audio(filename)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return audio_response(audio, etag, range_header, if_none_match, "public, max-age=86400")
+
+
+async def tts_response(
+    role: str,
+    message: str,
+    range_header: str | None,
+    if_none_match: str | None,
+    extra_headers: Dict[str, str] | None = None,
+) -> Response:
+    """
+    Answers with the audio of a message: a 304 when the client has it already, the requested
+    byte range of the clip, or the clip streamed as it is generated.
+    The ETag of a generated clip is the `audio_digest` of its bytes, so it changes when
+    the line is generated again after leaving the cache.
+    """
+    if role == "SHOCKING_DEVICE":
+        # preloaded at startup
+        audio, etag = load_static_audio(SHOCK_SOUND)
+        return audio_response(audio, etag, range_header, if_none_match, TTS_CACHE_CONTROL, extra_headers)
+
+    try:
+        role = Roles(role)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown role: {role}")
+    if not has_voice(role):
+        raise HTTPException(status_code=404, detail=f"No voice for the {role.value} role")
+
+    audio = await get_cached_tts(message, role)
+    if audio is None and range_header:
+        # seeking needs the whole clip
+        audio = (await generate_tts(message, role)).getvalue()
+    if audio is not None:
+        digest = audio_digest(audio)
+        headers = {
+            # content-addressed URL of the same bytes
+            "Content-Location": f"/api/tts/audio/{digest}",
+            **(extra_headers or {}),
+        }
+        return audio_response(audio, f'"{digest}"', range_header, if_none_match, TTS_CACHE_CONTROL, headers)
+
+    # not generated yet: the clip is streamed as it is generated, its digest is only known at the end
+    headers = {"Cache-Control": TTS_CACHE_CONTROL, **(extra_headers or {})}
+    audio_stream = stream_tts(message, role)
+    # wait for the first chunk, so that errors are reported before the response starts
+    first_chunk = await anext(audio_stream, b"")
+
+    async def stream_audio():
+        yield first_chunk
+        async for chunk in audio_stream:
+            yield chunk
+
+    return StreamingResponse(stream_audio(), media_type="audio/mpeg", headers=headers)
+
+
 @app.post("/api/tts")
-async def generate_tts_endpoint(request: dict):
+async def generate_tts_endpoint(
+    request: dict,
+    range_header: str | None = Header(default=None, alias="Range"),
+    if_none_match: str | None = Header(default=None),
+):
     """Generate TTS audio for a message"""
     role = request.get("role")
     message = request.get("message", "")    
     logger.info(f"Generating TTS for role: {role}, message: {message}")
-    if role == "SHOCKING_DEVICE":
-        # load data from disk
-        audio_data: BytesIO = load_mp3("./static/electric-shock-cut.mp3")
-    else:   
-        audio_data: BytesIO = await generate_tts(message, Roles(role))
-    return StreamingResponse(
-        BytesIO(audio_data.getvalue()),
-        media_type="audio/mpeg",
-        headers={"Content-Disposition": "attachment; filename=tts.mp3"}
-    )
+    headers = {"Content-Disposition": "attachment; filename=tts.mp3"}
+    return await tts_response(role, message, range_header, if_none_match, headers)
+
+
+@app.get("/api/tts")
+async def get_tts(
+    role: str,
+    message: str = "",
+    range_header: str | None = Header(default=None, alias="Range"),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Idempotent variant of POST /api/tts, e.g. /api/tts?role=Professor&message=Hello,
+    so that browsers and CDNs can cache and seek the audio.
+    """
+    return await tts_response(role, message, range_header, if_none_match)
+
+
+@app.get("/api/tts/audio/{digest}")
+async def get_tts_by_digest(
+    digest: str,
+    range_header: str | None = Header(default=None, alias="Range"),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Serves a generated clip by the sha256 of its bytes (the ETag and Content-Location of /api/tts).
+    The bytes of an address never change, a 404 means the clip left the cache.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    etag = f'"{digest}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL})
+    audio = await run_io(read_tts_by_digest, digest)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return audio_response(audio, etag, range_header, if_none_match, IMMUTABLE_CACHE_CONTROL)
+
+
+@app.get("/api/tts/stats")
+async def get_tts_cache_stats():
+    """Hit, miss and eviction counters of the TTS caches"""
+    return tts_cache_stats()
 
 
 # @app.get("/api/run-experiment")
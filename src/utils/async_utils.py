@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from config.variables import ASYNC_BLOCKING_WORKERS, SERVER_IO_WORKERS
+
+
+R = TypeVar("R")
+
+# Shared by all the conversations running on the event loop,
+# bounds the number of blocking LLM client calls in flight.
+# AutoGen's clients are synchronous, so the async experiments are coroutines over these threads.
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="blocking"
+)
+# The server's disk and database reads, sized on their own so that they never queue behind LLM calls
+_io_executor = ThreadPoolExecutor(max_workers=SERVER_IO_WORKERS, thread_name_prefix="server-io")
+
+
+async def _run_in_executor(executor: ThreadPoolExecutor, func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(context.run, func, *args, **kwargs),
+    )
+
+
+async def run_blocking(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """
+    Runs a blocking function in the shared executor without blocking the event loop.
+    Context variables (e.g. AutoGen's IOStream) are propagated to the worker thread.
+    """
+    return await _run_in_executor(_blocking_executor, func, *args, **kwargs)
+
+
+async def run_io(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """Same as `run_blocking`, for the disk and database I/O of the server (see SERVER_IO_WORKERS)."""
+    return await _run_in_executor(_io_executor, func, *args, **kwargs)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single call, e.g. so that
+    simultaneous requests for the same uncached resource only produce it once.
+    Callers awaiting a call share its result (or exception). Cancelling one of them
+    does not cancel the call for the others. Must be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def start(self, key: Hashable, func: Callable[[], Awaitable[R]]) -> asyncio.Future:
+        """Starts `func()` unless a call is in flight for `key`, and returns the future of the call."""
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return future
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[R]]) -> R:
+        """Awaits `func()`, or the call already in flight for `key`."""
+        return await asyncio.shield(self.start(key, func))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+
+class RateLimiter:
+    """
+    Spaces out calls evenly to at most `rate` per second, e.g. to stay under an API rate limit.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        """Waits for the next free slot."""
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
@@ -5,6 +5,18 @@ from io import BytesIO
 
 
 
+def is_mp3(filename: str) -> bool:
+    """Sniffs the header of a file: an MP3 stream starts with an ID3 tag or an MPEG audio frame sync."""
+    try:
+        with open(filename, "rb") as f:
+            header = f.read(3)
+    except OSError:
+        return False
+    if header.startswith(b"ID3"):
+        return True
+    return len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0
+
+
 def load_mp3(filename: str) -> BytesIO:
     if not os.path.exists(filename):
         raise FileNotFoundError(f"File {filename} does not exist.")
@@ -12,6 +24,11 @@ def load_mp3(filename: str) -> BytesIO:
     # Construct the full path to the file
     filepath = Path(filename)
 
+    # Already an MP3, no need to spawn ffmpeg to copy it
+    if is_mp3(filepath):
+        with open(filepath, "rb") as f:
+            return BytesIO(f.read())
+
     # Use ffmpeg to load the MP3 file and convert it to bytes
     try:
         out, _ = ffmpeg.input(str(filepath)).output('pipe:', format='mp3', codec='copy').run(capture_stdout=True, capture_stderr=True)
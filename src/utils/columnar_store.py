@@ -0,0 +1,263 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = "results_store"
+EXPERIMENTS_FILE = "experiments.parquet"
+MESSAGES_FILE = "messages.parquet"
+
+EXPERIMENTS_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("filename", pa.string()),
+        ("participant_model", pa.string()),
+        ("learner_model", pa.string()),
+        ("professor_model", pa.string()),
+        ("orchestrator_model", pa.string()),
+        ("max_rounds", pa.int64()),
+        ("cost", pa.float64()),
+        ("timestamp", pa.int64()),
+        ("final_voltage", pa.int64()),
+        ("message_count", pa.int64()),
+        # full ConversationConfig, for readers that need more than the model names
+        ("config", pa.string()),
+    ]
+)
+
+MESSAGES_SCHEMA = pa.schema(
+    [
+        ("experiment_id", pa.string()),
+        ("position", pa.int32()),
+        ("speaker", pa.string()),
+        ("text", pa.string()),
+    ]
+)
+
+
+def _write_table(table: pa.Table, path: str) -> None:
+    """Writes a parquet file atomically, so that readers never see a partial table."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def _experiment_filenames(folder: str) -> Set[str]:
+    return {
+        filename
+        for filename in os.listdir(folder)
+        if filename.startswith("experiment_") and filename.endswith(".json")
+    }
+
+
+def _experiment_rows(data: Dict, filename: str) -> Tuple[Dict, List[Dict]]:
+    """Returns the row of an experiment in the experiments table, and the rows of its messages."""
+    config = data["config"]
+    experiment = {
+        "id": data["id"],
+        "filename": filename,
+        "max_rounds": config.get("max_rounds"),
+        "cost": data.get("cost"),
+        "timestamp": data.get("timestamp"),
+        "final_voltage": data.get("final_voltage"),
+        "message_count": len(data["messages"]),
+        "config": json.dumps(config),
+    }
+    for role in ("participant", "learner", "professor", "orchestrator"):
+        experiment[f"{role}_model"] = config[f"{role}_model"]["model"]
+    messages = [
+        {
+            "experiment_id": data["id"],
+            "position": position,
+            "speaker": message["speaker"],
+            "text": message["text"],
+        }
+        for position, message in enumerate(data["messages"])
+    ]
+    return experiment, messages
+
+
+def _read_results(folder: str, filenames: Iterable[str]) -> Tuple[pa.Table, pa.Table]:
+    """
+    Reads experiment JSON files into an experiments table and a messages table.
+    Unreadable or malformed files are logged and skipped.
+    """
+    experiments: List[Dict] = []
+    messages: List[Dict] = []
+    for filename in sorted(filenames):
+        try:
+            with open(os.path.join(folder, filename), "r") as f:
+                experiment, experiment_messages = _experiment_rows(json.load(f), filename)
+        except Exception as e:
+            logger.error(f"Error reading file {filename}: {e}")
+            continue
+        experiments.append(experiment)
+        messages.extend(experiment_messages)
+    return (
+        pa.Table.from_pylist(experiments, schema=EXPERIMENTS_SCHEMA),
+        pa.Table.from_pylist(messages, schema=MESSAGES_SCHEMA),
+    )
+
+
+def _write_store(experiments: pa.Table, messages: pa.Table, store_dir: str) -> None:
+    os.makedirs(store_dir, exist_ok=True)
+    # messages first: a reader in between sees the old experiments, each with its messages
+    _write_table(messages, os.path.join(store_dir, MESSAGES_FILE))
+    _write_table(experiments, os.path.join(store_dir, EXPERIMENTS_FILE))
+
+
+def import_results(folder: str = "results", store_dir: str = STORE_DIR) -> int:
+    """
+    Converts the experiment JSON files of a results folder into the columnar store:
+    one table of experiment metadata and one table of messages.
+
+    Args:
+        folder: The folder with the `experiment_*.json` files.
+        store_dir: The folder to write the parquet files to.
+
+    Returns:
+        int: The number of imported experiments.
+    """
+    experiments, messages = _read_results(folder, _experiment_filenames(folder))
+    _write_store(experiments, messages, store_dir)
+    logger.info(f"Imported {experiments.num_rows} experiments into {store_dir}")
+    return experiments.num_rows
+
+
+def sync_store(folder: str = "results", store_dir: str = STORE_DIR) -> int:
+    """
+    Brings the columnar store up to date with the results folder: imports the experiment
+    files missing from the store and drops the experiments whose file was removed.
+    Only the filenames are read when the store is already up to date.
+
+    Returns:
+        int: The number of experiments added to the store.
+    """
+    if not os.path.exists(os.path.join(store_dir, EXPERIMENTS_FILE)):
+        return import_results(folder, store_dir)
+
+    filenames = _experiment_filenames(folder)
+    stored = set(read_experiments_table(store_dir, columns=["filename"]).column("filename").to_pylist())
+    added, removed = filenames - stored, stored - filenames
+    if not added and not removed:
+        return 0
+
+    new_experiments, new_messages = _read_results(folder, added)
+    experiments = read_experiments_table(store_dir)
+    messages = read_messages_table(store_dir)
+    if removed:
+        removed_rows = pc.is_in(experiments["filename"], value_set=pa.array(sorted(removed), pa.string()))
+        removed_ids = experiments.filter(removed_rows).column("id").combine_chunks()
+        experiments = experiments.filter(pc.invert(removed_rows))
+        messages = messages.filter(pc.invert(pc.is_in(messages["experiment_id"], value_set=removed_ids)))
+    _write_store(
+        pa.concat_tables([experiments, new_experiments]),
+        pa.concat_tables([messages, new_messages]),
+        store_dir,
+    )
+    logger.info(
+        f"Added {new_experiments.num_rows} and removed {len(removed)} experiments of {store_dir}"
+    )
+    return new_experiments.num_rows
+
+
+def read_experiments_table(
+    store_dir: str = STORE_DIR,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+) -> pa.Table:
+    """
+    Reads the experiment metadata table, only decoding the requested columns.
+
+    Args:
+        store_dir: The folder of the columnar store.
+        columns: The columns to read, all of them if None.
+        filters: Row filters in the `pyarrow.parquet.read_table` format,
+            e.g. [("participant_model", "=", "gpt-4o")].
+    """
+    return pq.read_table(
+        os.path.join(store_dir, EXPERIMENTS_FILE), columns=columns, filters=filters
+    )
+
+
+def read_messages_table(
+    store_dir: str = STORE_DIR,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+) -> pa.Table:
+    """Reads the messages table, see `read_experiments_table`."""
+    return pq.read_table(
+        os.path.join(store_dir, MESSAGES_FILE), columns=columns, filters=filters
+    )
+
+
+def load_experiments_from_store(
+    store_dir: str = STORE_DIR,
+    skip_orchestrator: bool = False,
+    include_messages: bool = True,
+) -> List[Dict]:
+    """
+    Loads the experiments from the columnar store, in the same format as
+    `utils.general.load_experiments` loads them from the JSON files.
+
+    Every experiment also gets a `message_count`, so that readers which only need
+    the number of messages can skip reading the messages table.
+    """
+    experiments_table = read_experiments_table(
+        store_dir,
+        columns=["id", "filename", "cost", "timestamp", "final_voltage", "message_count", "config"],
+    )
+    experiments = []
+    for row in experiments_table.to_pylist():
+        experiments.append(
+            {
+                "id": row["id"],
+                "config": json.loads(row["config"]),
+                "cost": row["cost"],
+                "timestamp": row["timestamp"],
+                "final_voltage": row["final_voltage"],
+                "filename": row["filename"],
+                "message_count": row["message_count"],
+            }
+        )
+
+    if include_messages:
+        messages_table = read_messages_table(store_dir)
+        if skip_orchestrator:
+            messages_table = messages_table.filter(
+                pc.field("speaker") != "Orchestrator"
+            )
+        messages_table = messages_table.sort_by(
+            [("experiment_id", "ascending"), ("position", "ascending")]
+        )
+        messages_by_experiment: Dict[str, List[Dict]] = {}
+        for message in messages_table.to_pylist():
+            messages_by_experiment.setdefault(message["experiment_id"], []).append(
+                {"speaker": message["speaker"], "text": message["text"]}
+            )
+        for experiment in experiments:
+            experiment["messages"] = messages_by_experiment.get(experiment["id"], [])
+
+    logger.info(f"Loaded {len(experiments)} experiments from {store_dir}")
+    return experiments
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the experiment JSON files into the columnar results store."
+    )
+    parser.add_argument("--results", default="results", help="Folder with the experiment JSON files")
+    parser.add_argument("--store", default=STORE_DIR, help="Folder of the columnar store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    import_results(args.results, args.store)
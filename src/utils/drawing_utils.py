@@ -1,4 +1,5 @@
 from PIL import Image, ImageFont
+from typing import NamedTuple
 import textwrap
 import math
 
@@ -13,17 +14,26 @@ def resize_sprite(sprite: Image.Image, scale_flearner: float) -> Image.Image:
     return sprite.resize((new_width, new_height), Image.Resampling.LANCZOS)
 
 
-def adjust_cloud(
-    cloud: Image.Image, message: str, used_font: ImageFont.FreeTypeFont
-) -> tuple[Image.Image, list[str], float]:
+class CloudLayout(NamedTuple):
+    """Layout of a message in a cloud: the wrapped lines, their widths and the cloud size."""
+
+    lines: list[str]
+    line_widths: list[int]
+    line_spacing: float
+    width: int
+    height: int
+
+
+def layout_cloud_text(
+    message: str, used_font: ImageFont.FreeTypeFont, base_size: tuple[int, int]
+) -> CloudLayout:
     """
-    Adjusts the cloud size to fit the message by extending the middle portion.
-    Determines the target cloud size based on text content first, then wraps text accordingly.
-    Maintains a 2:3 height-to-width ratio and handles text wrapping.
-    Returns a new image with the adjusted cloud, the wrapped text lines, the calculated font size, and line spacing.
+    Wraps the message and computes the size of the cloud fitting it.
+    The cloud is never smaller than its base size, and the text block
+    aims at a 3:2 width-to-height ratio.
     """
     # Calculate base dimensions
-    base_width, base_height = cloud.size
+    base_width, base_height = base_size
     padding = 40  # Padding inside the cloud
 
     # Get precise text dimensions using the font
@@ -49,103 +59,97 @@ def adjust_cloud(
     wrapped_lines = textwrap.wrap(
         message, width=max(target_line_width, 20)
     )  # minimum 20 chars
-    actual_lines = len(wrapped_lines)
+
+    # Measure every line once, the widths are reused to center the lines
+    line_widths = []
+    for line in wrapped_lines:
+        line_bbox = used_font.getbbox(line)
+        line_widths.append(line_bbox[2] - line_bbox[0])
 
     # Calculate precise text area needed based on ACTUAL wrapped text
-    if wrapped_lines:
-        # Get the actual width of the widest line
-        actual_text_width = max(
-            used_font.getbbox(line)[2] - used_font.getbbox(line)[0]
-            for line in wrapped_lines
-        )
-        actual_text_height = actual_lines * line_spacing
-    else:
-        actual_text_width = 0
-        actual_text_height = 0
+    actual_text_width = max(line_widths, default=0)
+    actual_text_height = len(wrapped_lines) * line_spacing
 
     # Calculate target dimensions with padding
     target_width = max(actual_text_width + (padding * 2), base_width)
     target_height = max(actual_text_height + (padding * 2), base_height)
 
-    # Calculate how much we need to expand
-    needed_width = max(0, target_width - base_width)
-    needed_height = max(0, target_height - base_height)
-
-    new_width = base_width + needed_width
-    new_height = base_height + needed_height
-
-    # Ensure both dimensions are integers
-    new_width = int(new_width)
-    new_height = int(new_height)
-
-    # If we need to resize the cloud
-    if new_width > base_width or new_height > base_height:
-        # Create a new blank image
-        new_cloud = Image.new("RGBA", (new_width, new_height), (0, 0, 0, 0))
-
-        # The rest of the code for resizing the cloud remains the same
-        # Get the middle column and row for expansion
-        mid_x = base_width // 2
-        mid_y = base_height // 2
+    return CloudLayout(
+        wrapped_lines, line_widths, line_spacing, int(target_width), int(target_height)
+    )
 
-        # Extract the four corners
-        top_left = cloud.crop((0, 0, mid_x, mid_y))
-        top_right = cloud.crop((mid_x, 0, base_width, mid_y))
-        bottom_left = cloud.crop((0, mid_y, mid_x, base_height))
-        bottom_right = cloud.crop((mid_x, mid_y, base_width, base_height))
 
-        # Paste the corners
-        new_cloud.paste(top_left, (0, 0), top_left)
-        new_cloud.paste(top_right, (new_width - (base_width - mid_x), 0), top_right)
+def stretch_cloud(cloud: Image.Image, width: int, height: int) -> Image.Image:
+    """
+    Stretches the cloud to the given size by extending its middle row and column
+    (nine-slice scaling), keeping the corners, and so the tail, untouched.
+    """
+    base_width, base_height = cloud.size
+    if width <= base_width and height <= base_height:
+        return cloud
+
+    # Create a new blank image
+    new_cloud = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+
+    # Get the middle column and row for expansion
+    mid_x = base_width // 2
+    mid_y = base_height // 2
+    right_x = width - (base_width - mid_x)
+    bottom_y = height - (base_height - mid_y)
+    fill_width = right_x - mid_x
+    fill_height = bottom_y - mid_y
+
+    # Extract the four corners
+    top_left = cloud.crop((0, 0, mid_x, mid_y))
+    top_right = cloud.crop((mid_x, 0, base_width, mid_y))
+    bottom_left = cloud.crop((0, mid_y, mid_x, base_height))
+    bottom_right = cloud.crop((mid_x, mid_y, base_width, base_height))
+
+    # Paste the corners
+    new_cloud.paste(top_left, (0, 0), top_left)
+    new_cloud.paste(top_right, (right_x, 0), top_right)
+    new_cloud.paste(bottom_left, (0, bottom_y), bottom_left)
+    new_cloud.paste(bottom_right, (right_x, bottom_y), bottom_right)
+
+    # Fill the middle sections by repeating the middle column and row of the cloud,
+    # the pixels are copied as they are (no blending)
+    if fill_width > 0:
+        top_strip = cloud.crop((mid_x, 0, mid_x + 1, mid_y))
+        bottom_strip = cloud.crop((mid_x, mid_y, mid_x + 1, base_height))
         new_cloud.paste(
-            bottom_left, (0, new_height - (base_height - mid_y)), bottom_left
+            top_strip.resize((fill_width, mid_y), Image.Resampling.NEAREST), (mid_x, 0)
         )
         new_cloud.paste(
-            bottom_right,
-            (new_width - (base_width - mid_x), new_height - (base_height - mid_y)),
-            bottom_right,
+            bottom_strip.resize((fill_width, base_height - mid_y), Image.Resampling.NEAREST),
+            (mid_x, bottom_y),
         )
-
-        # Sample a few pixels from the center of the cloud to use for filling
-        center_pixel = cloud.getpixel((mid_x, mid_y))
-
-        # Create horizontal and vertical "strips" from the original cloud
-        top_strip = cloud.crop((mid_x, 0, mid_x + 1, mid_y))
-        bottom_strip = cloud.crop((mid_x, mid_y, mid_x + 1, base_height))
+    if fill_height > 0:
         left_strip = cloud.crop((0, mid_y, mid_x, mid_y + 1))
         right_strip = cloud.crop((mid_x, mid_y, base_width, mid_y + 1))
+        new_cloud.paste(
+            left_strip.resize((mid_x, fill_height), Image.Resampling.NEAREST), (0, mid_y)
+        )
+        new_cloud.paste(
+            right_strip.resize((base_width - mid_x, fill_height), Image.Resampling.NEAREST),
+            (right_x, mid_y),
+        )
+    if fill_width > 0 and fill_height > 0:
+        # Fill the center section with the center pixel of the cloud
+        new_cloud.paste(
+            cloud.getpixel((mid_x, mid_y)), (mid_x, mid_y, right_x, bottom_y)
+        )
 
-        # Fill the horizontal middle sections (top and bottom)
-        for x in range(mid_x, new_width - (base_width - mid_x)):
-            # Top section
-            for y in range(0, mid_y):
-                pixel = top_strip.getpixel((0, y))
-                new_cloud.putpixel((x, y), pixel)
-
-            # Bottom section
-            for y in range(new_height - (base_height - mid_y), new_height):
-                rel_y = y - (new_height - (base_height - mid_y))
-                pixel = bottom_strip.getpixel((0, rel_y))
-                new_cloud.putpixel((x, y), pixel)
-
-        # Fill the vertical middle sections (left and right)
-        for y in range(mid_y, new_height - (base_height - mid_y)):
-            # Left section
-            for x in range(0, mid_x):
-                pixel = left_strip.getpixel((x, 0))
-                new_cloud.putpixel((x, y), pixel)
-
-            # Right section
-            for x in range(new_width - (base_width - mid_x), new_width):
-                rel_x = x - (new_width - (base_width - mid_x))
-                pixel = right_strip.getpixel((rel_x, 0))
-                new_cloud.putpixel((x, y), pixel)
-
-        # Fill the center section (expanded area)
-        for y in range(mid_y, new_height - (base_height - mid_y)):
-            for x in range(mid_x, new_width - (base_width - mid_x)):
-                new_cloud.putpixel((x, y), center_pixel)
-
-        return new_cloud, wrapped_lines, line_spacing
-
-    return cloud, wrapped_lines, line_spacing
+    return new_cloud
+
+
+def adjust_cloud(
+    cloud: Image.Image, message: str, used_font: ImageFont.FreeTypeFont
+) -> tuple[Image.Image, list[str], float]:
+    """
+    Adjusts the cloud size to fit the message by extending the middle portion.
+    Determines the target cloud size based on text content first, then wraps text accordingly.
+    Maintains a 2:3 height-to-width ratio and handles text wrapping.
+    Returns a new image with the adjusted cloud, the wrapped text lines and the line spacing.
+    """
+    layout = layout_cloud_text(message, used_font, cloud.size)
+    return stretch_cloud(cloud, layout.width, layout.height), layout.lines, layout.line_spacing
@@ -48,8 +48,32 @@ def get_provider_name(model_name: str) -> str:
     return "Unknown"
 
 
-def load_experiments(skip_orchestrator: bool = False, folder: str = "results") -> List[Dict]:
-    """Load all experiment results from the results directory."""
+def load_experiments(
+    skip_orchestrator: bool = False,
+    folder: str = "results",
+    store_dir: str | None = None,
+    include_messages: bool = True,
+) -> List[Dict]:
+    """
+    Load all experiment results from the results directory.
+
+    If `store_dir` points to an existing columnar store (see `utils.columnar_store`),
+    the experiments are read from it instead of parsing the JSON files, and
+    `include_messages=False` skips reading the messages entirely. The store is first
+    brought up to date with the files added to or removed from the results folder.
+    """
+    if store_dir is not None and os.path.exists(store_dir):
+        from utils.columnar_store import load_experiments_from_store, sync_store
+
+        if os.path.exists(folder):
+            sync_store(folder, store_dir)
+
+        return load_experiments_from_store(
+            store_dir,
+            skip_orchestrator=skip_orchestrator,
+            include_messages=include_messages,
+        )
+
     experiments = []
     
     # Check if results directory exists
@@ -60,13 +84,18 @@ def load_experiments(skip_orchestrator: bool = False, folder: str = "results") -
     for filename in os.listdir(folder):
         if filename.startswith("experiment_") and filename.endswith(".json"):
             try:
-                with open(os.path.join(folder, filename), "r") as f:
-                    data = json.load(f)
-                    data["filename"] = filename  # Add filename for reference
-                    data["messages"] = [msg for msg in data["messages"] if msg["speaker"] != "Orchestrator"] if skip_orchestrator else data["messages"]
-                    experiments.append(data)
+                experiments.append(load_experiment_file(folder, filename, skip_orchestrator))
             except Exception as e:
                 logger.error(f"Error reading file {filename}: {e}")
     
     logger.info(f"Loaded {len(experiments)} experiments")
-    return experiments
\ No newline at end of file
+    return experiments
+
+
+def load_experiment_file(folder: str, filename: str, skip_orchestrator: bool = False) -> Dict:
+    """Load a single experiment result file of the results directory."""
+    with open(os.path.join(folder, filename), "r") as f:
+        data = json.load(f)
+    data["filename"] = filename  # Add filename for reference
+    data["messages"] = [msg for msg in data["messages"] if msg["speaker"] != "Orchestrator"] if skip_orchestrator else data["messages"]
+    return data
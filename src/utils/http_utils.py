@@ -0,0 +1,108 @@
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks whether an `If-None-Match` request header matches the ETag of a resource.
+
+    Args:
+        if_none_match: The header value, e.g. '"abc"', 'W/"abc", "def"' or '*'.
+        etag: The quoted ETag of the resource, e.g. '"abc"'.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as required for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def negotiate_media_type(accept: str | None, offered: list[str]) -> str | None:
+    """
+    Picks the media type to send from the `Accept` request header.
+
+    Every offered type gets the quality of the most specific range matching it,
+    the best quality wins, then the most specific match, then the offered order.
+    So 'image/webp,*/*' picks image/webp, while '*/*' picks the first offered type.
+
+    Args:
+        accept: The header value, e.g. 'image/webp,image/*;q=0.8'. None accepts anything.
+        offered: The media types that can be produced, in order of preference.
+
+    Returns:
+        str | None: The chosen media type, or None if none of them is acceptable.
+    """
+    if not accept:
+        return offered[0] if offered else None
+
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = [item.strip() for item in part.split(";")]
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media_range.lower(), quality))
+
+    best = None
+    for position, media_type in enumerate(offered):
+        main_type = media_type.split("/")[0]
+        match = None
+        for media_range, quality in ranges:
+            if media_range == media_type:
+                specificity = 2
+            elif media_range == f"{main_type}/*":
+                specificity = 1
+            elif media_range == "*/*":
+                specificity = 0
+            else:
+                continue
+            if match is None or specificity > match[1]:
+                match = (quality, specificity)
+        if match is None or match[0] <= 0:
+            continue
+        rank = (match[0], match[1], -position)
+        if best is None or rank > best[0]:
+            best = (rank, media_type)
+    return best[1] if best else None
+
+
+def parse_byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parses a `Range` request header for a resource of `size` bytes.
+
+    Only single ranges are supported, e.g. 'bytes=0-1023', 'bytes=1024-' or 'bytes=-500'.
+    Missing, malformed and multiple ranges return None, so that the whole resource is sent.
+
+    Returns:
+        tuple[int, int] | None: The first and last (inclusive) byte positions to send.
+
+    Raises:
+        ValueError: If the range is not satisfiable, to answer with a 416.
+    """
+    if not range_header:
+        return None
+    unit, _, byte_range = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in byte_range:
+        return None
+    first, separator, last = byte_range.strip().partition("-")
+    if not separator or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # suffix range, the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - int(last), 0), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Range starts after the end of the {size} bytes")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
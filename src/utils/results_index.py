@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.general import get_provider_name
+from utils.sqlite_utils import enable_wal
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    participant_model TEXT,
+    provider TEXT,
+    final_voltage INTEGER,
+    cost REAL,
+    timestamp INTEGER,
+    message_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_experiments_participant_model ON experiments (participant_model);
+CREATE INDEX IF NOT EXISTS idx_experiments_timestamp ON experiments (timestamp, id);
+"""
+
+# Index files set up by this process. The schema and the WAL mode persist in the file,
+# so they only need to be created once, not on every connection
+_ready_index_paths = set()
+_ready_lock = threading.Lock()
+
+
+def experiment_row(data: dict, filename: str) -> Dict:
+    """Extracts the indexed fields from an experiment result."""
+    participant_model = data["config"]["participant_model"]["model"]
+    return {
+        "id": data["id"],
+        "filename": filename,
+        "participant_model": participant_model,
+        "provider": get_provider_name(participant_model),
+        "final_voltage": data.get("final_voltage"),
+        "cost": data.get("cost"),
+        "timestamp": data.get("timestamp"),
+        "message_count": len(data.get("messages", [])),
+    }
+
+
+class ResultsIndex:
+    """
+    Persistent SQLite index of the experiment results stored in a results folder.
+
+    The index lives next to the results (`<folder>/index.sqlite`) and holds one row
+    per `experiment_*.json` file, so that the results can be counted and filtered
+    without parsing every file. It is built from the folder the first time it is opened.
+    """
+
+    def __init__(self, folder: str = "results", index_path: str | None = None):
+        self.folder = folder
+        self.index_path = index_path or os.path.join(folder, INDEX_FILENAME)
+
+    def _ensure_schema(self) -> None:
+        """Creates the index file, its schema and its first content, once per process."""
+        path = os.path.abspath(self.index_path)
+        if path in _ready_index_paths and os.path.exists(path):
+            return
+        with _ready_lock:
+            if path in _ready_index_paths and os.path.exists(path):
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            with closing(sqlite3.connect(path, timeout=30)) as connection:
+                connection.row_factory = sqlite3.Row
+                # WAL allows concurrent readers while experiments are being added
+                enable_wal(connection)
+                connection.executescript(SCHEMA)
+                if is_new:
+                    self._sync(connection)
+            _ready_index_paths.add(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self._ensure_schema()
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def add(self, data: dict, filename: str) -> None:
+        """Adds (or replaces) a single experiment result in the index."""
+        row = experiment_row(data, filename)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO experiments
+                VALUES (:id, :filename, :participant_model, :provider, :final_voltage, :cost, :timestamp, :message_count)
+                """,
+                row,
+            )
+
+    def sync(self) -> int:
+        """
+        Brings the index up to date with the results folder, parsing only the files
+        missing from the index and dropping the rows of removed files.
+
+        Returns:
+            int: The number of experiment files added to the index.
+        """
+        with closing(self._connect()) as connection:
+            return self._sync(connection)
+
+    def _sync(self, connection: sqlite3.Connection) -> int:
+        if not os.path.exists(self.folder):
+            return 0
+
+        filenames = {
+            filename
+            for filename in os.listdir(self.folder)
+            if filename.startswith("experiment_") and filename.endswith(".json")
+        }
+        indexed = {row["filename"] for row in connection.execute("SELECT filename FROM experiments")}
+
+        rows = []
+        for filename in filenames - indexed:
+            try:
+                with open(os.path.join(self.folder, filename), "r") as f:
+                    rows.append(experiment_row(json.load(f), filename))
+            except Exception as e:
+                logger.error(f"Error indexing file {filename}: {e}")
+
+        with connection:
+            connection.executemany(
+                "DELETE FROM experiments WHERE filename = ?",
+                [(filename,) for filename in indexed - filenames],
+            )
+            connection.executemany(
+                """
+                INSERT OR REPLACE INTO experiments
+                VALUES (:id, :filename, :participant_model, :provider, :final_voltage, :cost, :timestamp, :message_count)
+                """,
+                rows,
+            )
+        if rows:
+            logger.info(f"Indexed {len(rows)} new experiment files")
+        return len(rows)
+
+    def count_by_model(self, participant_model: str) -> int:
+        """Returns the number of experiments with the given participant model."""
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM experiments WHERE participant_model = ?",
+                (participant_model,),
+            ).fetchone()[0]
+
+    def counts_by_model(self) -> Dict[str, int]:
+        """Returns the number of experiments of every participant model."""
+        with closing(self._connect()) as connection:
+            return {
+                row["participant_model"]: row["count"]
+                for row in connection.execute(
+                    "SELECT participant_model, COUNT(*) AS count FROM experiments GROUP BY participant_model"
+                )
+            }
+
+    def get(self, experiment_id: str) -> Optional[Dict]:
+        """Returns the indexed experiment with the given id, or None."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM experiments WHERE id = ?", (experiment_id,)).fetchone()
+            return dict(row) if row else None
+
+    def rows(self) -> List[Dict]:
+        """Returns all the indexed experiments, oldest first."""
+        return self.query()
+
+    def query(
+        self,
+        participant_models: Optional[Sequence[str]] = None,
+        providers: Optional[Sequence[str]] = None,
+        min_voltage: Optional[int] = None,
+        max_voltage: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Returns the indexed experiments matching the filters, ordered by (timestamp, id).
+
+        Args:
+            participant_models: Keep only experiments with one of these participant models.
+            providers: Keep only experiments with one of these providers (see `get_provider_name`).
+            min_voltage: Keep only experiments with at least this final voltage.
+            max_voltage: Keep only experiments with at most this final voltage.
+            after: (timestamp, id) of the last experiment of the previous page, for keyset pagination.
+            limit: Maximum number of experiments to return.
+        """
+        conditions = []
+        params: List = []
+        if participant_models:
+            conditions.append(f"participant_model IN ({', '.join('?' * len(participant_models))})")
+            params.extend(participant_models)
+        if providers:
+            conditions.append(f"provider IN ({', '.join('?' * len(providers))})")
+            params.extend(providers)
+        if min_voltage is not None:
+            conditions.append("final_voltage >= ?")
+            params.append(min_voltage)
+        if max_voltage is not None:
+            conditions.append("final_voltage <= ?")
+            params.append(max_voltage)
+        if after is not None:
+            conditions.append("(timestamp, id) > (?, ?)")
+            params.extend(after)
+
+        sql = "SELECT * FROM experiments"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with closing(self._connect()) as connection:
+            return [dict(row) for row in connection.execute(sql, params)]
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import AsyncExitStack, nullcontext
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+JobKey = Union[str, Iterable[str]]
+
+
+def _job_keys(job_key: JobKey) -> Tuple[str, ...]:
+    """The distinct keys of a job, whose key function returns one key or several."""
+    if isinstance(job_key, str):
+        return (job_key,)
+    return tuple(sorted(set(job_key)))
+
+
+def run_with_limits(
+    jobs: Iterable[T],
+    worker: Callable[[T], R],
+    key: Callable[[T], JobKey],
+    max_concurrency: int,
+    key_limits: Optional[Dict[str, int]] = None,
+    default_key_limit: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[Tuple[T, Future]]:
+    """
+    Runs `worker(job)` for every job concurrently, respecting a global and a per-key limit.
+
+    Jobs are dispatched in the given order, skipping over jobs whose key is already
+    at its limit, so a saturated key never blocks jobs of other keys.
+
+    Args:
+        jobs: The jobs to run.
+        worker: Callable executed for each job.
+        key: Callable returning the group (e.g. provider) a job belongs to, or all its groups.
+            A job counts against the limit of every one of its groups, and only starts
+            when all of them have capacity.
+        max_concurrency: Maximum number of jobs running at the same time.
+        key_limits: Maximum number of running jobs for specific keys.
+        default_key_limit: Limit for keys missing from `key_limits` (None means no limit).
+        executor: Executor to run the jobs on, e.g. a ProcessPoolExecutor. It is not
+            shut down afterwards. Defaults to a new ThreadPoolExecutor.
+
+    Yields:
+        Tuples of (job, finished future) in order of completion.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    key_limits = key_limits or {}
+
+    pending = list(jobs)
+    running: Dict[Future, Tuple[T, Tuple[str, ...]]] = {}
+    in_flight: Counter = Counter()
+
+    def has_capacity(job_keys: Tuple[str, ...]) -> bool:
+        for job_key in job_keys:
+            limit = key_limits.get(job_key, default_key_limit)
+            if limit is not None and in_flight[job_key] >= limit:
+                return False
+        return True
+
+    if executor is None:
+        pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    else:
+        pool = nullcontext(executor)
+
+    with pool as executor:
+        while pending or running:
+            not_dispatched = []
+            for job in pending:
+                job_keys = _job_keys(key(job))
+                if len(running) < max_concurrency and has_capacity(job_keys):
+                    in_flight.update(job_keys)
+                    running[executor.submit(worker, job)] = (job, job_keys)
+                else:
+                    not_dispatched.append(job)
+            pending = not_dispatched
+
+            if not running:
+                # every remaining key has a limit of 0
+                raise ValueError(f"{len(pending)} jobs can never be scheduled")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, job_keys = running.pop(future)
+                in_flight.subtract(job_keys)
+                yield job, future
+
+
+async def a_run_with_limits(
+    jobs: Iterable[T],
+    worker: Callable[[T], Awaitable[R]],
+    key: Callable[[T], JobKey],
+    max_concurrency: int,
+    key_limits: Optional[Dict[str, int]] = None,
+    default_key_limit: Optional[int] = None,
+) -> AsyncIterator[Tuple[T, asyncio.Task]]:
+    """
+    Async version of `run_with_limits`, running `await worker(job)` as tasks on the current event loop.
+
+    Yields:
+        Tuples of (job, finished task) in order of completion.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    key_limits = key_limits or {}
+    jobs = [(job, _job_keys(key(job))) for job in jobs]
+
+    global_semaphore = asyncio.Semaphore(max_concurrency)
+    key_semaphores: Dict[str, asyncio.Semaphore] = {}
+    for job_key in {job_key for _, job_keys in jobs for job_key in job_keys}:
+        limit = key_limits.get(job_key, default_key_limit)
+        if limit is not None and limit < 1:
+            raise ValueError(f"Jobs with key {job_key} can never be scheduled")
+        key_semaphores[job_key] = asyncio.Semaphore(
+            limit if limit is not None else max_concurrency
+        )
+
+    async def run(job: T, job_keys: Tuple[str, ...]) -> Tuple[T, asyncio.Task]:
+        # wait for the keys first, so that a saturated key does not hold global slots.
+        # The keys are sorted, so that jobs sharing keys never wait for each other in a cycle
+        async with AsyncExitStack() as stack:
+            for job_key in job_keys:
+                await stack.enter_async_context(key_semaphores[job_key])
+            async with global_semaphore:
+                task = asyncio.ensure_future(worker(job))
+                await asyncio.wait([task])
+                return job, task
+
+    runners = [asyncio.ensure_future(run(job, job_keys)) for job, job_keys in jobs]
+    try:
+        for runner in asyncio.as_completed(runners):
+            yield await runner
+    finally:
+        for runner in runners:
+            runner.cancel()
@@ -0,0 +1,20 @@
+import sqlite3
+import time
+
+
+def enable_wal(connection: sqlite3.Connection, timeout: float = 30.0) -> None:
+    """
+    Switches the database of a connection to WAL mode, which allows concurrent readers while writing.
+
+    The switch takes an exclusive lock without waiting for the busy timeout, so processes
+    opening a new database at the same time retry until the first of them has switched it.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+from io import BytesIO
+
+import pytest
+from loguru import logger
+
+# the OpenAI client of audio.tts reads its key on import
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from src.audio import prewarm
+
+
+def write_experiment(folder, experiment_id, messages):
+    with open(os.path.join(folder, f"experiment_{experiment_id}.json"), "w") as f:
+        json.dump({"id": experiment_id, "messages": [{"speaker": speaker, "text": text} for speaker, text in messages]}, f)
+
+
+@pytest.fixture
+def results_folder(tmp_path):
+    folder = tmp_path / "results"
+    folder.mkdir()
+    write_experiment(
+        folder,
+        "a",
+        [
+            ("Orchestrator", "Next speaker: Professor"),
+            ("Professor", "Please continue."),
+            ("Participant", "Wrong. 75 volts."),
+            ("SHOCKING_DEVICE", "75 volts administered"),
+            ("Learner", "Ouch!"),
+            ("Learner", ""),
+        ],
+    )
+    write_experiment(
+        folder,
+        "b",
+        [
+            ("Professor", "Please continue."),
+            ("Participant", "Wrong. 75 volts."),
+            ("Learner", "Let me out!"),
+        ],
+    )
+    return str(folder)
+
+
+class FakeTTS:
+    """Stands in for the TTS cache and the speech API, the audio of a line is its text repeated."""
+
+    def __init__(self, failing=()):
+        self.cached = set()
+        self.generated = []
+        self.failing = set(failing)
+
+    def is_cached(self, text, role):
+        return (role, text) in self.cached
+
+    async def generate(self, text, role):
+        self.generated.append((role, text))
+        if text in self.failing:
+            raise RuntimeError("speech API error")
+        self.cached.add((role, text))
+        return BytesIO(text.encode() * 10)
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    fake = FakeTTS()
+    monkeypatch.setattr(prewarm, "is_tts_cached", fake.is_cached)
+    monkeypatch.setattr(prewarm, "generate_tts", fake.generate)
+    return fake
+
+
+@pytest.fixture
+def log_messages():
+    messages = []
+    handler = logger.add(lambda message: messages.append(message.record["message"]), level="INFO")
+    yield messages
+    logger.remove(handler)
+
+
+def run_prewarm(folder, **kwargs):
+    return asyncio.run(prewarm.prewarm_tts_cache(folder, max_concurrency=2, requests_per_minute=60000, **kwargs))
+
+
+class TestCollectTTSLines:
+    """Test the collect_tts_lines function."""
+
+    def test_voiced_distinct_lines(self, results_folder):
+        """Test that the Orchestrator, shock device and empty lines are skipped, and repeated lines kept once."""
+        lines = prewarm.collect_tts_lines(results_folder)
+        assert sorted((role.value, text) for role, text in lines) == [
+            ("Learner", "Let me out!"),
+            ("Learner", "Ouch!"),
+            ("Participant", "Wrong. 75 volts."),
+            ("Professor", "Please continue."),
+        ]
+        assert all(isinstance(role, prewarm.Roles) for role, _ in lines)
+
+    def test_missing_folder(self, tmp_path):
+        """Test that a missing results folder has no lines."""
+        assert prewarm.collect_tts_lines(str(tmp_path / "missing")) == []
+
+
+class TestPrewarmTTSCache:
+    """Test the prewarm_tts_cache function."""
+
+    def test_generates_every_line_once(self, results_folder, fake_tts, log_messages):
+        """Test that every distinct line is generated once, and the progress and byte counts are reported."""
+        generated_bytes = run_prewarm(results_folder)
+
+        assert sorted(text for _, text in fake_tts.generated) == [
+            "Let me out!",
+            "Ouch!",
+            "Please continue.",
+            "Wrong. 75 volts.",
+        ]
+        expected_bytes = 10 * len("Let me out!Ouch!Please continue.Wrong. 75 volts.")
+        assert generated_bytes == expected_bytes
+
+        assert "4 distinct lines, 0 already cached, 4 to generate (48 characters)" in log_messages
+        progress = [message for message in log_messages if message.startswith("[")]
+        assert [message.split("]")[0] for message in progress] == ["[1/4", "[2/4", "[3/4", "[4/4"]
+        assert progress[-1].startswith(f"[4/4] {expected_bytes / 1024 / 1024:.1f} MiB generated, 0 failed")
+        assert f"Generated 4 lines ({expected_bytes} bytes), 0 failed and will be retried by the next run" in log_messages
+
+    def test_second_run_skips_cached_lines(self, results_folder, fake_tts, log_messages):
+        """Test that a second run generates nothing, and a new line only is generated after it was added."""
+        run_prewarm(results_folder)
+        fake_tts.generated.clear()
+
+        assert run_prewarm(results_folder) == 0
+        assert fake_tts.generated == []
+        assert "4 distinct lines, 4 already cached, 0 to generate (0 characters)" in log_messages
+
+        write_experiment(results_folder, "c", [("Professor", "The experiment requires that you continue.")])
+        assert run_prewarm(results_folder) == 10 * len("The experiment requires that you continue.")
+        assert [text for _, text in fake_tts.generated] == ["The experiment requires that you continue."]
+
+    def test_failures_are_retried_by_the_next_run(self, results_folder, fake_tts, log_messages):
+        """Test that failed lines are counted, not cached, and generated by the next run."""
+        fake_tts.failing = {"Ouch!"}
+        generated_bytes = run_prewarm(results_folder)
+        assert generated_bytes == 10 * len("Let me out!Please continue.Wrong. 75 volts.")
+        assert f"Generated 3 lines ({generated_bytes} bytes), 1 failed and will be retried by the next run" in log_messages
+
+        fake_tts.failing = set()
+        fake_tts.generated.clear()
+        assert run_prewarm(results_folder) == 10 * len("Ouch!")
+        assert [text for _, text in fake_tts.generated] == ["Ouch!"]
+
+    def test_dry_run(self, results_folder, fake_tts, log_messages):
+        """Test that a dry run only counts the lines to generate."""
+        assert run_prewarm(results_folder, dry_run=True) == 0
+        assert fake_tts.generated == []
+        assert "4 distinct lines, 0 already cached, 4 to generate (48 characters)" in log_messages
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+# the OpenAI client of the module reads its key on import
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from src.audio import tts
+from src.audio.tts_cache import AudioCache
+from src.utils.byte_cache import ByteLRUCache
+
+
+class FakeSpeechResponse:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_bytes(self):
+        yield from self.chunks
+
+
+def speech_client(create):
+    return SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(with_streaming_response=SimpleNamespace(create=create))))
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    """Empty TTS caches in a temporary folder."""
+    monkeypatch.setattr(tts, "CACHE_DIR", str(tmp_path / "tts_cache"))
+    monkeypatch.setattr(tts, "audio_cache", AudioCache(str(tmp_path / "tts_cache"), 10 * 1024 * 1024))
+    monkeypatch.setattr(tts, "memory_cache", ByteLRUCache(10 * 1024 * 1024))
+    monkeypatch.setattr(tts, "cache_counters", Counter())
+
+
+class TestGenerateTTS:
+    """Test the generate_tts function."""
+
+    def test_repeated_line_is_served_from_memory(self, caches, monkeypatch):
+        """Test that a line generated once is then served from memory, without a thread hop or an API call."""
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            return FakeSpeechResponse([b"ID3", b" audio of the line"])
+
+        monkeypatch.setattr(tts, "client", speech_client(create))
+        audio = asyncio.run(tts.generate_tts("Please continue.", tts.Roles.PROFESSOR)).getvalue()
+        assert audio == b"ID3 audio of the line"
+        assert len(calls) == 1
+
+        def fail(*args, **kwargs):
+            raise AssertionError("not served from memory")
+
+        monkeypatch.setattr(tts, "client", speech_client(fail))
+        monkeypatch.setattr(tts, "run_io", fail)
+        monkeypatch.setattr(tts, "_generate_audio", fail)
+        assert asyncio.run(tts.generate_tts("Please continue.", tts.Roles.PROFESSOR)).getvalue() == audio
+
+        stats = tts.tts_cache_stats()
+        assert stats["memory"]["hits"] == 1
+        assert stats["generations"] == 1
+        assert stats["disk_hits"] == 0
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+
+from src.audio.tts_cache import AudioCache, audio_cache_key, audio_digest
+
+
+def make_cache(tmp_path, max_bytes=1000):
+    return AudioCache(str(tmp_path / "tts_cache"), max_bytes)
+
+
+def put(cache, key, size=100):
+    cache.put(key, b"x" * size, "Professor", "alloy", "gpt-4o-mini-tts", "Speak calmly.")
+
+
+class TestAudioCacheKey:
+    """Test the audio_cache_key function."""
+
+    def test_key_is_stable(self):
+        """Test that the same inputs always give the same key."""
+        assert audio_cache_key("Hello", "alloy", "gpt-4o-mini-tts", "Calm.") == audio_cache_key(
+            "Hello", "alloy", "gpt-4o-mini-tts", "Calm."
+        )
+
+    def test_key_depends_on_every_input(self):
+        """Test that changing the text, voice, model or instructions changes the key."""
+        base = ("Hello", "alloy", "gpt-4o-mini-tts", "Calm.")
+        keys = {audio_cache_key(*base)}
+        for i, changed in enumerate(["Hi", "verse", "tts-1", "Loud."]):
+            inputs = list(base)
+            inputs[i] = changed
+            keys.add(audio_cache_key(*inputs))
+        assert len(keys) == 5
+
+
+class TestAudioCache:
+    """Test the AudioCache class."""
+
+    def test_put_and_read(self, tmp_path):
+        """Test that a stored clip is read back from its content-addressed path."""
+        cache = make_cache(tmp_path)
+        cache.put("abcdef", b"audio", "Professor", "alloy", "gpt-4o-mini-tts", "Calm.")
+        assert "abcdef" in cache
+        assert cache.read("abcdef") == b"audio"
+        assert cache.get_path("abcdef") == os.path.join(str(tmp_path / "tts_cache"), "ab", "abcdef.mp3")
+        assert cache.stats() == {"entries": 1, "bytes": 5, "max_bytes": 1000}
+
+    def test_miss(self, tmp_path):
+        """Test that an unknown key is a miss."""
+        cache = make_cache(tmp_path)
+        assert "abcdef" not in cache
+        assert cache.read("abcdef") is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test that the least recently used clips are deleted beyond the budget."""
+        cache = make_cache(tmp_path, max_bytes=300)
+        for key in ["aa1", "bb2", "cc3"]:
+            put(cache, key)
+        cache.get_path("aa1")  # aa1 is now more recent than bb2
+        put(cache, "dd4")
+
+        assert "bb2" not in cache
+        assert not os.path.exists(cache.path("bb2"))
+        assert all(key in cache for key in ["aa1", "cc3", "dd4"])
+        assert cache.stats()["bytes"] == 300
+
+    def test_keeps_clip_larger_than_budget(self, tmp_path):
+        """Test that the clip just stored is never evicted, even beyond the budget."""
+        cache = make_cache(tmp_path, max_bytes=50)
+        put(cache, "aa1")
+        assert cache.read("aa1") == b"x" * 100
+
+    def test_missing_file_is_dropped(self, tmp_path):
+        """Test that a clip deleted behind the cache's back is a miss and leaves the manifest."""
+        cache = make_cache(tmp_path)
+        put(cache, "aa1")
+        os.remove(cache.path("aa1"))
+        assert cache.read("aa1") is None
+        assert "aa1" not in cache
+
+    def test_adopt(self, tmp_path):
+        """Test that an existing file is moved into the cache."""
+        cache = make_cache(tmp_path)
+        legacy_path = tmp_path / "legacy.mp3"
+        legacy_path.write_bytes(b"old audio")
+
+        path = cache.adopt("aa1", str(legacy_path), "Professor", "alloy", "gpt-4o-mini-tts", "Calm.")
+        assert path == cache.path("aa1")
+        assert not legacy_path.exists()
+        assert cache.read("aa1") == b"old audio"
+
+    def test_manifest_persists(self, tmp_path):
+        """Test that a new cache over the same directory sees the stored clips."""
+        put(make_cache(tmp_path), "aa1")
+        assert "aa1" in make_cache(tmp_path)
+
+    def test_lookup_by_digest(self, tmp_path):
+        """Test that a clip is found by the digest of its bytes, and no longer once stored again with other bytes."""
+        cache = make_cache(tmp_path)
+        cache.put("aa1", b"first take", "Professor", "alloy", "gpt-4o-mini-tts", "Calm.")
+        first = audio_digest(b"first take")
+        assert cache.key_for_digest(first) == "aa1"
+
+        cache.put("aa1", b"second take", "Professor", "alloy", "gpt-4o-mini-tts", "Calm.")
+        assert cache.key_for_digest(first) is None
+        assert cache.key_for_digest(audio_digest(b"second take")) == "aa1"
+
+    def test_manifest_without_digests(self, tmp_path):
+        """Test that a manifest created before the digests gets them as its clips are read."""
+        cache = make_cache(tmp_path)
+        os.makedirs(os.path.dirname(cache.path("aa1")))
+        with open(cache.path("aa1"), "wb") as f:
+            f.write(b"old audio")
+        with sqlite3.connect(cache.manifest_path) as connection:
+            connection.execute(
+                """
+                CREATE TABLE clips (
+                    key TEXT PRIMARY KEY, role TEXT, voice TEXT NOT NULL, model TEXT NOT NULL,
+                    instructions_hash TEXT NOT NULL, bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL, last_access REAL NOT NULL
+                )
+                """
+            )
+            connection.execute("INSERT INTO clips VALUES ('aa1', 'Professor', 'alloy', 'tts-1', 'h', 9, 0, 0)")
+        connection.close()
+
+        assert cache.key_for_digest(audio_digest(b"old audio")) is None
+        assert cache.read("aa1") == b"old audio"
+        assert cache.key_for_digest(audio_digest(b"old audio")) == "aa1"
+        put(cache, "bb2")
+        assert "bb2" in cache
@@ -0,0 +1,96 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from src.chat.embedding_cache import EmbeddingCache
+
+
+def vectors(*values):
+    return np.array([[value, 1.0 - value, 0.5] for value in values], dtype=np.float32)
+
+
+def fill_cache(cache_dir, start):
+    cache = EmbeddingCache(cache_dir, "model")
+    for i in range(start, start + 20):
+        cache.put_many([f"text {i}"], vectors(i / 100))
+
+
+class TestEmbeddingCache:
+    """Test the EmbeddingCache class."""
+
+    def test_put_and_get(self, tmp_path):
+        """Test that stored vectors are returned for their texts, None for the others."""
+        cache = EmbeddingCache(str(tmp_path), "model")
+        cache.put_many(["a", "b"], vectors(0.1, 0.2))
+        a, missing, b = cache.get_many(["a", "c", "b"])
+        assert np.array_equal(a, vectors(0.1)[0])
+        assert np.array_equal(b, vectors(0.2)[0])
+        assert missing is None
+        assert cache.get("c") is None
+
+    def test_survives_restarts(self, tmp_path):
+        """Test that a new cache over the same folder reads the vectors from disk."""
+        EmbeddingCache(str(tmp_path), "model").put_many(["a", "b"], vectors(0.1, 0.2))
+        EmbeddingCache(str(tmp_path), "model").put_many(["c"], vectors(0.3))
+
+        cache = EmbeddingCache(str(tmp_path), "model")
+        found = cache.get_many(["a", "b", "c"])
+        assert np.array_equal(np.stack(found), vectors(0.1, 0.2, 0.3))
+        assert cache.stats()["disk_hits"] == 3
+        assert cache.stats()["entries"] == 3
+
+        # then served from memory
+        cache.get_many(["a"])
+        assert cache.stats()["disk_hits"] == 3
+        assert cache.stats()["memory"]["hits"] == 1
+
+    def test_existing_texts_are_not_appended_again(self, tmp_path):
+        """Test that storing a known text does not grow the vectors file."""
+        cache = EmbeddingCache(str(tmp_path), "model")
+        cache.put_many(["a"], vectors(0.1))
+        cache.put_many(["a", "b"], vectors(0.1, 0.2))
+        assert cache.stats()["entries"] == 2
+        assert (tmp_path / cache.folder / "vectors.f32").stat().st_size == 2 * 3 * 4
+
+    def test_partial_trailing_row(self, tmp_path):
+        """Test that a partial row at the end of the vectors file (an append in progress) does not break reads."""
+        EmbeddingCache(str(tmp_path), "model").put_many(["a", "b"], vectors(0.1, 0.2))
+        cache = EmbeddingCache(str(tmp_path), "model")
+        with open(cache.vectors_path, "ab") as f:
+            f.write(b"\x00" * 7)
+
+        a, b = cache.get_many(["a", "b"])
+        assert np.array_equal(a, vectors(0.1)[0])
+        assert np.array_equal(b, vectors(0.2)[0])
+
+        # the next write drops the torn row, and the new row is mapped
+        cache.put_many(["c"], vectors(0.3))
+        assert np.array_equal(EmbeddingCache(str(tmp_path), "model").get("c"), vectors(0.3)[0])
+        assert (tmp_path / cache.folder / "vectors.f32").stat().st_size == 3 * 3 * 4
+
+    def test_namespaces_are_separate(self, tmp_path):
+        """Test that the vectors of a namespace (e.g. another model) are not returned in another one."""
+        EmbeddingCache(str(tmp_path), "model").put_many(["a"], vectors(0.1))
+        assert EmbeddingCache(str(tmp_path), "other model").get("a") is None
+
+    def test_width_mismatch(self, tmp_path):
+        """Test that vectors of another width are rejected."""
+        cache = EmbeddingCache(str(tmp_path), "model")
+        cache.put_many(["a"], vectors(0.1))
+        with pytest.raises(ValueError):
+            cache.put_many(["b"], np.zeros((1, 5), dtype=np.float32))
+
+    def test_concurrent_processes(self, tmp_path):
+        """Test that processes appending at the same time get distinct rows."""
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=fill_cache, args=(str(tmp_path), start)) for start in (0, 20, 40)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert all(process.exitcode == 0 for process in processes)
+
+        cache = EmbeddingCache(str(tmp_path), "model")
+        found = cache.get_many([f"text {i}" for i in range(60)])
+        assert np.array_equal(np.stack(found), vectors(*(i / 100 for i in range(60))))
@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from src.chat.embedding_cache import EmbeddingCache
+from src.chat.embeddings import (
+    EMBEDDING_BACKENDS,
+    EmbeddingBatcher,
+    EmbeddingProvider,
+    EmbeddingsDisabled,
+    cosine_similarities,
+)
+
+
+class CountingProvider(EmbeddingProvider):
+    """Provider loading a mock model, counting the loads."""
+
+    def __init__(self, *args, prompts=None, **kwargs):
+        super().__init__("test-model", *args, **kwargs)
+        self.loads = 0
+        self.prompts = prompts
+
+    def _load(self):
+        self.loads += 1
+        model = Mock(prompts=self.prompts or {})
+        model.encode.side_effect = lambda text, prompt_name=None, **kwargs: np.array(
+            [len(text), 1.0 if prompt_name else 0.0]
+        )
+        return model
+
+
+class TestEmbeddingProvider:
+    """Test the EmbeddingProvider class."""
+
+    def test_lazy_loading(self):
+        """Test that the model is only loaded on first use, and only once."""
+        provider = CountingProvider()
+        assert not provider.loaded
+        assert provider.loads == 0
+
+        provider.encode("hello")
+        provider.encode("world")
+        assert provider.loaded
+        assert provider.loads == 1
+
+    def test_concurrent_first_use_loads_once(self):
+        """Test that threads using the provider at the same time share one load."""
+        provider = CountingProvider()
+        threads = [threading.Thread(target=provider.get_model) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert provider.loads == 1
+
+    def test_disabled(self):
+        """Test that a disabled provider raises instead of loading the model."""
+        provider = CountingProvider(disabled=True)
+        with pytest.raises(EmbeddingsDisabled):
+            provider.encode("hello")
+        assert provider.loads == 0
+
+    def test_backend(self, monkeypatch):
+        """Test that the model is loaded by the loader of the backend."""
+        loaded = []
+        monkeypatch.setitem(EMBEDDING_BACKENDS, "onnx-int8", lambda provider: loaded.append(provider) or Mock(prompts={}))
+        provider = EmbeddingProvider("test-model", backend="onnx-int8", threads=2)
+        provider.get_model()
+        assert loaded == [provider]
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend is rejected before anything is loaded."""
+        with pytest.raises(ValueError):
+            EmbeddingProvider("test-model", backend="tensorrt")
+
+    def test_prompt_name_of_model(self):
+        """Test that the prompt is used when the model defines it."""
+        provider = CountingProvider(prompts={"query": "Instruct: "})
+        assert provider.encode("hello", prompt_name="query").tolist() == [5.0, 1.0]
+
+    def test_unknown_prompt_name_is_ignored(self):
+        """Test that models without the prompt (e.g. smaller models) embed the plain text."""
+        provider = CountingProvider()
+        assert provider.encode("hello", prompt_name="query").tolist() == [5.0, 0.0]
+
+
+class RecordingProvider:
+    """Provider embedding texts as normalized [len, 1] vectors, recording the batches."""
+
+    def __init__(self, delay: float = 0.0, error: Exception | None = None):
+        self.delay = delay
+        self.error = error
+        self.batches = []
+
+    def encode(self, texts, prompt_name=None, normalize=False):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        embeddings = np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+class TestEmbeddingBatcher:
+    """Test the EmbeddingBatcher class."""
+
+    def test_concurrent_texts_share_batches(self):
+        """Test that texts submitted together are encoded in fewer batches, each getting its own embedding."""
+        provider = RecordingProvider(delay=0.02)
+        batcher = EmbeddingBatcher(provider, max_batch_size=16, max_wait=0.05)
+        texts = ["a" * i for i in range(1, 17)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            embeddings = list(executor.map(batcher.encode, texts))
+
+        assert len(provider.batches) < len(texts)
+        assert sorted(text for batch in provider.batches for text in batch) == sorted(texts)
+        for text, embedding in zip(texts, embeddings):
+            expected = np.array([len(text), 1.0]) / np.hypot(len(text), 1.0)
+            assert np.allclose(embedding, expected)
+
+    def test_max_batch_size(self):
+        """Test that batches never exceed max_batch_size."""
+        provider = RecordingProvider()
+        batcher = EmbeddingBatcher(provider, max_batch_size=3, max_wait=0.05)
+        futures = [batcher.submit(str(i)) for i in range(10)]
+        for future in futures:
+            future.result()
+        assert max(len(batch) for batch in provider.batches) <= 3
+
+    def test_errors_reach_every_caller(self):
+        """Test that a failing batch fails the futures of all its texts, and the batcher keeps running."""
+        provider = RecordingProvider(error=RuntimeError("boom"))
+        batcher = EmbeddingBatcher(provider, max_wait=0.01)
+        futures = [batcher.submit(text) for text in ["a", "b"]]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+
+        provider.error = None
+        assert batcher.encode("abc").shape == (2,)
+
+    def test_encode_many(self):
+        """Test that several texts are encoded together, as the rows of a matrix in their order."""
+        provider = RecordingProvider()
+        batcher = EmbeddingBatcher(provider, max_wait=0.05)
+        embeddings = batcher.encode_many(["a", "bbb"])
+        assert embeddings.shape == (2, 2)
+        assert provider.batches == [["a", "bbb"]]
+        assert embeddings[0] @ embeddings[1] < 1.0
+
+    def test_cached_texts_skip_the_model(self, tmp_path):
+        """Test that only the texts missing from the cache are encoded, even after a restart."""
+        provider = RecordingProvider()
+        batcher = EmbeddingBatcher(provider, max_wait=0.05, cache=EmbeddingCache(str(tmp_path), "test"))
+        first = batcher.encode_many(["a", "bb", "a"])
+        assert provider.batches == [["a", "bb"]]
+
+        restarted = EmbeddingBatcher(provider, max_wait=0.05, cache=EmbeddingCache(str(tmp_path), "test"))
+        second = restarted.encode_many(["bb", "ccc"])
+        assert provider.batches == [["a", "bb"], ["ccc"]]
+        assert np.allclose(second[0], first[1])
+
+        restarted.encode("ccc")
+        assert len(provider.batches) == 2
+
+    def test_invalid_batch_size(self):
+        """Test that max_batch_size must be positive."""
+        with pytest.raises(ValueError):
+            EmbeddingBatcher(RecordingProvider(), max_batch_size=0)
+
+
+class TestCosineSimilarities:
+    """Test the cosine_similarities function."""
+
+    def test_shapes(self):
+        """Test the similarities of one or many embeddings against one or many references."""
+        embeddings = np.array([[1.0, 0.0], [0.0, 1.0]])
+        references = np.array([[1.0, 0.0], [np.sqrt(0.5), np.sqrt(0.5)]])
+        assert cosine_similarities(embeddings[0], references[0]).shape == ()
+        assert np.allclose(cosine_similarities(embeddings[0], references), [1.0, np.sqrt(0.5)])
+        assert np.allclose(cosine_similarities(embeddings, references), [[1.0, np.sqrt(0.5)], [0.0, np.sqrt(0.5)]])
@@ -0,0 +1,46 @@
+import asyncio
+
+from autogen import ConversableAgent
+
+import src.chat.professor_agent as professor_agent
+from src.chat.professor_agent import ProfessorAgent
+
+
+class FakeClient:
+    """Stands in for AutoGen's OpenAIWrapper, answering with a scripted reply."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return self.reply
+
+    def extract_text_or_completion_object(self, response):
+        return [response]
+
+
+class TestProfessorAgent:
+    """Test the ProfessorAgent class."""
+
+    def test_async_reply_checks_shocks(self, monkeypatch):
+        """Test that the async reply path of a_initiate_chat goes through the professor's checks."""
+        checked = []
+
+        def find_last_administered_shock(messages):
+            checked.append(list(messages))
+            return 0
+
+        monkeypatch.setattr(professor_agent, "find_last_administered_shock", find_last_administered_shock)
+        professor = ProfessorAgent(name="Professor", llm_config=False)
+        professor.client = FakeClient("Please continue.")
+        monkeypatch.setattr(professor, "check_message_if_valid", lambda message: True)
+        participant = ConversableAgent(name="Participant", llm_config=False)
+        professor.receive({"content": "Wrong. 75 volts.", "role": "user"}, participant, request_reply=False, silent=True)
+
+        reply = asyncio.run(professor.a_generate_reply(sender=participant))
+        assert reply == "Please continue."
+        assert professor.client.calls == 1
+        assert len(checked) == 1
+        assert checked[0][0]["content"] == "Wrong. 75 volts."
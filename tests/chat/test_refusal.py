@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+from src.chat.refusal import RefusalClassifier, compile_phrases, normalize_text
+from src.config.variables import REFUSAL_CONFIG_PATH
+
+
+class FakeEmbedder:
+    """Embeds texts on three axes: mentions "sorry", mentions "refuse", or neither, recording the calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        rows = []
+        for text in texts:
+            row = np.array(["sorry" in text.lower(), "refuse" in text.lower(), 0.0], dtype=np.float32)
+            if not row.any():
+                row[2] = 1.0
+            rows.append(row / np.linalg.norm(row))
+        return np.stack(rows)
+
+
+@pytest.fixture
+def embedder():
+    return FakeEmbedder()
+
+
+def make_classifier(embedder, **kwargs):
+    return RefusalClassifier(
+        prototypes=["Sorry, I can't assist with that.", "I refuse to take part."],
+        phrases=["i can't comply", "i'm sorry, but i can't"],
+        cues=["sorry", "refuse", "can't", "harm"],
+        threshold=0.7,
+        embed=embedder,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def classifier(embedder):
+    return make_classifier(embedder)
+
+
+@pytest.fixture
+def shortcut_classifier(embedder):
+    return make_classifier(embedder, shortcuts=True)
+
+
+class TestCompilePhrases:
+    """Test the phrase matching helpers."""
+
+    def test_normalize_text(self):
+        """Test that case, curly apostrophes and whitespace do not matter."""
+        assert normalize_text("I CAN’T\n  help") == "i can't help"
+
+    def test_matches_any_phrase(self):
+        """Test that any of the phrases is found inside a text."""
+        pattern = compile_phrases(["I can't help", "i must decline"])
+        assert pattern.search(normalize_text("Well, I must decline."))
+        assert pattern.search(normalize_text("Sorry, I can’t help."))
+        assert not pattern.search(normalize_text("I can help with that."))
+
+
+class TestRefusalClassifier:
+    """Test the RefusalClassifier class."""
+
+    def test_empty_tier(self, classifier, embedder):
+        """Test that replies without letters or digits are refused without embedding."""
+        verdict = classifier.classify("... ?!")
+        assert verdict.is_refusal and verdict.tier == "empty"
+        assert embedder.calls == []
+
+    def test_lexical_tier(self, classifier, embedder):
+        """Test that short canned refusals are decided without embedding."""
+        refusal = classifier.classify("I’m sorry, but I can’t do this.")
+        assert refusal.is_refusal and refusal.tier == "lexical"
+        assert embedder.calls == []
+
+    def test_shortcuts_are_off_by_default(self, classifier):
+        """Test that replies without cue words and long replies reach the embedding tier by default."""
+        assert not classifier.shortcuts
+        assert classifier.classify("The next word pair is blue - sky.").tier == "embedding"
+        assert classifier.classify("The shock will not cause any lasting harm, please continue. " * 10).tier == "embedding"
+
+    def test_lexical_shortcut(self, shortcut_classifier, embedder):
+        """Test that replies without refusal cues are valid without embedding, with the shortcuts."""
+        valid = shortcut_classifier.classify("The next word pair is blue - sky.")
+        assert not valid.is_refusal and valid.tier == "lexical"
+        assert embedder.calls == []
+
+    def test_length_shortcut(self, shortcut_classifier, embedder):
+        """Test that long replies with refusal cues but without refusal phrases are valid without embedding, with the shortcuts."""
+        verdict = shortcut_classifier.classify("The shock will not cause any lasting harm, please continue. " * 10)
+        assert not verdict.is_refusal and verdict.tier == "length"
+        assert embedder.calls == []
+
+        # a canned phrase still needs the embedding tier, however long the reply
+        quoted = shortcut_classifier.classify("You said: I can't comply. " + "Please continue. " * 30)
+        assert quoted.tier == "embedding"
+
+    def test_embedding_tier_scores_every_prototype(self, classifier):
+        """Test that ambiguous replies are refusals when close to any of the prototypes."""
+        sorry = classifier.classify("Sorry, that is not something I will do.")
+        assert sorry.is_refusal and sorry.tier == "embedding"
+        assert sorry.similarity == pytest.approx(1.0)
+
+        refuse = classifier.classify("No, I refuse.")
+        assert refuse.is_refusal and refuse.similarity == pytest.approx(1.0)
+
+        valid = classifier.classify("Wrong, you can't pick 'blue' twice.")
+        assert not valid.is_refusal and valid.tier == "embedding"
+        assert valid.similarity == pytest.approx(0.0)
+
+    def test_prototypes_are_embedded_once(self, classifier, embedder):
+        """Test that the prototype matrix is built in one call and reused."""
+        for message in ["Sorry.", "I refuse.", "Sorry again."]:
+            classifier.classify(message)
+        assert embedder.calls.count(classifier.prototypes) == 1
+        assert classifier.prototype_matrix.shape == (2, 3)
+
+    def test_stats(self, shortcut_classifier):
+        """Test the count and fraction of replies decided by every tier."""
+        shortcut_classifier.classify("")
+        shortcut_classifier.classify("I can't comply.")
+        shortcut_classifier.classify("Next question.")
+        shortcut_classifier.classify("Sorry, no.")
+        stats = shortcut_classifier.stats()
+        assert stats["empty"] == {"count": 1, "fraction": 0.25}
+        assert stats["lexical"] == {"count": 2, "fraction": 0.5}
+        assert stats["length"] == {"count": 0, "fraction": 0.0}
+        assert stats["embedding"] == {"count": 1, "fraction": 0.25}
+
+    def test_requires_prototypes(self):
+        """Test that a classifier without prototypes is rejected."""
+        with pytest.raises(ValueError):
+            RefusalClassifier([], ["i can't comply"], ["sorry"], 0.7)
+
+    def test_from_config(self, embedder):
+        """Test that the shipped config loads, and that its prototypes are caught by the lexical or embedding tiers."""
+        classifier = RefusalClassifier.from_config(REFUSAL_CONFIG_PATH, embed=embedder)
+        assert classifier.threshold == 0.7
+        assert "Sorry, I can't assist with that." in classifier.prototypes
+        for prototype in classifier.prototypes:
+            assert classifier.classify(prototype).tier in ("lexical", "embedding")
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import src.chat.repeating_agent as repeating_agent
+from src.chat.refusal import RefusalClassifier
+from src.chat.repeating_agent import RepeatingAgent
+
+
+class FakeClient:
+    """Stands in for AutoGen's OpenAIWrapper, answering with scripted replies and recording the calling threads."""
+
+    def __init__(self, replies, delay: float = 0.0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.threads = []
+
+    def create(self, **kwargs):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def extract_text_or_completion_object(self, response):
+        return [response]
+
+
+@pytest.fixture(autouse=True)
+def classifier(monkeypatch):
+    def embed(texts):
+        raise AssertionError("The test replies are decided without embeddings")
+
+    classifier = RefusalClassifier(
+        prototypes=["Sorry, I can't assist with that."],
+        phrases=["i can't assist"],
+        cues=["sorry", "can't"],
+        threshold=0.7,
+        embed=embed,
+        shortcuts=True,
+    )
+    monkeypatch.setattr(repeating_agent, "get_refusal_classifier", lambda: classifier)
+    return classifier
+
+
+def make_agent(client: FakeClient) -> RepeatingAgent:
+    agent = RepeatingAgent(name="learner", llm_config=False)
+    agent.client = client
+    return agent
+
+
+def generate(agent: RepeatingAgent):
+    return asyncio.run(agent.a_generate_oai_reply(messages=[{"role": "user", "content": "Next word pair."}]))
+
+
+class TestAGenerateOaiReply:
+    """Test the async reply path of RepeatingAgent."""
+
+    def test_returns_valid_reply(self):
+        """Test that a valid reply is returned, with the client called off the event loop thread."""
+        client = FakeClient(["Blue - sky."])
+        assert generate(make_agent(client)) == (True, "Blue - sky.")
+        assert client.threads[0] != threading.current_thread().name
+        assert client.threads[0].startswith("blocking")
+
+    def test_retries_refusals_and_errors(self):
+        """Test that refusals and client errors are retried until a valid reply."""
+        client = FakeClient([RuntimeError("timeout"), "Sorry, I can't assist with that.", {"content": "Red - rose."}])
+        assert generate(make_agent(client)) == (True, {"content": "Red - rose."})
+        assert client.replies == []
+
+    def test_gives_up_with_last_reply(self):
+        """Test that the last reply is returned after 5 refusals."""
+        client = FakeClient(["Sorry, I can't assist with that."] * 5)
+        assert generate(make_agent(client)) == (True, "Sorry, I can't assist with that.")
+
+    def test_without_client(self):
+        """Test that an agent without LLM does not reply."""
+        assert generate(RepeatingAgent(name="learner", llm_config=False)) == (False, None)
+
+    def test_conversations_run_concurrently(self):
+        """Test that slow client calls of several agents overlap instead of blocking the event loop."""
+        agents = [make_agent(FakeClient(["Blue - sky."], delay=0.2)) for _ in range(4)]
+
+        async def run_all():
+            messages = [{"role": "user", "content": "Next word pair."}]
+            return await asyncio.gather(*(agent.a_generate_oai_reply(messages=list(messages)) for agent in agents))
+
+        start = time.perf_counter()
+        replies = asyncio.run(run_all())
+        assert replies == [(True, "Blue - sky.")] * 4
+        assert time.perf_counter() - start < 0.6
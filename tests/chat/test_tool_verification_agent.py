@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+from google.genai.errors import ClientError as GoogleClientError
+
+from src.chat.tool_verification_agent import ToolVerificationAgent
+from tests.chat.test_repeating_agent import FakeClient
+
+
+def tool_call_reply(call_id: str) -> dict:
+    return {
+        "content": None,
+        "tool_calls": [{"id": call_id, "type": "function", "function": {"name": "shock", "arguments": "{}"}}],
+    }
+
+
+def rate_limit_error(delay: str) -> GoogleClientError:
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": delay}]
+    return GoogleClientError(429, {"error": {"code": 429, "message": "quota", "status": "RESOURCE_EXHAUSTED", "details": details}})
+
+
+def generate(client: FakeClient):
+    agent = ToolVerificationAgent(name="participant", llm_config=False)
+    agent.client = client
+    return asyncio.run(agent.a_generate_oai_reply(messages=[{"role": "user", "content": "Wrong, shock them."}]))
+
+
+class TestAGenerateOaiReply:
+    """Test the async reply path of ToolVerificationAgent."""
+
+    def test_retries_wrong_tool_call_ids(self):
+        """Test that a tool call with an overlong id is generated again, off the event loop thread."""
+        client = FakeClient([tool_call_reply("x" * 41), tool_call_reply("call_1")])
+        success, reply = generate(client)
+        assert success
+        assert reply["tool_calls"][0]["id"] == "call_1"
+        assert all(name != threading.current_thread().name for name in client.threads)
+
+    def test_waits_for_retry_delay(self, monkeypatch):
+        """Test that the retry delay of a Google rate limit is awaited before retrying."""
+        delays = []
+        sleep = asyncio.sleep
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+            await sleep(0)
+
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        client = FakeClient([rate_limit_error("1.5s"), "I press the button."])
+        assert generate(client) == (True, "I press the button.")
+        assert delays == [1.5]
+
+    def test_raises_after_5_attempts(self):
+        """Test that a ValueError is raised when no attempt gives a valid reply."""
+        with pytest.raises(ValueError):
+            generate(FakeClient([tool_call_reply("x" * 41)] * 5))
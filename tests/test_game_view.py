@@ -0,0 +1,213 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image, ImageFont
+
+import src.game_view as game_view
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    """Fixture creating placeholder game view assets and clearing the asset cache."""
+    Image.new("RGB", (1200, 1000), (10, 20, 30)).save(tmp_path / "background.jpg")
+    for filename, color in [
+        ("professor_w.png", (200, 0, 0, 255)),
+        ("student.png", (0, 200, 0, 255)),
+        ("learner.png", (0, 0, 200, 255)),
+        ("electricity.png", (250, 250, 0, 200)),
+        ("cloud.png", (255, 255, 255, 255)),
+    ]:
+        Image.new("RGBA", (200, 200), color).save(tmp_path / filename)
+    monkeypatch.setattr(game_view, "STATIC_DIR", str(tmp_path))
+    cached_functions = (game_view.load_sprite, game_view.load_font, game_view.get_static_layer, game_view.get_cloud_layout)
+    for cached in cached_functions:
+        cached.cache_clear()
+    yield tmp_path
+    for cached in cached_functions:
+        cached.cache_clear()
+
+
+class TestAssetCache:
+    """Test the game view asset cache."""
+
+    def test_sprites_are_loaded_once(self, static_dir):
+        """Test that a sprite is decoded and resized only once."""
+        sprite = game_view.load_sprite("learner.png", 0.5)
+        assert sprite.size == (100, 100)
+        assert game_view.load_sprite("learner.png", 0.5) is sprite
+        assert game_view.load_sprite("learner.png", 0.5, flip=True) is not sprite
+
+    def test_static_layer_is_not_modified(self, static_dir):
+        """Test that rendering a frame does not draw on the cached static layer."""
+        static_layer = game_view.get_static_layer()
+        before = static_layer.tobytes()
+        frame = Image.open(game_view.create_game_image(display_shock=True))
+        assert static_layer.tobytes() == before
+        assert frame.tobytes() != Image.open(game_view.create_game_image()).tobytes()
+        assert game_view.get_static_layer() is static_layer
+
+    def test_cloud_layout_is_cached(self, static_dir, monkeypatch):
+        """Test that the layout of a repeated message is computed once."""
+        monkeypatch.setattr(game_view, "load_font", lambda size=16: ImageFont.load_default(size=size))
+        cloud, layout = game_view.get_cloud_layout("Please continue. " * 10)
+        assert game_view.get_cloud_layout("Please continue. " * 10)[0] is cloud
+        assert game_view.get_cloud_layout("Please continue. " * 10, flip=True)[0] is not cloud
+        assert cloud.size == (layout.width, layout.height)
+        assert len(layout.lines) == len(layout.line_widths) > 1
+
+
+class TestEncodeFrame:
+    """Test the output encodings of the frames."""
+
+    @pytest.mark.parametrize(
+        "image_format, pil_format, mode",
+        [("png", "PNG", "RGBA"), ("png8", "PNG", "P"), ("webp", "WEBP", "RGB"), ("jpeg", "JPEG", "RGB")],
+    )
+    def test_formats(self, static_dir, image_format, pil_format, mode):
+        """Test that every format is encoded as expected."""
+        frame = game_view.encode_frame(game_view.compose_game_image(display_shock=True), image_format)
+        image = Image.open(io.BytesIO(frame))
+        assert image.format == pil_format
+        assert image.mode == mode
+        assert image.size == (1200, 1000)
+
+    def test_quality(self, static_dir):
+        """Test that the quality of the lossy formats is applied."""
+        image = game_view.compose_game_image(display_shock=True)
+        assert len(game_view.encode_frame(image, "jpeg", 10)) < len(game_view.encode_frame(image, "jpeg", 95))
+
+    def test_unknown_format(self, static_dir):
+        """Test that an unknown format is rejected."""
+        with pytest.raises(ValueError):
+            game_view.encode_frame(game_view.compose_game_image(), "gif")
+
+
+class TestConversationFrames:
+    """Test the mapping of conversation messages to frames."""
+
+    def test_speakers(self):
+        """Test that every speaker is mapped to its argument and the Orchestrator is skipped."""
+        messages = [
+            {"speaker": "Professor", "text": "Welcome"},
+            {"speaker": "Orchestrator", "text": "The Participant should now ask"},
+            {"speaker": "Participant", "text": "Question"},
+            {"speaker": "Learner", "text": "Answer"},
+            {"speaker": "SHOCKING_DEVICE", "text": "ELECTRIC_SHOCK_IMAGE"},
+        ]
+        assert game_view.conversation_frames(messages) == [
+            {"position": 0, "speaker": "Professor", "arguments": {"professor_message": "Welcome"}},
+            {"position": 2, "speaker": "Participant", "arguments": {"student_message": "Question"}},
+            {"position": 3, "speaker": "Learner", "arguments": {"learner_message": "Answer"}},
+            {"position": 4, "speaker": "SHOCKING_DEVICE", "arguments": {"display_shock": True}},
+        ]
+
+
+class TestFrameCache:
+    """Test the rendered frames cache."""
+
+    def test_key_depends_on_every_input(self):
+        """Test that different inputs give different keys."""
+        keys = {
+            game_view.frame_cache_key(),
+            game_view.frame_cache_key("a"),
+            game_view.frame_cache_key(None, "a"),
+            game_view.frame_cache_key(None, None, "a"),
+            game_view.frame_cache_key(display_shock=True),
+            game_view.frame_cache_key(image_format="webp", quality=80),
+            game_view.frame_cache_key(image_format="webp", quality=50),
+        }
+        assert len(keys) == 7
+        assert game_view.frame_cache_key("a") == game_view.frame_cache_key("a")
+
+    def test_memory_only(self):
+        """Test the cache without a disk tier."""
+        cache = game_view.FrameCache(max_bytes=100)
+        key = game_view.frame_cache_key("k")
+        assert cache.get(key) is None
+        cache.put(key, b"frame")
+        assert cache.get(key) == b"frame"
+
+    def test_disk_tier(self, tmp_path):
+        """Test that frames survive in the disk tier when evicted from memory."""
+        a, b = game_view.frame_cache_key("a"), game_view.frame_cache_key("b")
+        cache = game_view.FrameCache(max_bytes=5, disk_dir=str(tmp_path / "frames"))
+        cache.put(a, b"frame")
+        cache.put(b, b"frame")
+        assert cache.memory.get(a) is None
+        assert cache.get(a) == b"frame"
+        assert game_view.FrameCache(max_bytes=5, disk_dir=str(tmp_path / "frames")).get(b) == b"frame"
+        assert not [name for name in (tmp_path / "frames").iterdir() if name.suffix == ".tmp"]
+
+    def test_disk_tier_evicts_least_recently_used(self, tmp_path):
+        """Test that the disk tier stays within its budget, dropping the least recently used frames."""
+        a, b, c = (game_view.frame_cache_key(text) for text in "abc")
+        folder = tmp_path / "frames"
+        cache = game_view.FrameCache(max_bytes=5, disk_dir=str(folder), disk_max_bytes=10)
+        cache.put(a, b"frame")
+        cache.put(b, b"frame")
+        assert cache.get(a) == b"frame"  # a is now more recent than b
+        cache.put(c, b"frame")
+        assert sorted(path.stem for path in folder.iterdir()) == sorted([a, c])
+        assert cache.get(b) is None
+
+        # a smaller budget on restart trims the files left by the previous run
+        game_view.FrameCache(max_bytes=5, disk_dir=str(folder), disk_max_bytes=5)
+        assert len(list(folder.iterdir())) == 1
+
+    def test_rejects_invalid_keys(self, tmp_path):
+        """Test that keys which are not frame_cache_key digests never reach the disk."""
+        cache = game_view.FrameCache(max_bytes=100, disk_dir=str(tmp_path / "frames"))
+        for key in ["../secret", "k", game_view.frame_cache_key().upper()]:
+            with pytest.raises(ValueError):
+                cache.get(key)
+            with pytest.raises(ValueError):
+                cache.put(key, b"frame")
+        assert not list((tmp_path / "frames").iterdir())
+
+
+class TestRenderPool:
+    """Test the pool rendering frames off the event loop."""
+
+    def test_render_matches_create_game_image(self, static_dir):
+        """Test that the pool renders the same frame as create_game_image."""
+        pool = game_view.RenderPool(size=2, max_pending=2, kind="thread")
+        try:
+            frame = asyncio.run(pool.render(display_shock=True))
+        finally:
+            pool.shutdown()
+        assert frame == game_view.create_game_image(display_shock=True).getvalue()
+        assert pool.pending == 0
+
+    def test_rejects_renders_over_max_pending(self, static_dir):
+        """Test that renders beyond max_pending are rejected instead of queued."""
+        pool = game_view.RenderPool(size=1, max_pending=1, kind="thread")
+
+        async def render_twice():
+            return await asyncio.gather(pool.render(), pool.render(), return_exceptions=True)
+
+        try:
+            first, second = asyncio.run(render_twice())
+        finally:
+            pool.shutdown()
+        assert isinstance(first, bytes)
+        assert isinstance(second, game_view.RenderPoolFull)
+
+    def test_waits_for_a_free_slot(self, static_dir):
+        """Test that renders with wait=True are queued instead of rejected."""
+        pool = game_view.RenderPool(size=1, max_pending=1, kind="thread")
+
+        async def render_many():
+            return await asyncio.gather(*[pool.render(display_shock=True, wait=True) for _ in range(4)])
+
+        try:
+            frames = asyncio.run(render_many())
+        finally:
+            pool.shutdown()
+        assert len(set(frames)) == 1
+        assert pool.pending == 0
+
+    def test_unknown_kind(self):
+        """Test that an unknown pool kind is rejected."""
+        with pytest.raises(ValueError):
+            game_view.RenderPool(size=1, max_pending=1, kind="fiber")
@@ -0,0 +1,464 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from collections import Counter
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+# the LLM settings imported by the server read the API keys on import
+for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY", "OPENROUTER_API_KEY"):
+    os.environ.setdefault(name, "test-key")
+
+import src.server as server
+
+# the modules server.py imported, from src on sys.path, not their src.* copies
+import audio.tts as tts
+from audio.tts_cache import AudioCache
+from game_view import FrameCache, frame_cache_key
+from utils.byte_cache import ByteLRUCache
+
+
+class FakeSpeechResponse:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_bytes(self):
+        yield from self.chunks
+
+
+class FakeSpeechClient:
+    """Stands in for the OpenAI client of audio.tts, generating a different clip on every call."""
+
+    def __init__(self):
+        self.calls = []
+        self.audio = SimpleNamespace(speech=SimpleNamespace(with_streaming_response=SimpleNamespace(create=self.create)))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeSpeechResponse([b"ID3", f"{kwargs['input']} take {len(self.calls)}. ".encode() * 20])
+
+
+class GatedSpeechClient(FakeSpeechClient):
+    """Sends the first chunk of a clip at once, and the others once `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeSpeechResponse(self.chunks())
+
+    def chunks(self):
+        yield b"ID3 first chunk. "
+        assert self.release.wait(timeout=5)
+        yield b"second chunk. "
+        yield b"last chunk."
+
+
+def use_speech_client(fake, tmp_path, monkeypatch):
+    monkeypatch.setattr(tts, "client", fake)
+    monkeypatch.setattr(tts, "CACHE_DIR", str(tmp_path / "tts_cache"))
+    monkeypatch.setattr(tts, "audio_cache", AudioCache(str(tmp_path / "tts_cache"), 10 * 1024 * 1024))
+    monkeypatch.setattr(tts, "memory_cache", ByteLRUCache(10 * 1024 * 1024))
+    monkeypatch.setattr(tts, "cache_counters", Counter())
+    return fake
+
+
+@pytest.fixture
+def speech(tmp_path, monkeypatch):
+    """Empty TTS caches in a temporary folder, and a fake speech API."""
+    return use_speech_client(FakeSpeechClient(), tmp_path, monkeypatch)
+
+
+@pytest.fixture
+def gated_speech(tmp_path, monkeypatch):
+    """Empty TTS caches in a temporary folder, and a fake speech API sending its chunks on demand."""
+    return use_speech_client(GatedSpeechClient(), tmp_path, monkeypatch)
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestTTSEndpoints:
+    """Test the /api/tts endpoints."""
+
+    params = {"role": "Professor", "message": "Please continue."}
+
+    def test_unknown_role(self, client, speech):
+        """Test that an unknown role is a 400, for both methods, without calling the speech API."""
+        assert client.get("/api/tts", params={"role": "Bogus", "message": "Hi"}).status_code == 400
+        assert client.post("/api/tts", json={"role": "Bogus", "message": "Hi"}).status_code == 400
+        assert client.post("/api/tts", json={"message": "Hi"}).status_code == 400
+        assert speech.calls == []
+
+    def test_role_without_voice(self, client, speech):
+        """Test that the Orchestrator, which has no voice, is a 404."""
+        assert client.get("/api/tts", params={"role": "Orchestrator", "message": "Hi"}).status_code == 404
+        assert speech.calls == []
+
+    def test_first_request_streams_without_etag(self, client, speech):
+        """Test that a line not generated yet is streamed, without an ETag since its bytes are not known up front."""
+        response = client.get("/api/tts", params=self.params)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "audio/mpeg"
+        assert response.content.startswith(b"ID3")
+        assert "etag" not in response.headers
+        assert response.headers["cache-control"] == server.TTS_CACHE_CONTROL
+        assert len(speech.calls) == 1
+
+    def test_etag_and_304(self, client, speech):
+        """Test that a cached clip has the digest of its bytes as ETag, and a matching If-None-Match gets a 304."""
+        audio = client.get("/api/tts", params=self.params).content
+        response = client.get("/api/tts", params=self.params)
+        assert response.content == audio
+        assert response.headers["etag"] == f'"{sha256(audio)}"'
+        assert response.headers["cache-control"] == server.TTS_CACHE_CONTROL
+        assert response.headers["content-location"] == f"/api/tts/audio/{sha256(audio)}"
+
+        not_modified = client.get("/api/tts", params=self.params, headers={"If-None-Match": response.headers["etag"]})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert len(speech.calls) == 1
+
+    def test_post_has_the_same_etag(self, client, speech):
+        """Test that POST serves the same clip and ETag as GET, as an attachment."""
+        audio = client.get("/api/tts", params=self.params).content
+        response = client.post("/api/tts", json=self.params)
+        assert response.content == audio
+        assert response.headers["etag"] == f'"{sha256(audio)}"'
+        assert response.headers["content-disposition"] == "attachment; filename=tts.mp3"
+
+    def test_range(self, client, speech):
+        """Test byte ranges of a clip, generated first if needed, and unsatisfiable ranges."""
+        first = client.get("/api/tts", params=self.params, headers={"Range": "bytes=0-9"})
+        assert first.status_code == 206
+        assert first.content == b"ID3" + b"Please "
+        audio = client.get("/api/tts", params=self.params).content
+        assert first.headers["content-range"] == f"bytes 0-9/{len(audio)}"
+        assert first.headers["etag"] == f'"{sha256(audio)}"'
+
+        suffix = client.get("/api/tts", params=self.params, headers={"Range": "bytes=-5"})
+        assert suffix.status_code == 206
+        assert suffix.content == audio[-5:]
+
+        unsatisfiable = client.get("/api/tts", params=self.params, headers={"Range": f"bytes={len(audio)}-"})
+        assert unsatisfiable.status_code == 416
+        assert unsatisfiable.headers["content-range"] == f"bytes */{len(audio)}"
+        assert len(speech.calls) == 1
+
+    def test_content_addressed_audio(self, client, speech, monkeypatch):
+        """Test that the Content-Location serves the clip as immutable, also from the disk tier."""
+        client.get("/api/tts", params=self.params)
+        location = client.get("/api/tts", params=self.params).headers["content-location"]
+        monkeypatch.setattr(tts, "memory_cache", ByteLRUCache(10 * 1024 * 1024))
+
+        response = client.get(location)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+        assert sha256(response.content) == location.rsplit("/", 1)[1]
+        assert client.get(location, headers={"Range": "bytes=0-2"}).content == b"ID3"
+
+    def test_unknown_or_invalid_digest(self, client, speech):
+        """Test that digests of no cached clip, and strings which are not digests, are a 404."""
+        assert client.get(f"/api/tts/audio/{'0' * 64}").status_code == 404
+        assert client.get("/api/tts/audio/not-a-digest").status_code == 404
+        assert client.get("/api/tts/audio/..%2F..%2Fmanifest.sqlite").status_code == 404
+
+    def test_regenerated_clip_gets_a_new_address(self, client, speech, tmp_path, monkeypatch):
+        """Test that a clip generated again after leaving the cache never reuses the old ETag or address."""
+        client.get("/api/tts", params=self.params)
+        old = client.get("/api/tts", params=self.params)
+        monkeypatch.setattr(tts, "audio_cache", AudioCache(str(tmp_path / "other_cache"), 10 * 1024 * 1024))
+        monkeypatch.setattr(tts, "memory_cache", ByteLRUCache(10 * 1024 * 1024))
+
+        new = client.get("/api/tts", params=self.params, headers={"Range": "bytes=0-"})
+        assert new.headers["etag"] != old.headers["etag"]
+        assert client.get(old.headers["content-location"]).status_code == 404
+        assert client.get("/api/tts", params=self.params, headers={"If-None-Match": old.headers["etag"]}).status_code == 200
+
+    def test_stats(self, client, speech, monkeypatch):
+        """Test that the memory hits, misses and evictions, and the generations show up in the stats."""
+        # room for one clip only
+        monkeypatch.setattr(tts, "memory_cache", ByteLRUCache(800))
+        client.get("/api/tts", params=self.params)
+        client.get("/api/tts", params=self.params)
+        client.get("/api/tts", params={"role": "Learner", "message": "Was that wrong?"})
+
+        stats = client.get("/api/tts/stats").json()
+        assert stats["memory"]["hits"] == 1
+        # looked up by the response, and again by the stream of the new line
+        assert stats["memory"]["misses"] == 4
+        assert stats["memory"]["evictions"] == 1
+        assert stats["memory"]["entries"] == 1
+        assert stats["memory"]["max_bytes"] == 800
+        assert stats["generations"] == 2
+        assert stats["disk_hits"] == 0
+        assert stats["disk"] == tts.audio_cache.stats()
+
+
+class TestTTSStreaming:
+    """Test the streaming of the clips not generated yet."""
+
+    def test_chunks_are_sent_while_generating(self, client, gated_speech):
+        """Test that the first chunk reaches the client before the generation ends, and the cache has the whole clip after."""
+
+        cache_key = tts.tts_cache_key("Was that wrong?", server.Roles.LEARNER)
+
+        async def stream():
+            response = await server.tts_response("Learner", "Was that wrong?", None, None)
+            first_chunk = await anext(response.body_iterator)
+            generating = cache_key not in tts.audio_cache and cache_key in tts._tts_requests
+            gated_speech.release.set()
+            rest = [chunk async for chunk in response.body_iterator]
+            return first_chunk, generating, rest
+
+        first_chunk, generating, rest = asyncio.run(stream())
+        assert first_chunk == b"ID3 first chunk. "
+        assert generating
+        audio = b"".join([first_chunk, *rest])
+        assert audio == b"ID3 first chunk. second chunk. last chunk."
+
+        assert tts.audio_cache.read(cache_key) == audio
+        cached = client.get("/api/tts", params={"role": "Learner", "message": "Was that wrong?"})
+        assert cached.content == audio
+        assert cached.headers["etag"] == f'"{sha256(audio)}"'
+        assert len(gated_speech.calls) == 1
+
+
+class FakeRenderPool:
+    """Stands in for the render pool, a frame is the JSON of its rendering arguments."""
+
+    size = 2
+
+    def __init__(self):
+        self.renders = []
+
+    async def render(self, image_format="png", quality=None, wait=False, **arguments):
+        self.renders.append(arguments)
+        return json.dumps([arguments, image_format, quality]).encode()
+
+
+@pytest.fixture
+def conversation(tmp_path, monkeypatch, sample_experiment_data):
+    """An experiment in a temporary results folder, an empty frame cache and a fake render pool."""
+    folder = tmp_path / "results"
+    folder.mkdir()
+    data = dict(sample_experiment_data)
+    data["messages"] = [
+        {"speaker": "Professor", "text": "Welcome to the experiment."},
+        {"speaker": "Orchestrator", "text": "Next speaker: Participant"},
+        {"speaker": "Participant", "text": "Wrong. 75 volts."},
+        {"speaker": "SHOCKING_DEVICE", "text": "75 volts administered"},
+        {"speaker": "Learner", "text": "Ouch!"},
+    ]
+    (folder / f"experiment_{data['id']}.json").write_text(json.dumps(data))
+    monkeypatch.setattr(server, "RESULTS_FOLDER", str(folder))
+    monkeypatch.setattr(server, "frame_cache", FrameCache(10 * 1024 * 1024))
+    monkeypatch.setattr(server, "render_pool", FakeRenderPool())
+    return data["id"]
+
+
+class TestConversationFrames:
+    """Test the prerendered frames of a conversation."""
+
+    # frames of the messages without the Orchestrator
+    speakers = ["Professor", "Participant", "SHOCKING_DEVICE", "Learner"]
+
+    def test_manifest(self, client, conversation):
+        """Test that the manifest lists the frame of every message with its key and URL."""
+        response = client.post(f"/api/conversations/{conversation}/frames", params={"format": "webp"})
+        assert response.status_code == 200
+        manifest = response.json()
+        assert set(manifest) == {"id", "format", "media_type", "frames"}
+        assert manifest["id"] == conversation
+        assert manifest["format"] == "webp"
+        assert manifest["media_type"] == "image/webp"
+        assert [frame["speaker"] for frame in manifest["frames"]] == self.speakers
+        assert [frame["position"] for frame in manifest["frames"]] == [0, 1, 2, 3]
+
+        first = manifest["frames"][0]
+        assert set(first) == {"position", "speaker", "key", "url"}
+        assert first["key"] == frame_cache_key(professor_message="Welcome to the experiment.", image_format="webp", quality=80)
+        assert first["url"] == f"/api/conversations/{conversation}/frames/webp/{first['key']}?quality=80"
+        assert manifest["frames"][2]["key"] == frame_cache_key(display_shock=True, image_format="webp", quality=80)
+        assert len(server.render_pool.renders) == 4
+
+        frame = client.get(first["url"])
+        assert frame.status_code == 200
+        assert frame.headers["etag"] == f'"{first["key"]}"'
+        assert frame.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+        assert len(server.render_pool.renders) == 4
+
+    def test_unknown_conversation(self, client, conversation):
+        """Test that the frames of an unknown conversation are a 404."""
+        assert client.post("/api/conversations/unknown/frames").status_code == 404
+
+    def test_evicted_frame_is_rendered_again(self, client, conversation, monkeypatch):
+        """Test that a frame of the manifest which left the frame cache is rendered again, not a 404."""
+        manifest = client.post(f"/api/conversations/{conversation}/frames").json()
+        learner = manifest["frames"][3]
+        original = client.get(learner["url"]).content
+        monkeypatch.setattr(server, "frame_cache", FrameCache(10 * 1024 * 1024))
+
+        response = client.get(learner["url"])
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.content == original
+        assert server.render_pool.renders[-1] == {"learner_message": "Ouch!"}
+
+        # keys of no frame of the conversation
+        assert client.get(f"/api/conversations/{conversation}/frames/png/{'0' * 64}").status_code == 404
+        assert client.get(f"/api/conversations/{conversation}/frames/png/not-a-key").status_code == 404
+
+    def test_zip(self, client, conversation):
+        """Test that the zip has the manifest then the frames, in message order."""
+        response = client.get(f"/api/conversations/{conversation}/frames.zip", params={"format": "jpeg"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        assert response.headers["content-disposition"] == f'attachment; filename="{conversation}_frames.zip"'
+
+        with zipfile.ZipFile(BytesIO(response.content)) as bundle:
+            assert bundle.namelist() == ["manifest.json", "0000.jpg", "0001.jpg", "0002.jpg", "0003.jpg"]
+            manifest = json.loads(bundle.read("manifest.json"))
+            assert [frame["speaker"] for frame in manifest["frames"]] == self.speakers
+            for frame in manifest["frames"]:
+                assert bundle.read(f"{frame['position']:04d}.jpg") == client.get(frame["url"]).content
+
+
+@pytest.fixture
+def experiments(tmp_path, monkeypatch, sample_experiment_data):
+    """Seven experiments in a temporary results folder, some with the same timestamp."""
+    folder = tmp_path / "results"
+    folder.mkdir()
+    timestamps = [100, 100, 100, 200, 300, 300, 400]
+    for i, timestamp in enumerate(timestamps):
+        data = json.loads(json.dumps(sample_experiment_data))
+        data.update(id=f"e{i}", timestamp=timestamp, final_voltage=75 * i)
+        data["config"]["participant_model"]["model"] = "gpt-4" if i % 2 == 0 else "claude-3-opus"
+        (folder / f"experiment_e{i}.json").write_text(json.dumps(data))
+    monkeypatch.setattr(server, "RESULTS_FOLDER", str(folder))
+    return folder
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class TestConversations:
+    """Test the paginated and streamed lists of conversations."""
+
+    def test_follow_cursor_to_the_end(self, client, experiments):
+        """Test that following next_cursor returns every conversation once, oldest first."""
+        ids = []
+        params = {"limit": 3}
+        pages = 0
+        while True:
+            page = client.get("/api/conversations", params=params).json()
+            assert len(page["items"]) <= 3
+            ids += [item["id"] for item in page["items"]]
+            pages += 1
+            if page["next_cursor"] is None:
+                break
+            params = {"limit": 3, "cursor": page["next_cursor"]}
+        assert ids == [f"e{i}" for i in range(7)]
+        assert pages == 3
+
+    def test_exact_last_page(self, client, experiments):
+        """Test that a last page filled exactly has no next cursor."""
+        first = client.get("/api/conversations", params={"limit": 4, "provider": "OpenAI pre-GPT 5"}).json()
+        assert [item["id"] for item in first["items"]] == ["e0", "e2", "e4", "e6"]
+        assert first["next_cursor"] is None
+
+    def test_filters_apply_to_every_page(self, client, experiments):
+        """Test that the filters of the first page are kept on the next ones."""
+        params = {"limit": 1, "provider": "Anthropic", "min_voltage": 100}
+        first = client.get("/api/conversations", params=params).json()
+        second = client.get("/api/conversations", params={**params, "cursor": first["next_cursor"]}).json()
+        assert [item["id"] for item in first["items"] + second["items"]] == ["e3", "e5"]
+        assert second["next_cursor"] is None
+
+    def test_default_fields(self, client, experiments):
+        """Test that the conversations have the fields of /api/load-all-conversations by default."""
+        item = client.get("/api/conversations", params={"limit": 1}).json()["items"][0]
+        assert list(item) == server.DEFAULT_FIELDS
+        assert item["messages"][0] == {"speaker": "Professor", "text": "Welcome to the experiment."}
+
+    def test_invalid_cursor(self, client, experiments):
+        """Test that a cursor not returned by the API is a 400."""
+        for cursor in ["not a cursor", "bm90IGpzb24=", "WyJhIl0="]:
+            assert client.get("/api/conversations", params={"cursor": cursor}).status_code == 400
+
+    def test_unknown_fields(self, client, experiments):
+        """Test that unknown fields are a 400, listing them."""
+        response = client.get("/api/conversations", params={"fields": "id,password,secrets"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Unknown fields: password, secrets"
+        assert client.get("/api/conversations/stream", params={"fields": "id,password"}).status_code == 400
+
+    def test_stream_filters(self, client, experiments):
+        """Test that the NDJSON stream has one line per matching conversation."""
+        response = client.get(
+            "/api/conversations/stream",
+            params={"participant_model": "gpt-4", "min_voltage": 100, "max_voltage": 400, "fields": "id,final_voltage"},
+        )
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert read_ndjson(response) == [{"id": "e2", "final_voltage": 150}, {"id": "e4", "final_voltage": 300}]
+
+        everything = read_ndjson(client.get("/api/conversations/stream"))
+        assert [item["id"] for item in everything] == [f"e{i}" for i in range(7)]
+        assert all(item["messages"] for item in everything)
+
+    def test_projection_without_messages_reads_no_file(self, client, experiments, monkeypatch):
+        """Test that the fields of the index are served without opening the result files."""
+        # index the files, then make them unreadable
+        client.get("/api/conversations", params={"fields": "id"})
+        for path in experiments.glob("experiment_*.json"):
+            path.write_text("not json")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("result file opened")
+
+        monkeypatch.setattr(server, "load_experiment_file", fail)
+        fields = "id,participant_model,provider,final_voltage,message_count"
+        page = client.get("/api/conversations", params={"fields": fields, "limit": 2}).json()
+        assert page["items"][0] == {
+            "id": "e0",
+            "participant_model": "gpt-4",
+            "provider": "OpenAI pre-GPT 5",
+            "final_voltage": 0,
+            "message_count": 3,
+        }
+        streamed = read_ndjson(client.get("/api/conversations/stream", params={"fields": fields}))
+        assert [item["id"] for item in streamed] == [f"e{i}" for i in range(7)]
+
+    def test_load_all_conversations_off_the_event_loop(self, client, monkeypatch):
+        """Test that the blocking load of every conversation does not run on the event loop."""
+
+        def load_experiments(**kwargs):
+            with pytest.raises(RuntimeError):
+                asyncio.get_running_loop()
+            return [{"id": "e0", "messages": []}]
+
+        monkeypatch.setattr(server, "load_experiments", load_experiments)
+        response = client.get("/api/load-all-conversations")
+        assert response.status_code == 200
+        assert response.json() == [{"id": "e0", "messages": []}]
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+import src.utils.async_utils as async_utils
+from src.utils.async_utils import RateLimiter, SingleFlight, run_blocking, run_io
+
+
+class TestRunBlocking:
+    """Test the run_blocking function."""
+
+    def test_runs_in_a_worker_thread(self):
+        """Test that the function runs off the event loop thread and its result is returned."""
+
+        async def main():
+            return await run_blocking(lambda x: (x * 2, threading.current_thread().name), 21)
+
+        result, thread_name = asyncio.run(main())
+        assert result == 42
+        assert thread_name.startswith("blocking")
+
+
+class TestRunIO:
+    """Test the run_io function."""
+
+    def test_not_delayed_by_blocking_calls(self):
+        """Test that server I/O runs in its own threads while every blocking thread is busy."""
+        release = threading.Event()
+
+        async def main():
+            busy = [
+                asyncio.ensure_future(run_blocking(release.wait, 5))
+                for _ in range(async_utils._blocking_executor._max_workers)
+            ]
+            try:
+                return await asyncio.wait_for(run_io(lambda: threading.current_thread().name), timeout=2)
+            finally:
+                release.set()
+                await asyncio.gather(*busy)
+
+        assert asyncio.run(main()).startswith("server-io")
+
+
+class TestSingleFlight:
+    """Test the SingleFlight class."""
+
+    def test_concurrent_calls_are_coalesced(self):
+        """Test that simultaneous calls with the same key run the function once."""
+        calls = []
+
+        async def produce(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return f"value of {key}"
+
+        async def main():
+            flight = SingleFlight()
+            results = await asyncio.gather(
+                *[flight.run("a", lambda: produce("a")) for _ in range(5)],
+                flight.run("b", lambda: produce("b")),
+            )
+            assert len(flight) == 0
+            # a finished call is not reused
+            results.append(await flight.run("a", lambda: produce("a")))
+            return results
+
+        results = asyncio.run(main())
+        assert results == ["value of a"] * 5 + ["value of b", "value of a"]
+        assert calls == ["a", "b", "a"]
+
+    def test_start_registers_the_call_immediately(self):
+        """Test that a call started without awaiting it is joined by later calls."""
+
+        async def main():
+            flight = SingleFlight()
+            done = asyncio.get_running_loop().create_future()
+            started = flight.start("a", lambda: done)
+            assert "a" in flight
+            joined = asyncio.ensure_future(flight.run("a", lambda: asyncio.sleep(0, "other")))
+            done.set_result("value")
+            assert await started == "value"
+            return await joined
+
+        assert asyncio.run(main()) == "value"
+
+    def test_exceptions_are_shared(self):
+        """Test that every waiting caller gets the exception of the call."""
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def main():
+            flight = SingleFlight()
+            return await asyncio.gather(*[flight.run("a", fail) for _ in range(3)], return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+    def test_cancelled_caller_does_not_cancel_the_call(self):
+        """Test that the call keeps running for the other callers when one is cancelled."""
+
+        async def produce():
+            await asyncio.sleep(0.02)
+            return "value"
+
+        async def main():
+            flight = SingleFlight()
+            first = asyncio.ensure_future(flight.run("a", produce))
+            second = asyncio.ensure_future(flight.run("a", produce))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(main()) == "value"
+
+
+class TestRateLimiter:
+    """Test the RateLimiter class."""
+
+    def test_calls_are_spaced_out(self):
+        """Test that calls do not exceed the rate, the first one not waiting."""
+
+        async def main():
+            limiter = RateLimiter(rate=50)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            times = []
+
+            async def call():
+                await limiter.wait()
+                times.append(loop.time() - start)
+
+            await asyncio.gather(*[call() for _ in range(5)])
+            return sorted(times)
+
+        times = asyncio.run(main())
+        assert times[0] < 0.01
+        assert times[-1] >= 4 * 0.02 - 0.005
+
+    def test_invalid_rate(self):
+        """Test that the rate must be positive."""
+        with pytest.raises(ValueError):
+            RateLimiter(0)
@@ -95,3 +95,33 @@ class TestLoadMp3:
             mock_input.return_value.output.return_value.run.assert_called_once_with(
                 capture_stdout=True, capture_stderr=True
             )
+
+
+class TestLoadMp3WithoutFfmpeg:
+    """Test that MP3 files are read without spawning ffmpeg."""
+
+    def test_id3_file_is_read_directly(self, tmp_path):
+        """Test that a file with an ID3 tag is read as is."""
+        path = tmp_path / "sound.mp3"
+        path.write_bytes(b"ID3\x04\x00" + b"\x00" * 20)
+        with patch('ffmpeg.input') as mock_input:
+            result = load_mp3(str(path))
+        assert result.getvalue() == path.read_bytes()
+        mock_input.assert_not_called()
+
+    def test_frame_sync_file_is_read_directly(self, tmp_path):
+        """Test that a file starting with an MPEG audio frame is read as is."""
+        path = tmp_path / "sound.mp3"
+        path.write_bytes(b"\xff\xfb\x90\x64" + b"\x00" * 20)
+        with patch('ffmpeg.input') as mock_input:
+            assert load_mp3(str(path)).getvalue() == path.read_bytes()
+        mock_input.assert_not_called()
+
+    def test_other_formats_use_ffmpeg(self, tmp_path):
+        """Test that files which are not MP3 are still converted with ffmpeg."""
+        path = tmp_path / "sound.wav"
+        path.write_bytes(b"RIFF" + b"\x00" * 20)
+        with patch('ffmpeg.input') as mock_input:
+            mock_input.return_value.output.return_value.run.return_value = (b"converted", b"")
+            assert load_mp3(str(path)).getvalue() == b"converted"
+        mock_input.assert_called_once_with(str(path))
@@ -0,0 +1,57 @@
+from src.utils.byte_cache import ByteLRUCache
+
+
+class TestByteLRUCache:
+    """Test the ByteLRUCache class."""
+
+    def test_get_and_put(self):
+        """Test storing and retrieving values."""
+        cache = ByteLRUCache(max_bytes=100)
+        cache.put("a", b"12345")
+        assert cache.get("a") == b"12345"
+        assert cache.get("b") is None
+        assert "a" in cache and "b" not in cache
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entries are evicted over the budget."""
+        cache = ByteLRUCache(max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")
+        cache.put("c", b"1234")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        assert cache.get("c") == b"1234"
+
+    def test_replacing_a_value_updates_the_size(self):
+        """Test that putting an existing key does not count its old value."""
+        cache = ByteLRUCache(max_bytes=10)
+        cache.put("a", b"12345678")
+        cache.put("a", b"12")
+        cache.put("b", b"12345678")
+        assert cache.stats()["bytes"] == 10
+        assert len(cache) == 2
+
+    def test_values_larger_than_budget_are_not_cached(self):
+        """Test that an oversized value does not flush the cache."""
+        cache = ByteLRUCache(max_bytes=4)
+        cache.put("a", b"1234")
+        cache.put("b", b"12345")
+        assert cache.get("a") == b"1234"
+        assert cache.get("b") is None
+
+    def test_stats(self):
+        """Test the hit, miss and eviction counters."""
+        cache = ByteLRUCache(max_bytes=4)
+        cache.put("a", b"12")
+        cache.get("a")
+        cache.get("missing")
+        cache.put("b", b"123")
+        assert cache.stats() == {
+            "hits": 1,
+            "misses": 1,
+            "evictions": 1,
+            "entries": 1,
+            "bytes": 3,
+            "max_bytes": 4,
+        }
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+from src.utils.columnar_store import (
+    import_results,
+    load_experiments_from_store,
+    read_experiments_table,
+    read_messages_table,
+    sync_store,
+)
+from src.utils.general import load_experiments
+
+
+def write_experiment(folder, data, experiment_id, model):
+    data = json.loads(json.dumps(data))
+    data["id"] = experiment_id
+    data["config"]["participant_model"]["model"] = model
+    data["messages"].append({"speaker": "Orchestrator", "text": "Narration."})
+    with open(os.path.join(folder, f"experiment_{experiment_id}.json"), "w") as f:
+        json.dump(data, f)
+    return data
+
+
+@pytest.fixture
+def results_folder(tmp_path, sample_experiment_data):
+    folder = tmp_path / "results"
+    folder.mkdir()
+    for experiment_id, model in [("a", "gpt-4"), ("b", "claude-3")]:
+        write_experiment(folder, sample_experiment_data, experiment_id, model)
+    return str(folder)
+
+
+@pytest.fixture
+def store_dir(tmp_path, results_folder):
+    store = str(tmp_path / "store")
+    import_results(results_folder, store)
+    return store
+
+
+class TestColumnarStore:
+    """Test the columnar results store."""
+
+    def test_import_results(self, results_folder, tmp_path):
+        """Test that every experiment and message is imported."""
+        store = str(tmp_path / "store")
+        assert import_results(results_folder, store) == 2
+        assert read_experiments_table(store).num_rows == 2
+        assert read_messages_table(store).num_rows == 8
+
+    def test_read_only_needed_columns(self, store_dir):
+        """Test that aggregate queries can read a subset of the columns."""
+        table = read_experiments_table(
+            store_dir,
+            columns=["participant_model", "final_voltage"],
+            filters=[("participant_model", "=", "claude-3")],
+        )
+        assert table.column_names == ["participant_model", "final_voltage"]
+        assert table.to_pylist() == [{"participant_model": "claude-3", "final_voltage": 450}]
+
+    def test_same_experiments_as_json(self, results_folder, store_dir):
+        """Test that the store loads the same experiments as the JSON files."""
+        from_json = sorted(load_experiments(folder=results_folder), key=lambda e: e["id"])
+        from_store = sorted(load_experiments_from_store(store_dir), key=lambda e: e["id"])
+        for experiment in from_store:
+            assert experiment.pop("message_count") == len(experiment["messages"])
+        assert from_store == from_json
+
+    def test_skip_orchestrator(self, store_dir):
+        """Test that orchestrator messages can be skipped."""
+        experiments = load_experiments_from_store(store_dir, skip_orchestrator=True)
+        assert all(
+            message["speaker"] != "Orchestrator"
+            for experiment in experiments
+            for message in experiment["messages"]
+        )
+        assert all(len(experiment["messages"]) == 3 for experiment in experiments)
+
+    def test_without_messages(self, store_dir):
+        """Test that the messages table can be skipped."""
+        experiments = load_experiments_from_store(store_dir, include_messages=False)
+        assert all("messages" not in experiment for experiment in experiments)
+        assert [experiment["message_count"] for experiment in experiments] == [4, 4]
+
+    def test_load_experiments_uses_store(self, store_dir, tmp_path):
+        """Test that load_experiments reads the store when it exists."""
+        experiments = load_experiments(folder=str(tmp_path / "missing"), store_dir=store_dir)
+        assert len(experiments) == 2
+
+    def test_load_experiments_falls_back_to_json(self, results_folder, tmp_path):
+        """Test that load_experiments reads the JSON files without a store."""
+        experiments = load_experiments(folder=results_folder, store_dir=str(tmp_path / "missing"))
+        assert len(experiments) == 2
+
+    def test_malformed_files_are_skipped(self, results_folder, sample_experiment_data, tmp_path):
+        """Test that a file with a malformed message is skipped without importing any of its rows."""
+        data = write_experiment(results_folder, sample_experiment_data, "c", "gpt-4")
+        data["messages"].append({"text": "No speaker."})
+        with open(os.path.join(results_folder, "experiment_c.json"), "w") as f:
+            json.dump(data, f)
+        store = str(tmp_path / "store")
+        assert import_results(results_folder, store) == 2
+        assert read_messages_table(store).num_rows == 8
+
+    def test_sync_store(self, results_folder, store_dir, sample_experiment_data):
+        """Test that sync imports new files and drops the experiments of removed files."""
+        assert sync_store(results_folder, store_dir) == 0
+        write_experiment(results_folder, sample_experiment_data, "c", "gemini-2")
+        os.remove(os.path.join(results_folder, "experiment_a.json"))
+
+        assert sync_store(results_folder, store_dir) == 1
+        assert sorted(read_experiments_table(store_dir).column("id").to_pylist()) == ["b", "c"]
+        assert sorted(set(read_messages_table(store_dir).column("experiment_id").to_pylist())) == ["b", "c"]
+        assert sync_store(results_folder, store_dir) == 0
+
+    def test_load_experiments_syncs_store(self, results_folder, store_dir, sample_experiment_data):
+        """Test that experiments saved or deleted after the import are seen through the store."""
+        write_experiment(results_folder, sample_experiment_data, "c", "gemini-2")
+        os.remove(os.path.join(results_folder, "experiment_b.json"))
+        experiments = load_experiments(folder=results_folder, store_dir=store_dir)
+        assert sorted(experiment["id"] for experiment in experiments) == ["a", "c"]
+        assert all(len(experiment["messages"]) == 4 for experiment in experiments)
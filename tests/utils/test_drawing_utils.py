@@ -0,0 +1,77 @@
+from PIL import Image, ImageFont
+
+from src.utils.drawing_utils import adjust_cloud, layout_cloud_text, stretch_cloud
+
+
+def gradient_cloud(width=30, height=20):
+    """A cloud with distinct pixels everywhere, so that every misplaced pixel shows."""
+    cloud = Image.new("RGBA", (width, height))
+    cloud.putdata([(x * 8, y * 12, (x + y) * 5, 255 if (x + y) % 3 else 128) for y in range(height) for x in range(width)])
+    return cloud
+
+
+def reference_stretch(cloud, width, height):
+    """Pixel by pixel nine-slice stretching, as the cloud was originally stretched."""
+    base_width, base_height = cloud.size
+    mid_x, mid_y = base_width // 2, base_height // 2
+    right_x, bottom_y = width - (base_width - mid_x), height - (base_height - mid_y)
+    new_cloud = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    for box, position in [
+        ((0, 0, mid_x, mid_y), (0, 0)),
+        ((mid_x, 0, base_width, mid_y), (right_x, 0)),
+        ((0, mid_y, mid_x, base_height), (0, bottom_y)),
+        ((mid_x, mid_y, base_width, base_height), (right_x, bottom_y)),
+    ]:
+        corner = cloud.crop(box)
+        new_cloud.paste(corner, position, corner)
+    for x in range(mid_x, right_x):
+        for y in range(0, mid_y):
+            new_cloud.putpixel((x, y), cloud.getpixel((mid_x, y)))
+        for y in range(bottom_y, height):
+            new_cloud.putpixel((x, y), cloud.getpixel((mid_x, mid_y + y - bottom_y)))
+    for y in range(mid_y, bottom_y):
+        for x in range(0, mid_x):
+            new_cloud.putpixel((x, y), cloud.getpixel((x, mid_y)))
+        for x in range(right_x, width):
+            new_cloud.putpixel((x, y), cloud.getpixel((mid_x + x - right_x, mid_y)))
+        for x in range(mid_x, right_x):
+            new_cloud.putpixel((x, y), cloud.getpixel((mid_x, mid_y)))
+    return new_cloud
+
+
+class TestStretchCloud:
+    """Test the stretch_cloud function."""
+
+    def test_matches_pixel_by_pixel_stretching(self):
+        """Test that the cloud is stretched exactly as with the pixel by pixel copy."""
+        cloud = gradient_cloud()
+        for size in [(50, 20), (30, 45), (64, 41)]:
+            assert stretch_cloud(cloud, *size).tobytes() == reference_stretch(cloud, *size).tobytes()
+
+    def test_no_stretch_needed(self):
+        """Test that the cloud is returned as is when it is big enough."""
+        cloud = gradient_cloud()
+        assert stretch_cloud(cloud, 30, 20) is cloud
+
+
+class TestLayoutCloudText:
+    """Test the layout_cloud_text function."""
+
+    def test_layout(self):
+        """Test that the lines are wrapped, measured and fit in the cloud."""
+        font = ImageFont.load_default(size=16)
+        message = "The experiment requires that you continue. " * 6
+        layout = layout_cloud_text(message, font, (100, 80))
+        assert len(layout.lines) > 1
+        assert layout.line_widths == [font.getbbox(line)[2] - font.getbbox(line)[0] for line in layout.lines]
+        assert layout.width >= max(layout.line_widths) and layout.width >= 100
+        assert layout.height >= len(layout.lines) * layout.line_spacing
+
+    def test_adjust_cloud(self):
+        """Test that adjust_cloud stretches the cloud to the layout size."""
+        font = ImageFont.load_default(size=16)
+        message = "Please go on. " * 20
+        cloud, lines, line_spacing = adjust_cloud(gradient_cloud(), message, font)
+        layout = layout_cloud_text(message, font, (30, 20))
+        assert cloud.size == (layout.width, layout.height)
+        assert lines == layout.lines and line_spacing == layout.line_spacing
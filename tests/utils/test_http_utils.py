@@ -0,0 +1,78 @@
+import pytest
+from src.utils.http_utils import etag_matches, negotiate_media_type, parse_byte_range
+
+
+class TestEtagMatches:
+    """Test the etag_matches function."""
+
+    def test_no_header(self):
+        """Test that a missing header never matches."""
+        assert not etag_matches(None, '"abc"')
+        assert not etag_matches("", '"abc"')
+
+    def test_single_etag(self):
+        """Test matching a single ETag."""
+        assert etag_matches('"abc"', '"abc"')
+        assert not etag_matches('"abd"', '"abc"')
+
+    def test_list_and_weak_etags(self):
+        """Test matching a list of ETags, with weak comparison."""
+        assert etag_matches('"x", W/"abc"', '"abc"')
+        assert etag_matches('"x",  "abc" ', '"abc"')
+        assert not etag_matches('"x", "y"', '"abc"')
+
+    def test_wildcard(self):
+        """Test that * matches any ETag."""
+        assert etag_matches("*", '"abc"')
+
+
+class TestNegotiateMediaType:
+    """Test the negotiate_media_type function."""
+
+    OFFERED = ["image/png", "image/webp", "image/jpeg"]
+
+    def test_no_header(self):
+        """Test that a missing header picks the first offered type."""
+        assert negotiate_media_type(None, self.OFFERED) == "image/png"
+
+    def test_explicit_type_beats_wildcard(self):
+        """Test that an explicitly listed type wins over types matched by a wildcard."""
+        assert negotiate_media_type("image/avif,image/webp,*/*;q=0.8", self.OFFERED) == "image/webp"
+        assert negotiate_media_type("*/*", self.OFFERED) == "image/png"
+        assert negotiate_media_type("image/*", self.OFFERED) == "image/png"
+
+    def test_quality(self):
+        """Test that q values are respected, and q=0 excludes a type."""
+        assert negotiate_media_type("image/png;q=0.5, image/jpeg", self.OFFERED) == "image/jpeg"
+        assert negotiate_media_type("image/*, image/png;q=0", self.OFFERED) == "image/webp"
+
+    def test_nothing_acceptable(self):
+        """Test that None is returned when no offered type is acceptable."""
+        assert negotiate_media_type("text/html", self.OFFERED) is None
+
+
+class TestParseByteRange:
+    """Test the parse_byte_range function."""
+
+    def test_no_header(self):
+        """Test that a missing header means the whole resource."""
+        assert parse_byte_range(None, 100) is None
+
+    def test_ranges(self):
+        """Test closed, open and suffix ranges."""
+        assert parse_byte_range("bytes=0-9", 100) == (0, 9)
+        assert parse_byte_range("bytes=90-", 100) == (90, 99)
+        assert parse_byte_range("bytes=-10", 100) == (90, 99)
+        assert parse_byte_range("bytes=50-500", 100) == (50, 99)
+        assert parse_byte_range("bytes=-500", 100) == (0, 99)
+
+    def test_ignored_ranges(self):
+        """Test that malformed and multiple ranges are ignored."""
+        for header in ["bytes=a-b", "items=0-9", "bytes=0-9,20-29", "bytes=9-0", "bytes=-", "bytes=5"]:
+            assert parse_byte_range(header, 100) is None, header
+
+    def test_unsatisfiable_ranges(self):
+        """Test that ranges outside the resource raise."""
+        for header in ["bytes=100-", "bytes=200-300", "bytes=-0"]:
+            with pytest.raises(ValueError):
+                parse_byte_range(header, 100)
@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+
+import pytest
+from src.utils.results_index import ResultsIndex
+
+
+def write_experiment(folder, data, experiment_id, model="gpt-4"):
+    data = json.loads(json.dumps(data))
+    data["id"] = experiment_id
+    data["config"]["participant_model"]["model"] = model
+    filename = f"experiment_{experiment_id}.json"
+    with open(os.path.join(folder, filename), "w") as f:
+        json.dump(data, f)
+    return data, filename
+
+
+@pytest.fixture
+def results_folder(tmp_path, sample_experiment_data):
+    folder = tmp_path / "results"
+    folder.mkdir()
+    write_experiment(folder, sample_experiment_data, "a", "gpt-4")
+    write_experiment(folder, sample_experiment_data, "b", "gpt-4")
+    write_experiment(folder, sample_experiment_data, "c", "claude-3")
+    (folder / "notes.txt").write_text("not an experiment")
+    return str(folder)
+
+
+class TestResultsIndex:
+    """Test the ResultsIndex class."""
+
+    def test_built_from_folder_on_first_use(self, results_folder):
+        """Test that a new index is filled with the existing experiment files."""
+        index = ResultsIndex(results_folder)
+        assert index.count_by_model("gpt-4") == 2
+        assert index.count_by_model("claude-3") == 1
+        assert index.count_by_model("unknown") == 0
+        assert os.path.exists(os.path.join(results_folder, "index.sqlite"))
+
+    def test_indexed_fields(self, results_folder):
+        """Test that the indexed fields are extracted from the experiment."""
+        row = next(row for row in ResultsIndex(results_folder).rows() if row["id"] == "c")
+        assert row == {
+            "id": "c",
+            "filename": "experiment_c.json",
+            "participant_model": "claude-3",
+            "provider": "Anthropic",
+            "final_voltage": 450,
+            "cost": 0.5,
+            "timestamp": 1234567890,
+            "message_count": 3,
+        }
+
+    def test_get(self, results_folder):
+        """Test getting an experiment by id."""
+        index = ResultsIndex(results_folder)
+        assert index.get("b")["filename"] == "experiment_b.json"
+        assert index.get("unknown") is None
+
+    def test_add(self, results_folder, sample_experiment_data):
+        """Test that added experiments are counted without a sync."""
+        index = ResultsIndex(results_folder)
+        index.count_by_model("gpt-4")
+        data, filename = write_experiment(results_folder, sample_experiment_data, "d", "gpt-4")
+        index.add(data, filename)
+        index.add(data, filename)  # adding twice replaces the row
+        assert index.counts_by_model() == {"gpt-4": 3, "claude-3": 1}
+
+    def test_sync(self, results_folder, sample_experiment_data):
+        """Test that sync picks up new files and drops removed ones."""
+        index = ResultsIndex(results_folder)
+        index.count_by_model("gpt-4")
+        write_experiment(results_folder, sample_experiment_data, "d", "claude-3")
+        os.remove(os.path.join(results_folder, "experiment_a.json"))
+
+        assert index.sync() == 1
+        assert index.counts_by_model() == {"gpt-4": 1, "claude-3": 2}
+        assert index.sync() == 0
+
+    def test_invalid_files_are_skipped(self, results_folder):
+        """Test that unreadable experiment files do not break the index."""
+        with open(os.path.join(results_folder, "experiment_broken.json"), "w") as f:
+            f.write("{not json")
+        assert ResultsIndex(results_folder).counts_by_model() == {"gpt-4": 2, "claude-3": 1}
+
+    def test_schema_created_once(self, results_folder, monkeypatch):
+        """Test that only the first connection to an index sets up its schema."""
+        scripts = []
+
+        class RecordingConnection(sqlite3.Connection):
+            def executescript(self, script):
+                scripts.append(script)
+                return super().executescript(script)
+
+        connect = sqlite3.connect
+        monkeypatch.setattr(sqlite3, "connect", lambda *args, **kwargs: connect(*args, factory=RecordingConnection, **kwargs))
+        index = ResultsIndex(results_folder)
+        index.count_by_model("gpt-4")
+        ResultsIndex(results_folder).counts_by_model()
+        index.rows()
+        assert len(scripts) == 1
+
+    def test_rebuilt_when_removed(self, results_folder):
+        """Test that an index file removed while the process runs is built again."""
+        index = ResultsIndex(results_folder)
+        assert index.count_by_model("gpt-4") == 2
+        os.remove(index.index_path)
+        assert index.count_by_model("gpt-4") == 2
+
+    def test_missing_folder(self, tmp_path):
+        """Test that an index of a missing folder is empty."""
+        index = ResultsIndex(str(tmp_path / "missing"), index_path=str(tmp_path / "index.sqlite"))
+        assert index.sync() == 0
+        assert index.count_by_model("gpt-4") == 0
+
+    def test_query_filters(self, results_folder, sample_experiment_data):
+        """Test filtering by participant model, provider and voltage range."""
+        data, filename = write_experiment(results_folder, sample_experiment_data, "d", "gemini-pro")
+        data["final_voltage"] = 90
+        index = ResultsIndex(results_folder)
+        index.add(data, filename)
+
+        assert [row["id"] for row in index.query(participant_models=["gpt-4"])] == ["a", "b"]
+        assert [row["id"] for row in index.query(providers=["Anthropic", "Google"])] == ["c", "d"]
+        assert [row["id"] for row in index.query(max_voltage=100)] == ["d"]
+        assert [row["id"] for row in index.query(min_voltage=100, providers=["Google"])] == []
+
+    def test_query_pagination(self, results_folder):
+        """Test keyset pagination over (timestamp, id)."""
+        index = ResultsIndex(results_folder)
+        first_page = index.query(limit=2)
+        assert [row["id"] for row in first_page] == ["a", "b"]
+        last = first_page[-1]
+        assert [row["id"] for row in index.query(after=(last["timestamp"], last["id"]), limit=2)] == ["c"]
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from src.utils.scheduler import run_with_limits, a_run_with_limits
+
+
+class ConcurrencyTracker:
+    """Worker that records the peak number of concurrently running jobs."""
+
+    def __init__(self, duration: float = 0.02):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.running = Counter()
+        self.peak = Counter()
+        self.total_running = 0
+        self.peak_total = 0
+
+    def __call__(self, job):
+        keys, value = job
+        keys = (keys,) if isinstance(keys, str) else keys
+        with self.lock:
+            for key in keys:
+                self.running[key] += 1
+                self.peak[key] = max(self.peak[key], self.running[key])
+            self.total_running += 1
+            self.peak_total = max(self.peak_total, self.total_running)
+        time.sleep(self.duration)
+        with self.lock:
+            for key in keys:
+                self.running[key] -= 1
+            self.total_running -= 1
+        return value
+
+
+class TestRunWithLimits:
+    """Test the run_with_limits function."""
+
+    def test_runs_all_jobs(self):
+        """Test that every job is run and its result returned."""
+        jobs = [("a", i) for i in range(10)]
+        results = [
+            future.result()
+            for _, future in run_with_limits(jobs, lambda job: job[1] * 2, key=lambda job: job[0], max_concurrency=4)
+        ]
+        assert sorted(results) == [i * 2 for i in range(10)]
+
+    def test_global_limit(self):
+        """Test that no more than max_concurrency jobs run at once."""
+        tracker = ConcurrencyTracker()
+        jobs = [(str(i), i) for i in range(12)]
+        list(run_with_limits(jobs, tracker, key=lambda job: job[0], max_concurrency=3))
+        assert tracker.peak_total == 3
+
+    def test_key_limits(self):
+        """Test that per-key limits are respected while other keys keep running."""
+        tracker = ConcurrencyTracker()
+        jobs = [("slow", i) for i in range(6)] + [("fast", i) for i in range(6)]
+        list(
+            run_with_limits(
+                jobs,
+                tracker,
+                key=lambda job: job[0],
+                max_concurrency=8,
+                key_limits={"slow": 1},
+                default_key_limit=2,
+            )
+        )
+        assert tracker.peak["slow"] == 1
+        assert tracker.peak["fast"] == 2
+
+    def test_jobs_with_several_keys(self):
+        """Test that a job with several keys counts against the limit of each of them."""
+        tracker = ConcurrencyTracker()
+        jobs = [(("a", "shared"), i) for i in range(4)] + [(("b", "shared"), i) for i in range(4)]
+        results = list(
+            run_with_limits(
+                jobs,
+                tracker,
+                key=lambda job: job[0],
+                max_concurrency=8,
+                key_limits={"shared": 2},
+                default_key_limit=4,
+            )
+        )
+        assert len(results) == 8
+        assert tracker.peak["shared"] == 2
+
+    def test_exceptions_are_returned_in_futures(self):
+        """Test that a failing job does not stop the other jobs."""
+
+        def worker(job):
+            if job[1] == 2:
+                raise RuntimeError("boom")
+            return job[1]
+
+        jobs = [("a", i) for i in range(4)]
+        outcomes = {job[1]: future.exception() for job, future in run_with_limits(jobs, worker, key=lambda job: job[0], max_concurrency=2)}
+        assert isinstance(outcomes[2], RuntimeError)
+        assert {i for i, e in outcomes.items() if e is None} == {0, 1, 3}
+
+    def test_external_executor_is_not_shut_down(self):
+        """Test that a provided executor is used and left running."""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = [
+                future.result()
+                for _, future in run_with_limits([("a", 1), ("b", 2)], lambda job: job[1], key=lambda job: job[0], max_concurrency=2, executor=executor)
+            ]
+            assert sorted(results) == [1, 2]
+            assert executor.submit(lambda: 3).result() == 3
+
+    def test_unschedulable_jobs(self):
+        """Test that a key limited to 0 raises instead of hanging."""
+        with pytest.raises(ValueError):
+            list(run_with_limits([("a", 1)], lambda job: job, key=lambda job: job[0], max_concurrency=1, key_limits={"a": 0}))
+
+    def test_invalid_max_concurrency(self):
+        """Test that max_concurrency must be positive."""
+        with pytest.raises(ValueError):
+            list(run_with_limits([], lambda job: job, key=str, max_concurrency=0))
+
+
+class TestARunWithLimits:
+    """Test the a_run_with_limits function."""
+
+    @staticmethod
+    def run(jobs, **kwargs):
+        running = Counter()
+        peak = Counter()
+
+        async def worker(job):
+            keys, value = job
+            keys = ((keys,) if isinstance(keys, str) else keys) + ("total",)
+            for key in keys:
+                running[key] += 1
+                peak[key] = max(peak[key], running[key])
+            await asyncio.sleep(0.01)
+            for key in keys:
+                running[key] -= 1
+            if value < 0:
+                raise RuntimeError("boom")
+            return value
+
+        async def collect():
+            return [
+                (job, task.exception() or task.result())
+                async for job, task in a_run_with_limits(jobs, worker, key=lambda job: job[0], **kwargs)
+            ]
+
+        return asyncio.run(collect()), peak
+
+    def test_runs_all_jobs_within_limits(self):
+        """Test that every job is run while respecting both limits."""
+        jobs = [("slow", i) for i in range(5)] + [("fast", i) for i in range(5)]
+        results, peak = self.run(jobs, max_concurrency=3, key_limits={"slow": 1})
+        assert sorted(job for job, _ in results) == sorted(jobs)
+        assert peak["slow"] == 1
+        assert peak["total"] == 3
+
+    def test_jobs_with_several_keys(self):
+        """Test that jobs sharing some of their keys respect every limit without deadlocking."""
+        jobs = [(("a", "shared"), i) for i in range(4)] + [(("shared", "b"), i) for i in range(4)]
+        results, peak = self.run(jobs, max_concurrency=8, key_limits={"shared": 2, "a": 1})
+        assert len(results) == 8
+        assert peak["shared"] == 2
+        assert peak["a"] == 1
+
+    def test_exceptions_are_returned_in_tasks(self):
+        """Test that a failing job does not stop the other jobs."""
+        results, _ = self.run([("a", 1), ("a", -1), ("a", 2)], max_concurrency=2)
+        outcomes = dict(results)
+        assert isinstance(outcomes[("a", -1)], RuntimeError)
+        assert outcomes[("a", 1)] == 1 and outcomes[("a", 2)] == 2
+
+    def test_unschedulable_jobs(self):
+        """Test that a key limited to 0 raises instead of hanging."""
+        with pytest.raises(ValueError):
+            self.run([("a", 1)], max_concurrency=1, key_limits={"a": 0})
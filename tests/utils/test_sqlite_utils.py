@@ -0,0 +1,38 @@
+import sqlite3
+import threading
+
+import pytest
+
+from src.utils.sqlite_utils import enable_wal
+
+
+class TestEnableWal:
+    """Test the enable_wal function."""
+
+    def test_enables_wal(self, tmp_path):
+        """Test that the database is switched to WAL mode."""
+        connection = sqlite3.connect(str(tmp_path / "db.sqlite"))
+        enable_wal(connection)
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_waits_for_a_locked_database(self, tmp_path):
+        """Test that the switch is retried while another connection holds a lock."""
+        path = str(tmp_path / "db.sqlite")
+        holder = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        holder.execute("BEGIN EXCLUSIVE")
+        timer = threading.Timer(0.2, holder.execute, ["COMMIT"])
+        timer.start()
+        try:
+            enable_wal(sqlite3.connect(path, timeout=0))
+        finally:
+            timer.join()
+        assert holder.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_gives_up_after_timeout(self, tmp_path):
+        """Test that the lock error is raised once the timeout has passed."""
+        path = str(tmp_path / "db.sqlite")
+        holder = sqlite3.connect(path, isolation_level=None)
+        holder.execute("BEGIN EXCLUSIVE")
+        with pytest.raises(sqlite3.OperationalError):
+            enable_wal(sqlite3.connect(path, timeout=0), timeout=0.05)
+        holder.execute("COMMIT")